@@ -8,11 +8,11 @@
 # This script uses:
 # - OpenCV for webcam access
 # - Mediapipe for real-time pose estimation
-# - Pydub for audio playback
+# - Pydub for decoding audio and sounddevice for playing it
 # - CustomTkinter for the graphical user interface (GUI)
 #
 # NOTE: To run this, you must have the required libraries installed:
-#       pip install opencv-python mediapipe pydub customtkinter Pillow
+#       pip install opencv-python mediapipe pydub sounddevice customtkinter Pillow
 #       Also, pydub requires ffmpeg to be installed on your system.
 #
 # SETUP: Before running, create a folder named 'audio' in the same
@@ -24,36 +24,1528 @@
 #          front page animation. The code has been cleaned up for consistency.
 #
 
-import cv2
-import mediapipe as mp
-from pydub import AudioSegment
-from pydub.playback import play
 import random
 import threading
 import os
 import time
-import customtkinter as ctk
 import math
 import sys
 import numpy as np
-from pydub import utils
-import subprocess
+import queue
+import argparse
+import csv
+import json
+import multiprocessing
+from multiprocessing import shared_memory
+import hashlib
+import sqlite3
+import uuid
+import importlib
+import bisect
+import platform
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
 from tkinter import font
 
+# --- Deferred Imports & Startup Timing ---
+# Time the process started, so every startup milestone is measured from here
+PROCESS_START_TIME = time.perf_counter()
+
+# (label, seconds) pairs collected while the app starts up
+startup_timings = []
+startup_report_enabled = False
+startup_report_printed = False
+startup_lock = threading.Lock()
+
+def record_startup_timing(label, seconds):
+    """Records how long a startup step took."""
+    with startup_lock:
+        startup_timings.append((label, seconds))
+
+def mark_startup(label):
+    """Records a startup milestone as the time elapsed since the process started."""
+    record_startup_timing(f"{label} (since launch)", time.perf_counter() - PROCESS_START_TIME)
+    maybe_print_startup_report()
+
+def maybe_print_startup_report():
+    """
+    Prints the startup timings (once) when --startup-report was given and both
+    the front page and the pose model warm-up have finished. The report is
+    also appended to startup_timings.jsonl so cold-start regressions can be tracked.
+    """
+    global startup_report_printed
+
+    with startup_lock:
+        labels = {label for label, _ in startup_timings}
+        if (not startup_report_enabled or startup_report_printed
+                or "front page visible (since launch)" not in labels
+                or "pose ready (since launch)" not in labels):
+            return
+        startup_report_printed = True
+        timings = list(startup_timings)
+
+    print("Startup timings:")
+    for label, seconds in timings:
+        print(f"  {label:<42} {seconds * 1000:8.1f} ms")
+
+    try:
+        with open("startup_timings.jsonl", "a") as f:
+            f.write(json.dumps({"time": time.time(), "timings": dict(timings)}) + "\n")
+    except OSError as e:
+        print(f"Warning: Could not save startup timings. {e}")
+
+class LazyModule:
+    """
+    Stands in for a heavy module and imports it on first attribute access,
+    so the front page doesn't wait on libraries it doesn't use yet.
+    Attributes set before the import are applied once the module loads.
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_pending_attrs", {})
+
+    def load(self):
+        """Imports the module now (if it isn't already) and returns it."""
+        module = self._module
+        if module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self._name)
+            for attr, value in self._pending_attrs.items():
+                setattr(module, attr, value)
+            if self._module is None:
+                object.__setattr__(self, "_module", module)
+                record_startup_timing(f"import {self._name}", time.perf_counter() - start)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr, value):
+        if self._module is None:
+            self._pending_attrs[attr] = value
+        else:
+            setattr(self._module, attr, value)
+
+cv2 = LazyModule("cv2")
+ctk = LazyModule("customtkinter")
+pydub = LazyModule("pydub")
+sounddevice = LazyModule("sounddevice")
+pydub_utils = LazyModule("pydub.utils")
+mp_pose = LazyModule("mediapipe.python.solutions.pose")
+
 # --- Configuration ---
 # Define the paths to the audio folders
 INCORRECT_FORM_AUDIO_PATH = "audio/incorrect_form"
 STANDING_STILL_AUDIO_PATH = "audio/standing_still"
 # Path to the GIF file provided by the user
 GIF_PATH = "duck.gif"
+# Size the GIF frames are resized to, and where the resized frames are cached
+GIF_DISPLAY_SIZE = (750, 750)
+GIF_CACHE_DIR = os.path.join(".cache", "gif_frames")
+# Used when a GIF frame has no (or an unusably short) duration of its own
+GIF_DEFAULT_FRAME_DURATION = 100
+
+# Webcam discovery and capture settings. The working camera index is cached here
+# so the next launch tries it first.
+CAMERA_MAX_INDEX = 5
+CAMERA_CACHE_PATH = os.path.join(".cache", "camera.json")
+CAMERA_WIDTH = 640
+CAMERA_HEIGHT = 480
+CAMERA_FPS = 30
+# MJPG lets most USB webcams deliver full frame rate at higher resolutions
+CAMERA_FOURCC = "MJPG"
 
 # Set a cooldown period (in seconds) so the app doesn't spam audio
 COOLDOWN_PERIOD = 15
 
+# Feedback kinds reported by the form checks, and the audio folder for each
+FEEDBACK_INCORRECT_FORM = "incorrect_form"
+FEEDBACK_STANDING_STILL = "standing_still"
+FEEDBACK_AUDIO_PATHS = {
+    FEEDBACK_INCORRECT_FORM: INCORRECT_FORM_AUDIO_PATH,
+    FEEDBACK_STANDING_STILL: STANDING_STILL_AUDIO_PATH,
+}
+# Lower numbers win when two dialogues are requested at the same time
+FEEDBACK_AUDIO_PRIORITIES = {
+    FEEDBACK_INCORRECT_FORM: 0,
+    FEEDBACK_STANDING_STILL: 1,
+}
+
+# How much decoded audio (in bytes of PCM) the audio engine keeps in memory
+AUDIO_CACHE_BUDGET_BYTES = 64 * 1024 * 1024
+# How often (in seconds) the audio folders are checked for added/removed clips
+AUDIO_INDEX_REFRESH_INTERVAL = 5
+# Every clip is converted to this format when decoded, so one output stream can play them all
+AUDIO_SAMPLE_RATE = 44100
+AUDIO_CHANNELS = 2
+# Samples per channel written to the output stream at a time
+AUDIO_WRITE_FRAMES = 4096
+
+# Video file types picked up by the headless batch mode
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# Width of each station's video tile on the multi-station dashboard
+DASHBOARD_TILE_WIDTH = 480
+
+# Where the benchmark looks for (or generates) its fixture videos and landmark streams
+BENCHMARK_FIXTURE_DIR = "benchmark_fixtures"
+# A stage counts as regressed when its p50 or p95 latency is this much worse than the baseline
+BENCHMARK_REGRESSION_TOLERANCE = 0.15
+
+# Scale the video down to the label's actual on-screen size before it is
+# converted for Tk (the label then fills the window instead of sizing to the video)
+SCALE_TO_LABEL = False
+
+# Run pose estimation on a downscaled frame, or a crop around the person,
+# adapting the input size to keep inference within the latency budget
+ADAPTIVE_INFERENCE = True
+INFERENCE_LATENCY_BUDGET_MS = 30
+INFERENCE_MIN_SCALE = 0.35
+# Extra room around the person's landmark bounding box when cropping (fraction of box size)
+INFERENCE_ROI_MARGIN = 0.3
+
+# Pipeline instrumentation (off unless --metrics, --hud, --metrics-log or --metrics-port is given).
+# Latency histogram bucket upper bounds, in seconds
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.016, 0.025, 0.033, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0)
+# How often (in seconds) a line is appended to the --metrics-log file
+METRICS_LOG_INTERVAL = 5
+
+# Standing-still detection: the person counts as still while the visibility-weighted
+# spread (RMS distance from their mean position, normalized units) of their landmarks
+# over the last MOTION_WINDOW_SECONDS stays below STILL_MOTION_THRESHOLD, and is
+# teased once that has lasted STANDING_STILL_SECONDS
+MOTION_WINDOW_SECONDS = 1.0
+STILL_MOTION_THRESHOLD = 0.005
+STANDING_STILL_SECONDS = 2.0
+# Frames the landmark history can hold (enough for the window at up to 120 fps)
+LANDMARK_HISTORY_CAPACITY = 128
+
+# Session recordings: the optional video stored next to the landmarks is scaled to this width
+RECORDING_VIDEO_WIDTH = 320
+# Canvas the skeleton is drawn on when replaying a recording that has no video
+REPLAY_CANVAS_SIZE = (640, 480)
+
+# Run pose.process in its own process (--inference-process) instead of a thread,
+# so Mediapipe never competes with the GUI for the GIL. Frames go through this
+# many shared-memory slots; a worker that crashes, or hasn't answered a frame for
+# INFERENCE_WORKER_TIMEOUT seconds, is restarted up to INFERENCE_WORKER_MAX_RESTARTS times.
+INFERENCE_WORKER_PROCESS = False
+INFERENCE_SLOTS = 3
+INFERENCE_WORKER_TIMEOUT = 5.0
+INFERENCE_WORKER_MAX_RESTARTS = 5
+
+# Pose model calibration: the model complexity (0 lite, 1 full, 2 heavy) and input
+# scale are picked by benchmarking on this machine, and saved in MODEL_PROFILE_PATH.
+# The most accurate setting whose inference keeps up with MODEL_TARGET_FPS wins.
+MODEL_PROFILE_PATH = os.path.join(".cache", "pose_profile.json")
+MODEL_TARGET_FPS = 15
+CALIBRATION_COMPLEXITIES = (0, 1, 2)
+CALIBRATION_SCALES = (0.5, 0.75, 1.0)
+CALIBRATION_FRAMES = 30
+# A clip of someone exercising in front of this camera; without it the defaults are kept.
+# Timings are only meaningful with a person in view, since Mediapipe skips the
+# landmark model (the part model complexity changes) when it finds nobody.
+CALIBRATION_CLIP = "calibration_clip.mp4"
+# Step down to a cheaper setting when inference stays this far below MODEL_TARGET_FPS
+# for OVERLOAD_SECONDS (and re-run the full calibration on the next launch)
+OVERLOAD_FPS_FRACTION = 0.7
+OVERLOAD_SECONDS = 10
+
+# Every completed rep is saved to this SQLite file (see WorkoutStore). Reps are
+# buffered and written in one transaction every WORKOUT_FLUSH_INTERVAL seconds
+# (sooner once WORKOUT_FLUSH_BATCH are waiting); past WORKOUT_BUFFER_LIMIT
+# unwritten reps, new ones are dropped rather than let memory grow.
+WORKOUT_HISTORY = True
+WORKOUT_DB_PATH = "workouts.db"
+WORKOUT_FLUSH_INTERVAL = 1.0
+WORKOUT_FLUSH_BATCH = 1000
+WORKOUT_BUFFER_LIMIT = 200000
+
+# Annotated session export (--export): frames are scaled to EXPORT_WIDTH and thinned
+# to EXPORT_FPS on the processing thread, then queued (at most EXPORT_QUEUE_SIZE,
+# newer frames are dropped while it is full) for a background encoder thread
+EXPORT_WIDTH = 640
+EXPORT_FPS = 15
+EXPORT_QUEUE_SIZE = 8
+EXPORT_FOURCC = "mp4v"
+
+# Multi-person mode (--multi-person): people are found with OpenCV's HOG detector
+# every MULTI_PERSON_DETECT_INTERVAL frames on a copy MULTI_PERSON_DETECT_WIDTH wide,
+# followed in between by their own pose landmarks, and each person's crop is
+# scaled to at most MULTI_PERSON_CROP_SIZE pixels before the pose model sees it
+MULTI_PERSON_MAX_PEOPLE = 4
+MULTI_PERSON_DETECT_INTERVAL = 15
+MULTI_PERSON_DETECT_WIDTH = 400
+MULTI_PERSON_CROP_SIZE = 256
+MULTI_PERSON_CROP_MARGIN = 0.15
+# A detection continues a track if their boxes overlap at least this much (intersection over union)
+MULTI_PERSON_MATCH_IOU = 0.3
+# While two people overlap this much, their boxes coast on their own motion so the tracks don't swap
+MULTI_PERSON_OCCLUSION_IOU = 0.4
+# Frames without landmarks or a matching detection before a track is dropped
+MULTI_PERSON_MAX_MISSES = 30
+
+# Analysis server (--serve): sessions are spread over SERVER_WORKERS threads, each
+# with a queue of at most SERVER_QUEUE_SIZE requests (a full queue answers 503, so
+# clients back off) that it drains SERVER_BATCH_SIZE at a time
+SERVER_PORT = 8765
+SERVER_WORKERS = max(1, min(4, os.cpu_count() or 1))
+SERVER_QUEUE_SIZE = 64
+SERVER_BATCH_SIZE = 16
+SERVER_REQUEST_TIMEOUT = 5.0
+# Each worker keeps a Pose for this many sessions that send frames (least recently used is closed)
+SERVER_POSES_PER_WORKER = 4
+SERVER_SESSION_TIMEOUT = 300
+
+# Skeleton overlay colors (RGB, since the frames are), sizes, and the colors of the
+# joints and bones the active exercise's rules look at (normal / incorrect form)
+SKELETON_BONE_COLOR = (230, 66, 245)
+SKELETON_JOINT_COLOR = (66, 117, 245)
+SKELETON_RULE_COLOR = (40, 200, 70)
+SKELETON_WARNING_COLOR = (235, 40, 40)
+SKELETON_THICKNESS = 2
+SKELETON_JOINT_RADIUS = 3
+# Landmarks less visible than this aren't drawn (same cut-off as Mediapipe's drawing utils)
+SKELETON_VISIBILITY_THRESHOLD = 0.5
+
+# Display frame rate the scheduler aims for. When Mediapipe can't keep up,
+# it only runs on every Nth frame and the frames in between use predicted landmarks.
+TARGET_DISPLAY_FPS = 30
+# Never extrapolate landmarks further than this past the last real detection
+MAX_PREDICTION_SECONDS = 0.25
+
+# --- Landmark Arrays & Joint Angles ---
+# Mediapipe Pose reports 33 landmarks; each frame is stored as a (33, 4)
+# float32 array of (x, y, z, visibility) rows.
+NUM_POSE_LANDMARKS = 33
+LANDMARK_X, LANDMARK_Y, LANDMARK_Z, LANDMARK_VISIBILITY = range(4)
+
+# Landmark indices, same numbering as mp_pose.PoseLandmark
+LEFT_SHOULDER = 11
+LEFT_ELBOW = 13
+LEFT_WRIST = 15
+LEFT_HIP = 23
+RIGHT_HIP = 24
+LEFT_KNEE = 25
+RIGHT_KNEE = 26
+LEFT_ANKLE = 27
+RIGHT_ANKLE = 28
+
+# The bones of the skeleton (same pairs as mp_pose.POSE_CONNECTIONS)
+POSE_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19),
+    (12, 14), (14, 16), (16, 18), (16, 20), (16, 22), (18, 20),
+    (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28),
+    (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32),
+)
+
+def new_landmark_array(frames=None):
+    """Allocates a zeroed landmark array for one frame, or a stack of frames."""
+    shape = (NUM_POSE_LANDMARKS, 4) if frames is None else (frames, NUM_POSE_LANDMARKS, 4)
+    return np.zeros(shape, dtype=np.float32)
+
+def landmarks_to_array(landmarks, out=None):
+    """
+    Copies Mediapipe landmark objects (results.pose_landmarks.landmark)
+    into a (33, 4) float32 array. Pass `out` (contiguous, like the arrays
+    from new_landmark_array) to reuse a preallocated array.
+    """
+    if out is None:
+        out = new_landmark_array()
+    # Written value by value through a flat view, so no per-frame list or tuples are built
+    values = memoryview(out).cast("B").cast("f")
+    i = 0
+    for lm in landmarks:
+        values[i] = lm.x
+        values[i + 1] = lm.y
+        values[i + 2] = lm.z
+        values[i + 3] = lm.visibility
+        i += 4
+    return out
+
+class JointAngleEngine:
+    """
+    Computes the angles at a list of (first, vertex, last) landmark triplets in
+    one vectorized pass; the position of a triplet is its column in the result.
+    Accepts a single (33, 4) landmark array or a (frames, 33, 4) stack.
+
+    Single-frame calls write into preallocated scratch buffers and return the
+    same angle array every time, so copy it if you need to keep it around.
+    Each session should own its own engine; it is not thread-safe.
+    """
+
+    def __init__(self, triplets):
+        triplets = np.asarray(triplets, dtype=np.intp).reshape(-1, 3)
+        self.num_angles = len(triplets)
+        # Ordered (first, last, vertex) so the two arms are one contiguous slice
+        self._indices = np.concatenate([triplets[:, 0], triplets[:, 2], triplets[:, 1]])
+
+        self._points = np.empty((3 * self.num_angles, 2), dtype=np.float32)
+        self._arms = np.empty((2, self.num_angles, 2), dtype=np.float32)
+        self._radians = np.empty((2, self.num_angles), dtype=np.float32)
+        self._reflex = np.empty(self.num_angles, dtype=bool)
+        self.angles = np.empty(self.num_angles, dtype=np.float32)
+
+    def compute(self, landmark_array):
+        """
+        Returns the joint angles in degrees (0-180): shape (num_angles,)
+        for one frame, or (frames, num_angles) for a stack.
+        """
+        if landmark_array.ndim == 3:
+            return self.compute_batch(landmark_array)
+
+        np.take(landmark_array[:, :2], self._indices, axis=0, out=self._points)
+        points = self._points.reshape(3, self.num_angles, 2)
+        np.subtract(points[:2], points[2], out=self._arms)
+        np.arctan2(self._arms[..., 1], self._arms[..., 0], out=self._radians)
+
+        angles = self.angles
+        np.subtract(self._radians[1], self._radians[0], out=angles)
+        np.multiply(angles, np.float32(180.0 / np.pi), out=angles)
+        np.abs(angles, out=angles)
+        np.greater(angles, 180.0, out=self._reflex)
+        np.subtract(360.0, angles, out=angles, where=self._reflex)
+        return angles
+
+    def compute_batch(self, landmark_stack):
+        """Returns a new (frames, num_angles) array of angles for a whole recording."""
+        frames = landmark_stack.shape[0]
+        points = landmark_stack[:, self._indices, :2].reshape(frames, 3, self.num_angles, 2)
+        arms = points[:, :2] - points[:, 2:3]
+        radians = np.arctan2(arms[..., 1], arms[..., 0])
+
+        angles = np.abs((radians[:, 1] - radians[:, 0]) * np.float32(180.0 / np.pi))
+        return np.where(angles > 180.0, 360.0 - angles, angles)
+
+# --- Exercise Definitions ---
+# What the app says when the form check fails
+INCORRECT_FORM_MESSAGE = "enthan mone, kurchu kanji edukate"
+STANDING_STILL_MESSAGE = "Onnu angangi cheyada"
+
+# Each exercise is plain data, compiled by ExerciseRules:
+#   "angles":  feature name -> (first, vertex, last) landmark triplet, in degrees
+#   "heights": feature name -> (landmark, reference) pair; positive while the
+#              landmark is above the reference (in normalized image units)
+#   "initial_state": the state machine's state when the exercise starts
+#   "phases":  checked in order, the first whose "when" conditions all hold wins.
+#       "when":       list of (feature, ">" or "<", threshold); empty always matches
+#       "state":      state the machine moves to (omit to stay put)
+#       "count_from": a rep is counted when this phase is entered from that state
+#       "accuracy":   a fixed percentage, or (feature, value at 0%, value at 100%)
+#       "feedback":   feedback kind to play (e.g. FEEDBACK_INCORRECT_FORM), shown with "message"
+#   "display": status text while the form is fine, formatted with reps and accuracy
+EXERCISES = {
+    'squat': {
+        "angles": {"knee": (LEFT_HIP, LEFT_KNEE, LEFT_ANKLE)},
+        "initial_state": "UP",
+        "phases": [
+            # Standing position: knee angle > 160 degrees
+            {"name": "Standing Up", "when": [("knee", ">", 160)], "state": "UP", "count_from": "DOWN",
+             "accuracy": 0.0},
+            # Deep squat position: knee angle < 90 degrees
+            {"name": "Deep Squat", "when": [("knee", "<", 90)], "state": "DOWN", "accuracy": 100.0},
+            # Teasing rule: if the knee angle is too high, it's a shallow squat
+            {"name": "Shallow squat!", "when": [("knee", ">", 130)], "accuracy": ("knee", 160, 90),
+             "feedback": FEEDBACK_INCORRECT_FORM, "message": INCORRECT_FORM_MESSAGE},
+            {"name": "Squatting...", "when": [], "accuracy": ("knee", 160, 90)},
+        ],
+        "display": "Squats: {reps} | Accuracy: {accuracy:.0f}%",
+    },
+    'hand_raise': {
+        "angles": {"elbow": (LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST)},
+        "heights": {"wrist": (LEFT_WRIST, LEFT_SHOULDER)},
+        "initial_state": "DOWN",
+        "phases": [
+            {"name": "Hand is raised", "when": [("wrist", ">", 0), ("elbow", ">", 160)], "state": "UP",
+             "count_from": "DOWN", "accuracy": 100.0},
+            {"name": "Hand is down", "when": [], "state": "DOWN", "accuracy": 0.0,
+             "feedback": FEEDBACK_INCORRECT_FORM, "message": INCORRECT_FORM_MESSAGE},
+        ],
+        "display": "Hand Raises: {reps} | Accuracy: {accuracy:.0f}%",
+    },
+    'lunge': {
+        "angles": {"front_knee": (LEFT_HIP, LEFT_KNEE, LEFT_ANKLE),
+                   "back_knee": (RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE)},
+        "initial_state": "UP",
+        "phases": [
+            {"name": "Standing Up", "when": [("front_knee", ">", 160)], "state": "UP", "count_from": "DOWN",
+             "accuracy": 0.0},
+            {"name": "Deep Lunge", "when": [("front_knee", "<", 100), ("back_knee", "<", 120)], "state": "DOWN",
+             "accuracy": 100.0},
+            {"name": "Shallow lunge!", "when": [("front_knee", ">", 135)], "accuracy": ("front_knee", 160, 100),
+             "feedback": FEEDBACK_INCORRECT_FORM, "message": INCORRECT_FORM_MESSAGE},
+            {"name": "Lunging...", "when": [], "accuracy": ("front_knee", 160, 100)},
+        ],
+        "display": "Lunges: {reps} | Accuracy: {accuracy:.0f}%",
+    },
+    'bicep_curl': {
+        "angles": {"elbow": (LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST)},
+        "initial_state": "DOWN",
+        "phases": [
+            {"name": "Curled", "when": [("elbow", "<", 50)], "state": "UP", "count_from": "DOWN",
+             "accuracy": 100.0},
+            {"name": "Arm extended", "when": [("elbow", ">", 150)], "state": "DOWN", "accuracy": 0.0},
+            {"name": "Curling...", "when": [], "accuracy": ("elbow", 150, 50)},
+        ],
+        "display": "Curls: {reps} | Accuracy: {accuracy:.0f}%",
+    },
+    'shoulder_press': {
+        "angles": {"elbow": (LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST)},
+        "heights": {"wrist": (LEFT_WRIST, LEFT_SHOULDER)},
+        "initial_state": "DOWN",
+        "phases": [
+            {"name": "Locked out", "when": [("wrist", ">", 0.1), ("elbow", ">", 160)], "state": "UP",
+             "count_from": "DOWN", "accuracy": 100.0},
+            {"name": "Racked", "when": [("elbow", "<", 90)], "state": "DOWN", "accuracy": 0.0},
+            # Arm straightening without the wrist going overhead: pressing forwards, not up
+            {"name": "Pressing forwards!", "when": [("wrist", "<", 0), ("elbow", ">", 120)], "accuracy": 0.0,
+             "feedback": FEEDBACK_INCORRECT_FORM, "message": INCORRECT_FORM_MESSAGE},
+            {"name": "Pressing...", "when": [], "accuracy": ("elbow", 90, 160)},
+        ],
+        "display": "Presses: {reps} | Accuracy: {accuracy:.0f}%",
+    },
+}
+
+# --- Rule Engine ---
+class ExerciseRules:
+    """
+    The exercise definitions compiled into flat NumPy tables, so one frame
+    is evaluated for every exercise at once with a fixed number of array
+    operations: every angle and height in one pass, every phase condition
+    in one comparison, and every state machine stepped together.
+    Adding exercises makes the tables longer, not the per-frame work.
+
+    Like JointAngleEngine, it keeps scratch buffers, so each session needs its own.
+    """
+
+    def __init__(self, exercises=None):
+        exercises = EXERCISES if exercises is None else exercises
+        self.names = list(exercises)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.definitions = [exercises[name] for name in self.names]
+
+        # Shared feature columns: every distinct angle first, then every distinct height
+        triplets, pairs = [], []
+        for definition in self.definitions:
+            for triplet in definition.get("angles", {}).values():
+                if tuple(triplet) not in triplets:
+                    triplets.append(tuple(triplet))
+            for pair in definition.get("heights", {}).values():
+                if tuple(pair) not in pairs:
+                    pairs.append(tuple(pair))
+        self.angle_engine = JointAngleEngine(triplets)
+        num_angles = len(triplets)
+        self._height_landmarks = np.array([pair[0] for pair in pairs], dtype=np.intp)
+        self._height_references = np.array([pair[1] for pair in pairs], dtype=np.intp)
+        # The extra last column is a constant 0, used by fixed-accuracy phases
+        self.num_features = num_angles + len(pairs) + 1
+        constant_column = self.num_features - 1
+
+        # Every exercise gets a trailing catch-all phase, so a phase always matches
+        phases = [list(definition["phases"]) + [{"name": "", "when": []}] for definition in self.definitions]
+        self.max_phases = max(len(exercise_phases) for exercise_phases in phases)
+        shape = (len(self.names), self.max_phases)
+
+        state_names = []
+        def state_id(name):
+            if name not in state_names:
+                state_names.append(name)
+            return state_names.index(name)
+
+        self.initial_states = np.array([state_id(d["initial_state"]) for d in self.definitions], dtype=np.int32)
+        self._target_states = np.full(shape, -1, dtype=np.int32)
+        self._count_from = np.full(shape, -1, dtype=np.int32)
+        self._accuracy_columns = np.full(shape, constant_column, dtype=np.intp)
+        self._accuracy_scales = np.zeros(shape, dtype=np.float32)
+        self._accuracy_offsets = np.zeros(shape, dtype=np.float32)
+        self.phase_table = [[None] * self.max_phases for _ in self.names]
+        # Each exercise's first angle, whose lowest value over a rep is its depth
+        self.depth_columns = []
+
+        condition_columns, condition_signs, condition_thresholds, condition_phases = [], [], [], []
+        for e, (definition, exercise_phases) in enumerate(zip(self.definitions, phases)):
+            columns = {}
+            for name, triplet in definition.get("angles", {}).items():
+                columns[name] = triplets.index(tuple(triplet))
+            for name, pair in definition.get("heights", {}).items():
+                columns[name] = num_angles + pairs.index(tuple(pair))
+            angle_names = list(definition.get("angles", {}))
+            self.depth_columns.append(columns[angle_names[0]] if angle_names else constant_column)
+
+            for p in range(self.max_phases):
+                phase = exercise_phases[min(p, len(exercise_phases) - 1)]
+                self.phase_table[e][p] = phase
+                if "state" in phase:
+                    self._target_states[e, p] = state_id(phase["state"])
+                if "count_from" in phase:
+                    self._count_from[e, p] = state_id(phase["count_from"])
+
+                accuracy = phase.get("accuracy", 0.0)
+                if isinstance(accuracy, tuple):
+                    feature, zero_at, full_at = accuracy
+                    self._accuracy_columns[e, p] = columns[feature]
+                    self._accuracy_scales[e, p] = 100.0 / (full_at - zero_at)
+                    self._accuracy_offsets[e, p] = -zero_at * 100.0 / (full_at - zero_at)
+                else:
+                    self._accuracy_offsets[e, p] = accuracy
+
+                for feature, op, threshold in phase["when"]:
+                    if op not in (">", "<"):
+                        raise ValueError(f"Unknown comparison {op!r} in {self.names[e]} phase {phase['name']!r}")
+                    # "a < t" is evaluated as "-a > -t", so every condition is one greater-than
+                    sign = 1.0 if op == ">" else -1.0
+                    condition_columns.append(columns[feature])
+                    condition_signs.append(sign)
+                    condition_thresholds.append(sign * threshold)
+                    condition_phases.append(e * self.max_phases + p)
+
+        self.state_names = state_names
+        self._condition_columns = np.array(condition_columns, dtype=np.intp)
+        self._condition_signs = np.array(condition_signs, dtype=np.float32)
+        self._condition_thresholds = np.array(condition_thresholds, dtype=np.float32)
+        # phases x conditions: 1 where the condition belongs to the phase
+        self._membership = np.zeros((len(self.names) * self.max_phases, len(condition_columns)), dtype=np.float32)
+        self._membership[condition_phases, np.arange(len(condition_columns))] = 1.0
+        self._rows = np.arange(len(self.names)) * self.max_phases
+
+        # Scratch buffers for single-frame evaluation
+        self.features = np.zeros(self.num_features, dtype=np.float32)
+        self._height_a = np.empty(len(pairs), dtype=np.float32)
+        self._conditions = np.empty(len(condition_columns), dtype=np.float32)
+        self._failed = np.empty(len(condition_columns), dtype=np.float32)
+        self._phase_failures = np.empty(len(self.names) * self.max_phases, dtype=np.float32)
+        self._phase_ok = np.empty(shape, dtype=bool)
+        self._chosen = np.empty(len(self.names), dtype=np.intp)
+
+    def compute_features(self, landmark_array):
+        """Fills self.features with every angle and height for one (33, 4) frame and returns it."""
+        num_angles = self.angle_engine.num_angles
+        self.features[:num_angles] = self.angle_engine.compute(landmark_array)
+        if len(self._height_a):
+            heights = self.features[num_angles:-1]
+            y = landmark_array[:, LANDMARK_Y]
+            np.take(y, self._height_references, out=heights)
+            np.take(y, self._height_landmarks, out=self._height_a)
+            np.subtract(heights, self._height_a, out=heights)
+        return self.features
+
+    def evaluate(self, landmark_array, state):
+        """
+        Steps every exercise's state machine on one frame, updating
+        state.phases, state.rep_counts, state.machine_states and state.accuracies.
+        """
+        features = self.compute_features(landmark_array)
+
+        # One comparison for every condition of every phase of every exercise
+        np.take(features, self._condition_columns, out=self._conditions)
+        np.multiply(self._conditions, self._condition_signs, out=self._conditions)
+        np.less_equal(self._conditions, self._condition_thresholds, out=self._failed)
+        np.dot(self._membership, self._failed, out=self._phase_failures)
+        np.equal(self._phase_failures.reshape(self._phase_ok.shape), 0.0, out=self._phase_ok)
+        np.argmax(self._phase_ok, axis=1, out=self._chosen)
+        self._step(self._chosen, features, state.machine_states, state.rep_counts, state.accuracies)
+        np.copyto(state.phases, self._chosen)
+
+    def _step(self, chosen, features, machine_states, rep_counts, accuracies):
+        flat = self._rows + chosen
+        count_from = self._count_from.flat[flat]
+        rep_counts += count_from == machine_states
+        target = self._target_states.flat[flat]
+        np.copyto(machine_states, target, where=target >= 0)
+        accuracies[:] = features[self._accuracy_columns.flat[flat]] * self._accuracy_scales.flat[flat] \
+            + self._accuracy_offsets.flat[flat]
+
+    def evaluate_batch(self, landmark_stack):
+        """
+        Runs every exercise over a (frames, 33, 4) recording from a fresh start.
+        Returns a dict of (frames, exercises) arrays: "phases", "reps" (running
+        totals), "accuracy" and "incorrect" (True where the phase has feedback).
+        """
+        frames = landmark_stack.shape[0]
+        features = np.zeros((frames, self.num_features), dtype=np.float32)
+        num_angles = self.angle_engine.num_angles
+        features[:, :num_angles] = self.angle_engine.compute_batch(landmark_stack)
+        y = landmark_stack[:, :, LANDMARK_Y]
+        features[:, num_angles:-1] = y[:, self._height_references] - y[:, self._height_landmarks]
+
+        conditions = features[:, self._condition_columns] * self._condition_signs
+        failed = (conditions <= self._condition_thresholds).astype(np.float32)
+        phase_ok = (failed @ self._membership.T == 0).reshape(frames, len(self.names), self.max_phases)
+        chosen = np.argmax(phase_ok, axis=2)
+        flat = self._rows + chosen
+
+        # The machine state after each frame is the target of the last phase that set one
+        target = self._target_states.flat[flat]
+        frame_numbers = np.arange(frames)[:, None]
+        last_set = np.maximum.accumulate(np.where(target >= 0, frame_numbers, -1), axis=0)
+        states_after = np.where(last_set >= 0, np.take_along_axis(target, np.maximum(last_set, 0), axis=0),
+                                self.initial_states)
+        states_before = np.vstack([self.initial_states[None, :], states_after[:-1]])
+        reps = np.cumsum(self._count_from.flat[flat] == states_before, axis=0)
+
+        accuracy = np.take_along_axis(features, self._accuracy_columns.flat[flat], axis=1) \
+            * self._accuracy_scales.flat[flat] + self._accuracy_offsets.flat[flat]
+        incorrect = np.array([[bool(phase.get("feedback")) for phase in row] for row in self.phase_table])
+        return {
+            "exercises": self.names,
+            "phases": chosen,
+            "reps": reps,
+            "accuracy": accuracy,
+            "incorrect": incorrect[np.arange(len(self.names)), chosen],
+        }
+
+# --- Landmark History ---
+class LandmarkHistory:
+    """
+    Ring buffer of the last MOTION_WINDOW_SECONDS of landmarks, with the
+    visibility-weighted sums needed for each landmark's rolling mean and
+    variance updated incrementally: a frame is added on push and taken away
+    again when it falls out of the window, so each push costs the same
+    however long the window is. All buffers are preallocated.
+
+    Exposes the motion spread (is the person still?), how long they have been
+    still and the rep tempo.
+    """
+
+    def __init__(self, window_seconds=MOTION_WINDOW_SECONDS, capacity=LANDMARK_HISTORY_CAPACITY, rep_capacity=8):
+        self.window_seconds = window_seconds
+        self.capacity = capacity
+        self._positions = np.zeros((capacity, NUM_POSE_LANDMARKS, 2), dtype=np.float32)
+        self._weights = np.zeros((capacity, NUM_POSE_LANDMARKS), dtype=np.float32)
+        self._times = np.zeros(capacity, dtype=np.float64)
+
+        # Rolling sums over the frames in the window: w, w*p and w*p^2 per landmark
+        self._sum_w = np.zeros(NUM_POSE_LANDMARKS, dtype=np.float64)
+        self._sum_wp = np.zeros((NUM_POSE_LANDMARKS, 2), dtype=np.float64)
+        self._sum_wpp = np.zeros((NUM_POSE_LANDMARKS, 2), dtype=np.float64)
+
+        # Scratch buffers
+        self._wp = np.empty((NUM_POSE_LANDMARKS, 2), dtype=np.float64)
+        self._wpp = np.empty((NUM_POSE_LANDMARKS, 2), dtype=np.float64)
+        self._safe_w = np.empty((NUM_POSE_LANDMARKS, 1), dtype=np.float64)
+
+        self._rep_times = np.zeros(rep_capacity, dtype=np.float64)
+        self.clear()
+
+    def clear(self):
+        """Forgets all frames and reps, as when a new exercise is started."""
+        self._oldest = 0
+        self.size = 0
+        self._pushes = 0
+        self._sum_w[:] = 0.0
+        self._sum_wp[:] = 0.0
+        self._sum_wpp[:] = 0.0
+        self.still_since = None
+        self._rep_count = 0
+
+    def push(self, landmarks, timestamp):
+        """Adds one frame's (33, 4) landmark array, captured at `timestamp` seconds."""
+        # Drop frames that fell out of the time window (or would be overwritten)
+        while self.size and (timestamp - self._times[self._oldest] > self.window_seconds
+                             or self.size == self.capacity):
+            self._remove_oldest()
+
+        slot = (self._oldest + self.size) % self.capacity
+        np.copyto(self._positions[slot], landmarks[:, :2])
+        np.copyto(self._weights[slot], landmarks[:, LANDMARK_VISIBILITY])
+        self._times[slot] = timestamp
+        self._accumulate(slot, np.add)
+        self.size += 1
+
+        # Re-add everything from scratch now and then so rounding errors can't build up
+        self._pushes += 1
+        if self._pushes % self.capacity == 0:
+            self._recompute()
+
+        if self.spread() < STILL_MOTION_THRESHOLD and self.duration() >= self.window_seconds / 2:
+            if self.still_since is None:
+                self.still_since = self._times[self._oldest]
+        else:
+            self.still_since = None
+
+    def _accumulate(self, slot, op):
+        """Adds (op=np.add) or removes (op=np.subtract) one frame's terms from the rolling sums."""
+        positions = self._positions[slot]
+        weights = self._weights[slot]
+        op(self._sum_w, weights, out=self._sum_w)
+        np.multiply(positions, weights[:, None], out=self._wp)
+        op(self._sum_wp, self._wp, out=self._sum_wp)
+        np.multiply(self._wp, positions, out=self._wpp)
+        op(self._sum_wpp, self._wpp, out=self._sum_wpp)
+
+    def _remove_oldest(self):
+        self._accumulate(self._oldest, np.subtract)
+        self._oldest = (self._oldest + 1) % self.capacity
+        self.size -= 1
+
+    def _recompute(self):
+        self._sum_w[:] = 0.0
+        self._sum_wp[:] = 0.0
+        self._sum_wpp[:] = 0.0
+        for i in range(self.size):
+            self._accumulate((self._oldest + i) % self.capacity, np.add)
+
+    def duration(self):
+        """Seconds between the oldest and newest frame in the window."""
+        if not self.size:
+            return 0.0
+        return self._times[(self._oldest + self.size - 1) % self.capacity] - self._times[self._oldest]
+
+    def spread(self):
+        """
+        Visibility-weighted RMS distance of the landmarks from their mean
+        position over the window (0 when perfectly still).
+        """
+        total_weight = self._sum_w.sum()
+        if self.size < 2 or total_weight <= 0:
+            return float("inf")
+        # Per landmark: sum(w*p^2) - sum(w*p)^2 / sum(w) is sum(w) times the variance
+        np.maximum(self._sum_w[:, None], 1e-9, out=self._safe_w)
+        np.multiply(self._sum_wp, self._sum_wp, out=self._wp)
+        np.divide(self._wp, self._safe_w, out=self._wp)
+        variance = (self._sum_wpp.sum() - self._wp.sum()) / total_weight
+        return math.sqrt(max(variance, 0.0))
+
+    def idle_seconds(self, timestamp):
+        """How long the person has been standing still as of `timestamp` (0 if moving)."""
+        return 0.0 if self.still_since is None else max(0.0, timestamp - self.still_since)
+
+    def record_rep(self, timestamp):
+        """Notes the time a rep was completed, for the tempo."""
+        self._rep_times[self._rep_count % len(self._rep_times)] = timestamp
+        self._rep_count += 1
+
+    def seconds_per_rep(self):
+        """Average time between the last few reps, or None before the second rep."""
+        count = min(self._rep_count, len(self._rep_times))
+        if count < 2:
+            return None
+        latest = self._rep_times[(self._rep_count - 1) % len(self._rep_times)]
+        earliest = self._rep_times[(self._rep_count - count) % len(self._rep_times)]
+        return (latest - earliest) / (count - 1)
+
+# --- Rep Counting State ---
+class RepState:
+    """
+    Holds the rep counters and state machines for one workout session,
+    one slot per exercise in its ExerciseRules (all exercises run on every frame).
+    The GUI uses the module-level `rep_state`; the batch mode creates one per video.
+    """
+
+    def __init__(self):
+        # Per-session scratch buffers so the per-frame rule checks don't allocate
+        self.landmark_array = new_landmark_array()
+        self.rules = ExerciseRules()
+        count = len(self.rules.names)
+        self.phases = np.zeros(count, dtype=np.intp)
+        self.rep_counts = np.zeros(count, dtype=np.int64)
+        self.machine_states = np.zeros(count, dtype=np.int32)
+        self.accuracies = np.zeros(count, dtype=np.float32)
+        self.history = LandmarkHistory()
+        # Called with (exercise, depth angle, peak accuracy, tempo seconds, feedback or None)
+        # for each completed rep, e.g. WorkoutStore.record_rep via the GUI
+        self.rep_listener = None
+        self.reset()
+
+    def reset(self):
+        """Clears all counters, as when a new exercise is started."""
+        self.start_rep()
+        self.rep_started = None
+        # The catch-all phase: no feedback until the first frame is evaluated
+        self.phases[:] = self.rules.max_phases - 1
+        self.rep_counts[:] = 0
+        self.machine_states[:] = self.rules.initial_states
+        self.accuracies[:] = 0.0
+        self.history.clear()
+
+    def start_rep(self, timestamp=None):
+        """Starts tracking the depth, peak accuracy and feedback of the next rep."""
+        self.rep_started = timestamp
+        self.rep_depth = math.inf
+        self.rep_peak_accuracy = 0.0
+        self.rep_feedback = None
+
+    def reps(self, exercise):
+        return int(self.rep_counts[self.rules.index[exercise]])
+
+    def accuracy(self, exercise):
+        return float(self.accuracies[self.rules.index[exercise]])
+
+    def phase(self, exercise):
+        """The definition of the phase `exercise` was in on the last frame."""
+        e = self.rules.index[exercise]
+        return self.rules.phase_table[e][self.phases[e]]
+
+# --- Skeleton Overlay ---
+class SkeletonRenderer:
+    """
+    Draws the pose skeleton straight from a (33, 4) landmark array.
+
+    The bone index pairs are built once; each frame the landmarks are turned
+    into pixel coordinates in one vectorized step, and all visible bones (and
+    all joints, as zero-length round-capped lines) go to OpenCV in a single
+    polylines call per color. The joints and bones the active exercise's
+    rules use are drawn in their own color, red while the form is wrong.
+
+    Keeps scratch buffers, so each drawing thread needs its own renderer.
+    """
+
+    def __init__(self, connections=POSE_CONNECTIONS):
+        pairs = np.asarray(connections, dtype=np.intp)
+        self._bone_starts = pairs[:, 0]
+        self._bone_ends = pairs[:, 1]
+        self._scaled = np.empty((NUM_POSE_LANDMARKS, 2), dtype=np.float32)
+        self._pixels = np.empty((NUM_POSE_LANDMARKS, 2), dtype=np.int32)
+        # Segment list for polylines: every bone, then every joint as a zero-length segment
+        self._segments = np.empty((len(pairs) + NUM_POSE_LANDMARKS, 2, 2), dtype=np.int32)
+        self._visible = np.empty(NUM_POSE_LANDMARKS, dtype=bool)
+        self._in_frame = np.empty((NUM_POSE_LANDMARKS, 2), dtype=bool)
+        self._rule_masks = {}
+
+    def _rule_mask(self, exercise):
+        """(joint mask, bone mask) of the landmarks `exercise`'s rules look at, computed once per exercise."""
+        masks = self._rule_masks.get(exercise)
+        if masks is None:
+            joints = np.zeros(NUM_POSE_LANDMARKS, dtype=bool)
+            definition = EXERCISES.get(exercise, {})
+            for points in list(definition.get("angles", {}).values()) + list(definition.get("heights", {}).values()):
+                joints[list(points)] = True
+            bones = joints[self._bone_starts] & joints[self._bone_ends]
+            masks = self._rule_masks[exercise] = (joints, bones)
+        return masks
+
+    def draw(self, frame_rgb, landmarks, exercise=None, warning=False):
+        """Draws the skeleton for `landmarks` onto frame_rgb in place, at frame_rgb's resolution."""
+        height, width = frame_rgb.shape[:2]
+        np.multiply(landmarks[:, :2], (width, height), out=self._scaled)
+        np.copyto(self._pixels, self._scaled, casting="unsafe")
+
+        # Like Mediapipe: skip landmarks that are hidden or outside the image
+        np.greater_equal(landmarks[:, LANDMARK_VISIBILITY], SKELETON_VISIBILITY_THRESHOLD, out=self._visible)
+        np.logical_and(landmarks[:, :2] >= 0.0, landmarks[:, :2] <= 1.0, out=self._in_frame)
+        self._visible &= self._in_frame[:, 0]
+        self._visible &= self._in_frame[:, 1]
+
+        bone_count = len(self._bone_starts)
+        segments = self._segments
+        segments[:bone_count, 0] = self._pixels[self._bone_starts]
+        segments[:bone_count, 1] = self._pixels[self._bone_ends]
+        segments[bone_count:, 0] = self._pixels
+        segments[bone_count:, 1] = self._pixels
+        visible_bones = self._visible[self._bone_starts] & self._visible[self._bone_ends]
+
+        rule_joints, rule_bones = self._rule_mask(exercise)
+        rule_color = SKELETON_WARNING_COLOR if warning else SKELETON_RULE_COLOR
+        joint_diameter = 2 * SKELETON_JOINT_RADIUS + 1
+
+        bones = segments[:bone_count]
+        self._polylines(frame_rgb, bones[visible_bones & ~rule_bones], SKELETON_BONE_COLOR, SKELETON_THICKNESS)
+        self._polylines(frame_rgb, bones[visible_bones & rule_bones], rule_color, SKELETON_THICKNESS + 1)
+        joints = segments[bone_count:]
+        # White rim, then the joint color on top
+        self._polylines(frame_rgb, joints[self._visible], (255, 255, 255), joint_diameter + 2)
+        self._polylines(frame_rgb, joints[self._visible & ~rule_joints], SKELETON_JOINT_COLOR, joint_diameter)
+        self._polylines(frame_rgb, joints[self._visible & rule_joints], rule_color, joint_diameter)
+
+    @staticmethod
+    def _polylines(frame_rgb, segments, color, thickness):
+        if len(segments):
+            cv2.polylines(frame_rgb, segments, False, color, thickness)
+
+# --- Metrics ---
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram: recording a sample is a bisect and
+    three additions, and memory never grows however long the app runs.
+    """
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-th quantile (None if empty,
+        inf if it is past the last bucket).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Metrics:
+    """
+    Per-stage timers and event counters for the live pipeline.
+
+    When disabled, time() and increment() return straight away, so the calls
+    can stay in the hot path. When enabled they take one short lock, since
+    some stages are timed from several threads at once (e.g. the analysis
+    server's workers).
+    """
+
+    STAGES = ("capture", "inference", "rules", "overlay", "render")
+    COUNTERS = ("frames_captured", "capture_frames_dropped", "display_frames_dropped", "failed_grabs",
+                "frames_rendered", "audio_triggers", "audio_rejected", "audio_played", "audio_errors",
+                "server_rejected", "export_frames_dropped")
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.hud = False
+        self.started = time.time()
+        self.histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.histograms["audio_decode"] = LatencyHistogram()
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def time(self, stage, seconds):
+        """Records how long one run of a stage took."""
+        if self.enabled:
+            with self._lock:
+                self.histograms[stage].observe(seconds)
+
+    def increment(self, counter, amount=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[counter] += amount
+
+    def snapshot(self):
+        """
+        Current values as a JSON-friendly dict (latencies in milliseconds;
+        a quantile past the last bucket is None, as JSON has no infinity).
+        """
+        def milliseconds(seconds):
+            return round(1000 * seconds, 3) if math.isfinite(seconds) else None
+
+        stages = {}
+        with self._lock:
+            for stage, histogram in self.histograms.items():
+                if histogram.count:
+                    stages[stage] = {
+                        "count": histogram.count,
+                        "mean_ms": milliseconds(histogram.total / histogram.count),
+                        "p50_ms": milliseconds(histogram.quantile(0.5)),
+                        "p95_ms": milliseconds(histogram.quantile(0.95)),
+                        "p99_ms": milliseconds(histogram.quantile(0.99)),
+                    }
+            counters = dict(self.counters)
+        return {"time": time.time(), "uptime": round(time.time() - self.started, 1),
+                "stages": stages, "counters": counters}
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            return self._prometheus_lines()
+
+    def _prometheus_lines(self):
+        lines = ["# TYPE pluck_stage_seconds histogram"]
+        for stage, histogram in self.histograms.items():
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'pluck_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'pluck_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'pluck_stage_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+            lines.append(f'pluck_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        for counter, value in self.counters.items():
+            lines.append(f"# TYPE pluck_{counter}_total counter")
+            lines.append(f"pluck_{counter}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def hud_lines(self):
+        """Short text lines for the on-video overlay: last and p95 time per stage, then the counters."""
+        lines = []
+        for stage in self.STAGES:
+            histogram = self.histograms[stage]
+            if histogram.count:
+                lines.append(f"{stage:<9} {1000 * histogram.last:6.1f} ms  p95 {1000 * histogram.quantile(0.95):5.0f}")
+        dropped = self.counters["capture_frames_dropped"] + self.counters["display_frames_dropped"]
+        lines.append(f"dropped {dropped}  failed {self.counters['failed_grabs']}  "
+                     f"audio {self.counters['audio_triggers']}")
+        return lines
+
+def draw_metrics_hud(frame_rgb, lines):
+    """Draws the metrics HUD in the top-left corner of an RGB frame."""
+    for i, line in enumerate(lines):
+        origin = (8, 18 + 16 * i)
+        cv2.putText(frame_rgb, line, origin, cv2.FONT_HERSHEY_PLAIN, 1.0, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(frame_rgb, line, origin, cv2.FONT_HERSHEY_PLAIN, 1.0, (255, 255, 0), 1, cv2.LINE_AA)
+
+def start_metrics_log(path, interval=METRICS_LOG_INTERVAL):
+    """Appends a metrics snapshot to a JSON-lines file every `interval` seconds, on a daemon thread."""
+    def write_snapshots():
+        while True:
+            time.sleep(interval)
+            try:
+                with open(path, "a") as f:
+                    f.write(json.dumps(metrics.snapshot()) + "\n")
+            except OSError as e:
+                print(f"Error writing metrics log: {e}")
+
+    threading.Thread(target=write_snapshots, name="metrics-log", daemon=True).start()
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serves the metrics in Prometheus text format at http://host:port/metrics."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # keep scrapes out of the console
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Serving metrics at http://{host}:{port}/metrics")
+    return server
+
+# --- Audio Engine ---
+class AudioEngine:
+    """
+    Plays the movie dialogues from one long-lived worker thread.
+
+    The audio folders are indexed once and re-listed only when they change.
+    Clips are decoded once with pydub into 16-bit PCM in a single format and
+    kept in memory, evicting the least recently used ones when the cache goes
+    over its byte budget. The worker owns one sounddevice output stream for
+    its whole life and writes the cached PCM to it, so a trigger never
+    touches the disk or starts a thread or process.
+    """
+
+    def __init__(self, folders, cache_budget_bytes=AUDIO_CACHE_BUDGET_BYTES,
+                 refresh_interval=AUDIO_INDEX_REFRESH_INTERVAL):
+        self.folders = list(folders)
+        self.cache_budget_bytes = cache_budget_bytes
+        self.refresh_interval = refresh_interval
+
+        self._index = {}          # folder -> list of clip paths
+        self._index_mtimes = {}   # folder -> folder mtime when last listed
+        self._cache = OrderedDict()  # clip path -> decoded PCM bytes, oldest first
+        self._cache_bytes = 0
+
+        self._requests = queue.PriorityQueue()
+        self._request_count = 0
+        self._lock = threading.Lock()
+        self._pending_priority = None  # priority of the queued request, if any
+        self._playing = False
+        self._running = False
+        self._thread = None
+        self._stream = None
+
+    def start(self):
+        """Starts the worker thread, which indexes the folders and preloads clips."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="audio", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Asks the worker thread to exit after the current clip."""
+        self._running = False
+        self._requests.put((-1, -1, None))
+
+    def is_busy(self):
+        """True while a clip is queued or playing."""
+        with self._lock:
+            return self._playing or self._pending_priority is not None
+
+    def play_random(self, folder_path, priority=0):
+        """
+        Queues a random clip from folder_path. Returns False without queuing
+        if a clip is already playing, or one of equal or higher priority
+        (lower number) is already waiting, so dialogues never overlap, or if
+        the engine isn't running (e.g. no audio output could be opened).
+        """
+        with self._lock:
+            if not self._running or self._playing:
+                return False
+            if self._pending_priority is not None and priority >= self._pending_priority:
+                return False
+            self._pending_priority = priority
+            self._request_count += 1
+            self._requests.put((priority, self._request_count, folder_path))
+        return True
+
+    def refresh_index(self, force=False):
+        """Re-lists any audio folder whose modification time has changed."""
+        for folder_path in self.folders:
+            try:
+                mtime = os.stat(folder_path).st_mtime
+            except OSError:
+                if folder_path in self._index:
+                    print(f"Audio folder not found: {folder_path}")
+                self._index.pop(folder_path, None)
+                self._index_mtimes.pop(folder_path, None)
+                continue
+
+            if not force and self._index_mtimes.get(folder_path) == mtime:
+                continue
+
+            clips = sorted(os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith('.mp3'))
+            self._index[folder_path] = clips
+            self._index_mtimes[folder_path] = mtime
+
+            # Forget decoded clips that were removed from the folder
+            for path in [p for p in self._cache if os.path.dirname(p) == folder_path and p not in clips]:
+                self._cache_bytes -= len(self._cache.pop(path))
+
+    def preload(self):
+        """Decodes clips into the cache until the byte budget is reached."""
+        for folder_path in self.folders:
+            for path in self._index.get(folder_path, []):
+                if not self._running or self._cache_bytes >= self.cache_budget_bytes:
+                    return
+                self._load_clip(path)
+
+    def _load_clip(self, path):
+        """Returns the PCM for path, decoding and caching it if needed."""
+        pcm = self._cache.get(path)
+        if pcm is not None:
+            self._cache.move_to_end(path)
+            return pcm
+
+        start = time.perf_counter()
+        segment = pydub.AudioSegment.from_file(path)
+        segment = segment.set_frame_rate(AUDIO_SAMPLE_RATE).set_channels(AUDIO_CHANNELS).set_sample_width(2)
+        pcm = segment.raw_data
+        metrics.time("audio_decode", time.perf_counter() - start)
+        self._cache[path] = pcm
+        self._cache_bytes += len(pcm)
+
+        # Evict least recently used clips, but always keep the one just loaded
+        while self._cache_bytes > self.cache_budget_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+        return pcm
+
+    def _run(self):
+        """Worker thread: opens the output stream, preloads clips, then serves requests."""
+        try:
+            self._stream = sounddevice.RawOutputStream(samplerate=AUDIO_SAMPLE_RATE, channels=AUDIO_CHANNELS,
+                                                       dtype="int16")
+            self._stream.start()
+        except Exception as e:
+            print(f"Error opening audio output, dialogues are disabled: {e}")
+            with self._lock:
+                self._running = False
+            return
+
+        try:
+            self.refresh_index(force=True)
+            self.preload()
+        except Exception as e:
+            print(f"Error preparing audio: {e}")
+
+        try:
+            self._serve()
+        finally:
+            self._stream.close()
+            self._stream = None
+
+    def _serve(self):
+        """Serves playback requests and refreshes the index when idle."""
+
+        while self._running:
+            try:
+                _, _, folder_path = self._requests.get(timeout=self.refresh_interval)
+            except queue.Empty:
+                try:
+                    self.refresh_index()
+                except Exception as e:
+                    print(f"Error refreshing audio folders: {e}")
+                continue
+
+            if folder_path is None:
+                break
+
+            with self._lock:
+                # Anything still queued was superseded by this higher-priority request
+                while not self._requests.empty():
+                    if self._requests.get_nowait()[2] is None:
+                        self._running = False
+                self._pending_priority = None
+                self._playing = True
+
+            try:
+                self._play_from(folder_path)
+                metrics.increment("audio_played")
+            except Exception as e:
+                metrics.increment("audio_errors")
+                print(f"Error playing audio: {e}")
+            finally:
+                with self._lock:
+                    self._playing = False
+
+    def _play_from(self, folder_path):
+        """Plays a random clip from an indexed folder on the worker thread."""
+        clips = self._index.get(folder_path)
+        if clips is None:
+            print(f"Audio folder not found: {folder_path}")
+            return
+        if not clips:
+            print(f"No audio files found in {folder_path}.")
+            return
+
+        audio_path = random.choice(clips)
+        print(f"Playing: {audio_path}")
+        pcm = memoryview(self._load_clip(audio_path))
+        # Written in blocks, so stop() doesn't have to wait for a long clip to finish
+        block_bytes = AUDIO_WRITE_FRAMES * AUDIO_CHANNELS * 2
+        for offset in range(0, len(pcm), block_bytes):
+            if not self._running:
+                break
+            self._stream.write(pcm[offset:offset + block_bytes])
+
+# --- Animated GIF Loading ---
+class GifFrameLoader:
+    """
+    Loads an animated GIF's frames resized to a target size, incrementally.
+
+    load_first_frame() returns the first frame right away; start() then
+    decodes and resizes the remaining frames on a background thread.
+    Resized frames are written to an on-disk cache keyed on the GIF's
+    content hash and the target size, so later launches only read PNGs.
+    Frames are kept as compact palette images and converted for display
+    one at a time, instead of holding a full-size PhotoImage per frame.
+    """
+
+    def __init__(self, path, size=GIF_DISPLAY_SIZE, cache_dir=GIF_CACHE_DIR):
+        self.path = path
+        self.size = tuple(size)
+        self.frames = []      # resized frames, in display order
+        self.durations = []   # per-frame display time in milliseconds
+        self.done = False     # True once every frame has been loaded
+        self._cancelled = False
+        self._thread = None
+
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.cache_path = os.path.join(cache_dir, f"{digest}_{self.size[0]}x{self.size[1]}")
+
+    def _cached_frame_path(self, index):
+        return os.path.join(self.cache_path, f"frame_{index:04d}.png")
+
+    def _manifest_path(self):
+        return os.path.join(self.cache_path, "durations.json")
+
+    def _is_cached(self):
+        return os.path.exists(self._manifest_path())
+
+    def load_first_frame(self):
+        """Loads (and caches) only the first frame, so it can be shown immediately."""
+        if self._is_cached():
+            with open(self._manifest_path()) as f:
+                durations = json.load(f)
+            frame = Image.open(self._cached_frame_path(0))
+            frame.load()
+        else:
+            with Image.open(self.path) as gif:
+                frame, duration = self._resize_frame(gif)
+            durations = [duration]
+
+        self.frames.append(frame)
+        self.durations.append(durations[0])
+        return frame
+
+    def start(self):
+        """Loads the remaining frames on a background thread."""
+        if self._cancelled:
+            return
+        # The thread appends to these lists, so after cancel() swaps them out it can't touch the new ones
+        self._thread = threading.Thread(target=self._load_remaining, args=(self.frames, self.durations),
+                                        name="gif-loader", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """Stops background loading and lets go of the decoded frames."""
+        self._cancelled = True
+        self.frames = []
+        self.durations = []
+
+    def _resize_frame(self, gif):
+        """Resizes the GIF's current frame and returns it with its duration."""
+        duration = gif.info.get("duration") or GIF_DEFAULT_FRAME_DURATION
+        if duration < 20:
+            # Browsers treat near-zero delays as "as fast as possible"; slow them down the same way
+            duration = GIF_DEFAULT_FRAME_DURATION
+        resized = gif.convert("RGBA").resize(self.size, Image.Resampling.LANCZOS)
+        # A 256-colour palette is lossless enough for a GIF and a quarter of the memory of RGBA
+        return resized.quantize(colors=256, method=Image.Quantize.FASTOCTREE), duration
+
+    def _load_remaining(self, frames, durations):
+        try:
+            if self._is_cached():
+                self._load_from_cache(frames, durations)
+            else:
+                self._decode_and_cache(frames, durations)
+            self.done = not self._cancelled
+        except Exception as e:
+            print(f"Error loading GIF: {e}")
+            # Animate whatever was loaded rather than waiting forever
+            self.done = True
+
+    def _load_from_cache(self, frames, durations):
+        with open(self._manifest_path()) as f:
+            cached_durations = json.load(f)
+        for index in range(1, len(cached_durations)):
+            if self._cancelled:
+                return
+            frame = Image.open(self._cached_frame_path(index))
+            frame.load()
+            frames.append(frame)
+            durations.append(cached_durations[index])
+
+    def _decode_and_cache(self, frames, durations):
+        if self._cancelled:
+            return
+        os.makedirs(self.cache_path, exist_ok=True)
+        frames[0].save(self._cached_frame_path(0))
+
+        with Image.open(self.path) as gif:
+            for index in range(1, gif.n_frames):
+                if self._cancelled:
+                    return
+                gif.seek(index)
+                frame, duration = self._resize_frame(gif)
+                frame.save(self._cached_frame_path(index))
+                frames.append(frame)
+                durations.append(duration)
+
+        # The manifest is written last, so a half-written cache is never used
+        with open(self._manifest_path(), "w") as f:
+            json.dump(durations, f)
+
+# --- Camera Manager ---
+class CameraManager:
+    """
+    Finds a working webcam once, in the background, and keeps it open.
+
+    Discovery tries the index that worked last time (cached in
+    CAMERA_CACHE_PATH) before probing 0..CAMERA_MAX_INDEX. The device is
+    configured for low latency (MJPG, fixed resolution and frame rate, a
+    one-frame driver buffer) and stays open across exercise switches, so
+    pressing Start only has to wait for the next frame.
+    """
+
+    def __init__(self, max_index=CAMERA_MAX_INDEX, cache_path=CAMERA_CACHE_PATH):
+        self.max_index = max_index
+        self.cache_path = cache_path
+        self.index = None
+        self.cap = None
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_discovery(self):
+        """Starts looking for a camera on a background thread (only once)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._discover, name="camera-discovery", daemon=True)
+            self._thread.start()
+
+    def _cached_index(self):
+        try:
+            with open(self.cache_path) as f:
+                return int(json.load(f)["index"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_index(self, index):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, "w") as f:
+                json.dump({"index": index}, f)
+        except OSError as e:
+            print(f"Could not cache the camera index: {e}")
+
+    def _configure(self, capture):
+        """Asks the driver for low-latency capture. Unsupported settings are silently ignored."""
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*CAMERA_FOURCC))
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+        capture.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+        # Hold a single frame in the driver, so reads return the newest one instead of a queued stale one
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def _discover(self):
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                cached = self._cached_index()
+                candidates = [cached] if cached is not None else []
+                candidates += [i for i in range(self.max_index + 1) if i != cached]
+                for index in candidates:
+                    capture = cv2.VideoCapture(index)
+                    if capture.isOpened():
+                        self._configure(capture)
+                        self.cap, self.index = capture, index
+                        if index != cached:
+                            self._save_index(index)
+                        break
+                    capture.release()
+                    print(f"Could not open camera {index}.")
+        except Exception as e:
+            print(f"Error looking for a webcam: {e}")
+        finally:
+            record_startup_timing("camera discovery", time.perf_counter() - start)
+            self.ready.set()
+
+    def open(self):
+        """
+        Returns the open camera, waiting for discovery if it is still running
+        and discovering again if the device has gone away. Returns None if no
+        camera can be opened.
+        """
+        self.start_discovery()
+        self.ready.wait()
+        with self._lock:
+            if self.cap is not None and self.cap.isOpened():
+                # Throw away the frame that sat in the buffer while nobody was reading
+                self.cap.grab()
+                return self.cap
+        # The camera was released or unplugged: look again
+        self.release()
+        self._thread = None
+        self.ready.clear()
+        self.start_discovery()
+        self.ready.wait()
+        return self.cap
+
+    def release(self):
+        """Closes the camera (on exit)."""
+        with self._lock:
+            if self.cap is not None:
+                self.cap.release()
+            self.cap = None
+
 # --- Global State ---
 last_audio_played_time = 0
-audio_is_playing = False
 app_running = False
 root = None
 cap = None
@@ -66,501 +1558,3518 @@ back_button = None
 # A global variable to hold the PhotoImage to prevent garbage collection
 img_tk = None
 # Global variable for GIF animation
-gif_frames = []
+gif_loader = None
+gif_photo = None
 gif_frame_index = 0
 gif_label = None
 gif_animation_id = None
 webcam_update_id = None
+# Rep counters for the exercise running in the GUI
+rep_state = RepState()
+# Records every displayed frame's landmarks when the app is started with --record
+session_recorder = None
+# Writes the annotated video when the app is started with --export
+session_exporter = None
+# The pose model's worker process while the app runs with --inference-process
+inference_process = None
+# Finds the webcam in the background at startup and keeps it open between exercises
+camera_manager = CameraManager()
+# Stage timers and counters (see the Metrics section); disabled unless asked for
+metrics = Metrics()
+# Saves every completed rep to WORKOUT_DB_PATH in the background; started by run_app()
+workout_store = None
+# The current Start..Stop run in workout_store
+workout_session_id = None
+# Plays the teasing dialogues; started by run_app()
+audio_engine = AudioEngine([INCORRECT_FORM_AUDIO_PATH, STANDING_STILL_AUDIO_PATH])
+# Pipeline threads and the latest-frame-wins queues between them
+capture_thread = None
+processing_thread = None
+model_thread = None
+frame_queue = None
+model_queue = None
+result_queue = None
+model_busy = threading.Event()
+# Reused frame arrays: raw BGR captures, RGB frames on their way to the screen,
+# and the copies handed to the model
+capture_buffers = None
+display_buffers = None
+model_buffers = None
+# Decides which frames go to the model, and predicts landmarks for the rest
+frame_scheduler = None
+landmark_predictor = None
+# Draws the skeleton for the GUI (used from the processing thread)
+skeleton_renderer = SkeletonRenderer()
+# Size (width, height) to scale the video to when SCALE_TO_LABEL is on
+display_size = None
+# Picks the crop and resolution Mediapipe runs at (see ADAPTIVE_INFERENCE)
+inference_scaler = None
+# Notices when the model can't keep up and a cheaper setting is needed
+overload_monitor = None
+last_status = None
+# The last (status text, color, feedback) from the rules, shown until the next detection
+rule_status = None
+# Where the predicted landmarks for the overlay are written each frame
+overlay_landmarks = new_landmark_array()
+
+
+active_exercise = None # a key of EXERCISES, e.g. 'squat' or 'hand_raise'
+
+# Model complexity, input scale and confidences for create_pose (see Model Calibration)
+model_profile = None
+# Mediapipe Pose, built lazily by the background warm-up (see start_pose_warmup)
+pose = None
+pose_ready = threading.Event()
+pose_warmup_thread = None
+
+# --- Pose Model Warm-up ---
+def create_pose(profile=None):
+    """
+    Builds a Mediapipe Pose instance with the settings in `profile`, by default
+    this machine's calibrated one. Offline scoring passes default_model_profile()
+    so its results don't depend on the machine that produced them.
+    """
+    profile = get_model_profile() if profile is None else profile
+    return mp_pose.Pose(model_complexity=profile["model_complexity"],
+                        min_detection_confidence=profile["min_detection_confidence"],
+                        min_tracking_confidence=profile["min_tracking_confidence"])
+
+def warm_up_pose():
+    """
+    Imports Mediapipe, builds the shared Pose graph and runs one dummy
+    inference so the first real pose.process call isn't slow.
+    """
+    global pose
+
+    try:
+        # Timed separately by LazyModule, so the build timing below is just the graph
+        mp_pose.load()
+
+        # Not calibrated on this machine yet (or last session was overloaded): benchmark the settings.
+        # Nothing is saved when there was nothing to measure, so this is retried on the next launch.
+        profile = load_model_profile()
+        if profile is None or profile.get("recalibrate") or not profile.get("measurements"):
+            start = time.perf_counter()
+            calibrated = calibrate_pose_model()
+            record_startup_timing("pose model calibration", time.perf_counter() - start)
+            if calibrated is not None:
+                set_model_profile(calibrated)
+
+        start = time.perf_counter()
+        new_pose = create_pose()
+        record_startup_timing("pose model build", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        new_pose.process(np.zeros((256, 256, 3), dtype=np.uint8))
+        record_startup_timing("pose warm-up inference", time.perf_counter() - start)
+
+        pose = new_pose
+    except Exception as e:
+        print(f"Error warming up pose model: {e}")
+    finally:
+        pose_ready.set()
+        mark_startup("pose ready")
+
+def start_pose_warmup():
+    """Starts the pose model warm-up on a background thread (only once)."""
+    global pose_warmup_thread
+    if pose_warmup_thread is None:
+        pose_warmup_thread = threading.Thread(target=warm_up_pose, name="pose-warmup", daemon=True)
+        pose_warmup_thread.start()
+
+def wait_for_pose():
+    """Returns the shared Pose, blocking only if the warm-up hasn't finished yet."""
+    start_pose_warmup()
+    if not pose_ready.is_set():
+        print("Waiting for the pose model to finish loading...")
+        pose_ready.wait()
+    return pose
+
+# --- Model Calibration ---
+def machine_fingerprint():
+    """Identifies the hardware a profile was measured on, so a copied .cache is re-measured."""
+    return f"{platform.system()}-{platform.machine()}-{platform.processor()}-{os.cpu_count()}"
+
+def default_model_profile():
+    """Mediapipe's defaults, used until a calibration has run."""
+    return {
+        "model_complexity": 1,
+        "input_scale": 1.0,
+        "min_detection_confidence": 0.5,
+        "min_tracking_confidence": 0.5,
+    }
+
+def load_model_profile(path=MODEL_PROFILE_PATH):
+    """Returns the saved profile, or None if there is none for this machine."""
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if profile.get("machine") != machine_fingerprint():
+        return None
+    return {**default_model_profile(), **profile}
+
+def save_model_profile(profile, path=MODEL_PROFILE_PATH):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(profile, f, indent=2)
+    except OSError as e:
+        print(f"Could not save the model profile: {e}")
+
+def get_model_profile():
+    """The profile create_pose uses: the saved one if any, else Mediapipe's defaults."""
+    global model_profile
+    if model_profile is None:
+        model_profile = load_model_profile() or default_model_profile()
+    return model_profile
+
+def set_model_profile(profile, save=True):
+    global model_profile
+    model_profile = profile
+    if save:
+        save_model_profile(profile)
+
+def load_calibration_frames(count=CALIBRATION_FRAMES):
+    """Reads the first `count` frames of the calibration clip as mirrored RGB arrays ([] without one)."""
+    if not os.path.exists(CALIBRATION_CLIP):
+        return []
+    video_cap = cv2.VideoCapture(CALIBRATION_CLIP)
+    frames = []
+    while len(frames) < count:
+        ret, frame = video_cap.read()
+        if not ret:
+            break
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frames.append(cv2.flip(frame, 1))
+    video_cap.release()
+    return frames
+
+def calibrate_pose_model(target_fps=MODEL_TARGET_FPS, frames=None):
+    """
+    Times every model complexity at every input scale on the calibration
+    clip and returns a profile with the most accurate setting (highest
+    complexity, then largest scale) whose 90th-percentile inference rate
+    reaches target_fps, or the fastest one if none does. Settings that
+    detect nobody in the clip are thrown away. Returns None if there was
+    nothing to measure (no clip, or nobody detected at any setting), so the
+    caller keeps whatever profile it already has.
+    """
+    frames = frames if frames is not None else load_calibration_frames()
+    if not frames:
+        print(f"No {CALIBRATION_CLIP} to calibrate with; keeping the current pose model settings.")
+        return None
+
+    print(f"Calibrating the pose model for {target_fps} FPS...")
+    measurements = []
+    for complexity in CALIBRATION_COMPLEXITIES:
+        try:
+            pose_model = mp_pose.Pose(model_complexity=complexity)
+        except Exception as e:
+            # e.g. the heavy model can't be downloaded
+            print(f"Skipping model complexity {complexity}: {e}")
+            continue
+
+        measured_any = False
+        fitted_any = False
+        for scale in CALIBRATION_SCALES:
+            height, width = frames[0].shape[:2]
+            size = (max(32, int(width * scale)), max(32, int(height * scale)))
+            inputs = [frame if scale == 1.0 else cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                      for frame in frames]
+            pose_model.reset()
+            pose_model.process(inputs[0])  # the first call pays one-off setup costs
+
+            latencies = []
+            detected = 0
+            for model_input in inputs[1:]:
+                start = time.perf_counter()
+                results = pose_model.process(model_input)
+                latencies.append(time.perf_counter() - start)
+                detected += results.pose_landmarks is not None
+            latency = float(np.percentile(latencies, 90))
+            fits = latency * target_fps <= 1.0
+            if not detected:
+                # Only the person detector ran, so the timing says nothing about this setting
+                print(f"  complexity {complexity}, scale {scale:.2f}: nobody detected, ignored")
+                continue
+            measurements.append({
+                "model_complexity": complexity,
+                "input_scale": scale,
+                "p90_latency_ms": round(latency * 1000, 2),
+                "detection_rate": round(detected / len(latencies), 3),
+                "fits": fits,
+            })
+            print(f"  complexity {complexity}, scale {scale:.2f}: {latency * 1000:6.1f} ms"
+                  f"{'' if fits else '  (too slow)'}")
+            measured_any = True
+            fitted_any = fitted_any or fits
+            if not fits:
+                break  # larger inputs will only be slower
+        pose_model.close()
+        if measured_any and not fitted_any:
+            break  # heavier models will only be slower
+        # A model that detected nobody says nothing about speed, so the heavier ones are still tried
+
+    if not measurements:
+        print(f"Nobody was detected in {CALIBRATION_CLIP}; keeping the current pose model settings.")
+        return None
+
+    profile = {**default_model_profile(), "machine": machine_fingerprint(), "created": time.time(),
+               "target_fps": target_fps, "measurements": measurements}
+    profile.update(pick_model_setting(measurements, target_fps))
+    print(f"Using model complexity {profile['model_complexity']} at input scale {profile['input_scale']}.")
+    return profile
+
+def pick_model_setting(measurements, target_fps, slowdown=1.0):
+    """
+    The best measured setting that keeps up with target_fps when everything
+    runs `slowdown` times slower than when it was measured.
+    """
+    fitting = [m for m in measurements if m["p90_latency_ms"] * slowdown * target_fps <= 1000.0]
+    if fitting:
+        best = max(fitting, key=lambda m: (m["model_complexity"], m["input_scale"]))
+    else:
+        best = min(measurements, key=lambda m: m["p90_latency_ms"])
+    return {"model_complexity": best["model_complexity"], "input_scale": best["input_scale"]}
+
+class OverloadMonitor:
+    """
+    Watches inference latency and reports when the model has been unable to
+    keep up with MODEL_TARGET_FPS * OVERLOAD_FPS_FRACTION for OVERLOAD_SECONDS.
+    """
+
+    def __init__(self, target_fps=MODEL_TARGET_FPS):
+        self.limit = 1.0 / (target_fps * OVERLOAD_FPS_FRACTION)
+        self.average_latency = None
+        self._overloaded_since = None
+
+    def observe(self, latency, now=None):
+        """Adds one inference latency; True once the overload has lasted OVERLOAD_SECONDS."""
+        now = time.perf_counter() if now is None else now
+        if self.average_latency is None:
+            self.average_latency = latency
+        else:
+            self.average_latency = 0.9 * self.average_latency + 0.1 * latency
+
+        if self.average_latency <= self.limit:
+            self._overloaded_since = None
+            return False
+        if self._overloaded_since is None:
+            self._overloaded_since = now
+            return False
+        if now - self._overloaded_since < OVERLOAD_SECONDS:
+            return False
+        self._overloaded_since = None
+        return True
+
+def step_down_model_profile(observed_latency):
+    """
+    Picks a cheaper setting after a sustained overload, scaling the calibration
+    measurements by how much slower the machine is now than when they were
+    taken, and flags the profile so the next launch re-calibrates from scratch.
+    The stepped-down setting is saved, so it is kept if that re-calibration
+    has nothing to measure. Returns True if the setting changed.
+    """
+    profile = {**get_model_profile(), "machine": machine_fingerprint()}
+    current = (profile["model_complexity"], profile["input_scale"])
+    measurements = profile.get("measurements") or []
+    measured = [m for m in measurements if (m["model_complexity"], m["input_scale"]) == current]
+
+    if measured:
+        slowdown = observed_latency * 1000.0 / measured[0]["p90_latency_ms"]
+        profile.update(pick_model_setting(measurements, profile.get("target_fps", MODEL_TARGET_FPS), slowdown))
+    elif profile["model_complexity"] > 0:
+        profile["model_complexity"] -= 1
+
+    profile["recalibrate"] = True
+    set_model_profile(profile)
+    changed = (profile["model_complexity"], profile["input_scale"]) != current
+    if changed:
+        print(f"Pose model overloaded ({observed_latency * 1000:.0f} ms per frame); switching to complexity "
+              f"{profile['model_complexity']} at input scale {profile['input_scale']}.")
+    return changed
+
+def run_calibration():
+    """Re-runs the calibration now (--calibrate) and saves the profile."""
+    profile = calibrate_pose_model()
+    if profile is None:
+        print(f"Nothing was measured, so {MODEL_PROFILE_PATH} was left unchanged.")
+        return
+    set_model_profile(profile)
+    print(f"Saved the model profile to {MODEL_PROFILE_PATH}")
+
+# --- Helper Functions ---
+def animate_gif():
+    """
+    Shows the next GIF frame and schedules the one after it using the
+    frame's own duration. Holds on the current frame while the loader
+    is still decoding the next one.
+    """
+    global root, gif_loader, gif_photo, gif_frame_index, gif_animation_id
+
+    try:
+        next_index = gif_frame_index + 1
+        if next_index >= len(gif_loader.frames):
+            if not gif_loader.done:
+                gif_animation_id = root.after(gif_loader.durations[gif_frame_index], animate_gif)
+                return
+            next_index = 0
+
+        gif_frame_index = next_index
+        gif_photo.paste(gif_loader.frames[gif_frame_index].convert("RGBA"))
+        gif_animation_id = root.after(gif_loader.durations[gif_frame_index], animate_gif)
+    except Exception as e:
+        print(f"Error animating GIF: {e}")
+
+def stop_gif_animation():
+    """Stops the GIF animation loop and frees its frames."""
+    global root, gif_animation_id, gif_loader, gif_photo
+    if gif_animation_id:
+        root.after_cancel(gif_animation_id)
+        gif_animation_id = None
+    if gif_loader:
+        gif_loader.cancel()
+        gif_loader = None
+    gif_photo = None
+
+class LatestFrameQueue:
+    """
+    A single-slot queue shared between two pipeline stages.
+    Putting a new item replaces any item that hasn't been picked up yet,
+    so a slow consumer always gets the freshest frame instead of a backlog.
+    """
+
+    def __init__(self):
+        self._item = None
+        self._has_item = False
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        """
+        Stores the item, dropping the previous one if it was never read.
+        Returns the dropped item (or None) so its buffer can be recycled.
+        """
+        with self._condition:
+            dropped = None
+            if self._has_item:
+                self.dropped += 1
+                dropped = self._item
+            self._item = item
+            self._has_item = True
+            self._condition.notify()
+            return dropped
+
+    def get(self, timeout=None):
+        """Waits for an item and returns it. Raises queue.Empty on timeout."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._has_item, timeout):
+                raise queue.Empty
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    def get_nowait(self):
+        """Returns the pending item without waiting. Raises queue.Empty if there is none."""
+        return self.get(timeout=0)
+
+    def clear(self):
+        """Discards any pending item."""
+        with self._condition:
+            self._item = None
+            self._has_item = False
+
+class FrameBufferPool:
+    """
+    Recycles frame arrays between pipeline stages, so in steady state every
+    frame reuses one of a few preallocated buffers instead of allocating.
+    A buffer is released back once the stage that received it is done.
+    """
+
+    def __init__(self, max_free=6):
+        self.max_free = max_free
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self, shape=None):
+        """
+        Returns a free buffer of the given (height, width, 3) shape, allocating
+        one if none is free. Without a shape, returns any free buffer or None
+        (for cv2 calls that allocate their own output when given None).
+        """
+        with self._lock:
+            for i, buffer in enumerate(self._free):
+                if shape is None or buffer.shape == shape:
+                    return self._free.pop(i)
+        if shape is None:
+            return None
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, buffer):
+        """Hands a buffer back for reuse."""
+        if buffer is None:
+            return
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(buffer)
+
+# --- Adaptive Inference Resolution ---
+class InferenceScaler:
+    """
+    Feeds Mediapipe a smaller image than the full camera frame.
+
+    While a person is tracked, inference runs on a crop around the previous
+    frame's landmark bounding box (plus a margin); when tracking is lost it
+    falls back to the whole frame. Either way the input is scaled by a
+    factor that adapts to keep inference within INFERENCE_LATENCY_BUDGET_MS.
+    The returned landmarks are mapped back to full-frame coordinates, so
+    the form checks and the drawing code don't know the difference.
+    """
+
+    def __init__(self, budget_ms=INFERENCE_LATENCY_BUDGET_MS, min_scale=INFERENCE_MIN_SCALE,
+                 margin=INFERENCE_ROI_MARGIN, max_scale=1.0):
+        self.budget = budget_ms / 1000.0
+        self.min_scale = min(min_scale, max_scale)
+        self.max_scale = max_scale
+        self.margin = margin
+        self.scale = max_scale
+        self.average_latency = None
+        self.roi = None  # (x0, y0, x1, y1) crop in pixels, or None for the full frame
+
+    def process(self, pose_model, frame_rgb):
+        """Runs pose_model on a scaled crop of frame_rgb and returns full-frame results."""
+        frame_height, frame_width = frame_rgb.shape[:2]
+        x0, y0, x1, y1 = self.roi or (0, 0, frame_width, frame_height)
+        crop_width, crop_height = x1 - x0, y1 - y0
+
+        input_width = max(32, int(crop_width * self.scale))
+        input_height = max(32, int(crop_height * self.scale))
+        if (input_width, input_height) == (frame_width, frame_height):
+            model_input = frame_rgb
+        else:
+            # cv2.resize also makes the crop contiguous, which Mediapipe needs
+            model_input = cv2.resize(frame_rgb[y0:y1, x0:x1], (input_width, input_height),
+                                     interpolation=cv2.INTER_AREA)
+
+        start = time.perf_counter()
+        results = pose_model.process(model_input)
+        self._adapt(time.perf_counter() - start)
+
+        if results.pose_landmarks:
+            if self.roi is not None:
+                # Landmarks are normalized to the crop; map them back to the full frame
+                x_scale = crop_width / frame_width
+                y_scale = crop_height / frame_height
+                x_offset = x0 / frame_width
+                y_offset = y0 / frame_height
+                for lm in results.pose_landmarks.landmark:
+                    lm.x = lm.x * x_scale + x_offset
+                    lm.y = lm.y * y_scale + y_offset
+                    lm.z = lm.z * x_scale
+            self._track(results.pose_landmarks.landmark, frame_width, frame_height)
+        else:
+            # Tracking lost: look at the whole frame again
+            self.roi = None
+
+        return results
+
+    def _adapt(self, latency):
+        """Nudges the input scale towards the latency budget."""
+        if self.average_latency is None:
+            self.average_latency = latency
+        else:
+            self.average_latency = 0.8 * self.average_latency + 0.2 * latency
+
+        if self.average_latency > self.budget * 1.1:
+            self.scale = max(self.min_scale, self.scale * 0.9)
+        elif self.average_latency < self.budget * 0.6:
+            self.scale = min(self.max_scale, self.scale * 1.05)
+
+    def _track(self, landmarks, frame_width, frame_height):
+        """
+        Updates the crop from this frame's landmarks. The crop only moves when
+        the person gets near its edge or changes size a lot, since Mediapipe's
+        own tracking works best on a stable input window.
+        """
+        points = [(lm.x, lm.y) for lm in landmarks if lm.visibility > 0.5]
+        if len(points) < 4:
+            self.roi = None
+            return
+
+        xs, ys = zip(*points)
+        box_x0, box_x1 = min(xs) * frame_width, max(xs) * frame_width
+        box_y0, box_y1 = min(ys) * frame_height, max(ys) * frame_height
+        box_width, box_height = box_x1 - box_x0, box_y1 - box_y0
+
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            inner_x, inner_y = (x1 - x0) * 0.05, (y1 - y0) * 0.05
+            inside = (box_x0 > x0 + inner_x and box_x1 < x1 - inner_x and
+                      box_y0 > y0 + inner_y and box_y1 < y1 - inner_y)
+            roi_area = (x1 - x0) * (y1 - y0)
+            box_area = (box_width * (1 + 2 * self.margin)) * (box_height * (1 + 2 * self.margin))
+            if inside and 0.6 < box_area / max(roi_area, 1.0) < 1.4:
+                return
+
+        margin_x = box_width * self.margin + 0.05 * frame_width
+        margin_y = box_height * self.margin + 0.05 * frame_height
+        x0 = int(max(0, box_x0 - margin_x))
+        y0 = int(max(0, box_y0 - margin_y))
+        x1 = int(min(frame_width, box_x1 + margin_x))
+        y1 = int(min(frame_height, box_y1 + margin_y))
+        if (x1 - x0) * (y1 - y0) > 0.8 * frame_width * frame_height:
+            # Cropping wouldn't save much, so keep the full frame
+            self.roi = None
+        else:
+            self.roi = (x0, y0, x1, y1)
+
+# --- Frame Scheduling & Landmark Prediction ---
+class LandmarkPredictor:
+    """
+    Constant-velocity filter over the landmarks Mediapipe reports.
+
+    The model thread calls observe() with each detection (and lose_track()
+    when it finds nobody). The frame thread calls take_result() to step the
+    rules and the recorder once per real model result, and
+    predict() for every displayed frame, which extrapolates the last
+    detection to that frame's capture time so the overlay keeps moving on
+    frames the model skipped. Predictions never reach the rules: extrapolating
+    amplifies landmark jitter, which would count reps that never happened.
+    """
+
+    def __init__(self, max_prediction=MAX_PREDICTION_SECONDS):
+        self.max_prediction = max_prediction
+        self._lock = threading.Lock()
+        self._last = new_landmark_array()
+        self._velocity = new_landmark_array()
+        self._last_time = None
+        self._has_velocity = False
+        self._fresh = False
+        self._result_time = None
+        self._scratch = new_landmark_array()
+        self._step = new_landmark_array()
+
+    def observe(self, landmarks, timestamp):
+        """Adds a detection (Mediapipe landmark objects or a (33, 4) array) taken at `timestamp`."""
+        if isinstance(landmarks, np.ndarray):
+            observed = landmarks
+        else:
+            observed = landmarks_to_array(landmarks, self._scratch)
+        with self._lock:
+            if self._last_time is not None and timestamp > self._last_time:
+                np.subtract(observed, self._last, out=self._step)
+                self._step /= timestamp - self._last_time
+                self._step[:, LANDMARK_VISIBILITY] = 0.0
+                if self._has_velocity:
+                    # Blend the newest velocity with the previous one to damp jitter
+                    self._velocity += self._step
+                    self._velocity *= 0.5
+                else:
+                    np.copyto(self._velocity, self._step)
+                    self._has_velocity = True
+            else:
+                self._velocity.fill(0.0)
+                self._has_velocity = False
+            np.copyto(self._last, observed)
+            self._last_time = timestamp
+            self._fresh = True
+
+    def lose_track(self, timestamp=None):
+        """
+        Forgets the person. With `timestamp`, this is a model result that
+        found nobody in the frame captured then, and take_result reports it.
+        """
+        with self._lock:
+            self._last_time = None
+            self._fresh = timestamp is not None
+            self._result_time = timestamp
+
+    def take_result(self, out):
+        """
+        Returns (capture time, detected) for the newest model result, copying
+        its landmarks into `out` if someone was detected, or None if there
+        has been no result since the last call.
+        """
+        with self._lock:
+            if not self._fresh:
+                return None
+            self._fresh = False
+            if self._last_time is None:
+                return self._result_time, False
+            np.copyto(out, self._last)
+            return self._last_time, True
+
+    def predict(self, timestamp, out):
+        """
+        Writes the predicted landmarks at `timestamp` into `out`.
+        Returns False (leaving `out` alone) if nobody is being tracked.
+        """
+        with self._lock:
+            if self._last_time is None:
+                return False
+            elapsed = min(max(timestamp - self._last_time, 0.0), self.max_prediction)
+            np.multiply(self._velocity, elapsed, out=out)
+            out += self._last
+            return True
+
+class FrameScheduler:
+    """
+    Keeps the display at TARGET_DISPLAY_FPS independent of model latency.
+
+    It measures how long each stage takes and, when Mediapipe is slower
+    than the frame interval, only sends every Nth frame to the model.
+    It also picks how long the GUI waits before checking for the next frame.
+    """
+
+    def __init__(self, target_fps=TARGET_DISPLAY_FPS):
+        self.frame_interval = 1.0 / target_fps
+        self.stage_costs = {}  # stage name -> smoothed seconds per frame
+        self.inference_stride = 1
+        self._frames_since_inference = 0
+
+    def record(self, stage, seconds):
+        """Adds a timing sample for a pipeline stage ('model', 'frame' or 'render')."""
+        previous = self.stage_costs.get(stage)
+        self.stage_costs[stage] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+        if stage == "model":
+            self.inference_stride = max(1, math.ceil(self.stage_costs["model"] / self.frame_interval))
+
+    def should_run_inference(self, model_busy):
+        """Called once per frame; True if this frame should go to the model."""
+        self._frames_since_inference += 1
+        if model_busy or self._frames_since_inference < self.inference_stride:
+            return False
+        self._frames_since_inference = 0
+        return True
+
+    def next_poll_delay_ms(self):
+        """How long the GUI should wait before checking for the next frame."""
+        render_cost = self.stage_costs.get("render", 0.0)
+        # Check twice per frame interval, minus the time painting takes
+        return max(1, int((self.frame_interval / 2 - render_cost) * 1000))
+
+# --- Inference Worker Process ---
+def run_inference_worker(frame_memory_name, result_memory_name, slot_bytes, slot_count, requests, results, stop_event):
+    """
+    Worker process: runs Mediapipe on frames placed in shared-memory slots and
+    writes each slot's landmarks into a shared (slots, 33, 4) array, then
+    reports (slot, timestamp, detected, seconds) on the results queue.
+    """
+    frame_memory = shared_memory.SharedMemory(name=frame_memory_name)
+    result_memory = shared_memory.SharedMemory(name=result_memory_name)
+    landmark_slots = np.ndarray((slot_count, NUM_POSE_LANDMARKS, 4), dtype=np.float32, buffer=result_memory.buf)
+    frame = None
+    try:
+        pose_model = create_pose()
+        scaler = InferenceScaler(max_scale=get_model_profile()["input_scale"]) if ADAPTIVE_INFERENCE else None
+        results.put(("ready",))
+
+        while not stop_event.is_set():
+            try:
+                request = requests.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if request is None:
+                break
+
+            slot, timestamp, shape = request
+            # A view of the slot, not a copy
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=frame_memory.buf, offset=slot * slot_bytes)
+            start = time.perf_counter()
+            output = scaler.process(pose_model, frame) if scaler else pose_model.process(frame)
+            detected = output.pose_landmarks is not None
+            if detected:
+                landmarks_to_array(output.pose_landmarks.landmark, landmark_slots[slot])
+            results.put(("result", slot, timestamp, detected, time.perf_counter() - start))
+        pose_model.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # The views must go before the shared memory can be closed
+        frame = None
+        landmark_slots = None
+        frame_memory.close()
+        result_memory.close()
+
+class InferenceProcess:
+    """
+    Runs the pose model in a worker process (see run_inference_worker).
+
+    The caller converts each frame straight into one of a ring of preallocated
+    shared-memory slots (acquire_slot) and only the slot number crosses the
+    process boundary (submit); landmarks come back through a small shared
+    array. If the worker dies or hangs it is restarted. acquire_slot() and
+    submit() are called from the processing thread, poll() and check_alive()
+    from the model thread.
+    """
+
+    def __init__(self, frame_shape, slot_count=INFERENCE_SLOTS):
+        self.slot_count = slot_count
+        self.slot_bytes = int(np.prod(frame_shape))
+        self.restarts = 0
+        self.ready = False
+        self.failed = False
+        self.landmarks = new_landmark_array()
+
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._frame_memory = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slot_count)
+        self._result_memory = shared_memory.SharedMemory(create=True, size=slot_count * self.landmarks.nbytes)
+        self._landmark_slots = np.ndarray((slot_count, NUM_POSE_LANDMARKS, 4), dtype=np.float32,
+                                          buffer=self._result_memory.buf)
+        self._views = {}
+        self._process = None
+
+    def start(self):
+        """Starts (or restarts) the worker process. It loads Mediapipe before reporting ready."""
+        with self._lock:
+            self.ready = False
+            self._free_slots = list(range(self.slot_count))
+            self._submit_times = {}
+            # Fresh queues: a worker that died mid-put can leave the old ones unusable
+            self._requests = self._context.Queue()
+            self._results = self._context.Queue()
+            self._stop_event = self._context.Event()
+            self._process = self._context.Process(
+                target=run_inference_worker, name="inference",
+                args=(self._frame_memory.name, self._result_memory.name, self.slot_bytes, self.slot_count,
+                      self._requests, self._results, self._stop_event),
+                daemon=True)
+            self._process.start()
+
+    def acquire_slot(self, shape):
+        """
+        Reserves a free slot for a frame of `shape`. Returns (slot, view), where
+        view is an array over the slot's shared memory to write the frame into,
+        or None if the worker isn't ready or every slot is in use.
+        """
+        with self._lock:
+            if not self.ready or not self._free_slots or int(np.prod(shape)) > self.slot_bytes:
+                return None
+            slot = self._free_slots.pop()
+            key = (slot, shape)
+            view = self._views.get(key)
+            if view is None:
+                view = self._views[key] = np.ndarray(shape, dtype=np.uint8, buffer=self._frame_memory.buf,
+                                                     offset=slot * self.slot_bytes)
+            return slot, view
+
+    def submit(self, slot, timestamp, shape):
+        """Queues the frame written into a slot from acquire_slot."""
+        with self._lock:
+            self._submit_times[slot] = time.perf_counter()
+            self._requests.put((slot, timestamp, shape))
+
+    def poll(self, timeout=0.1):
+        """
+        Waits for the next result. Returns (timestamp, detected, round-trip
+        seconds, inference seconds) with the landmarks in self.landmarks, or
+        None if nothing arrived.
+        """
+        try:
+            message = self._results.get(timeout=timeout)
+        except (queue.Empty, OSError, EOFError):
+            return None
+        if message[0] == "ready":
+            self.ready = True
+            print("Inference worker ready.")
+            return None
+
+        _, slot, timestamp, detected, inference_seconds = message
+        if detected:
+            np.copyto(self.landmarks, self._landmark_slots[slot])
+        with self._lock:
+            round_trip = time.perf_counter() - self._submit_times.pop(slot, time.perf_counter())
+            self._free_slots.append(slot)
+        return timestamp, detected, round_trip, inference_seconds
+
+    def check_alive(self):
+        """
+        Restarts the worker if it has died, or hung: a frame has been waiting
+        on it for more than INFERENCE_WORKER_TIMEOUT seconds. Returns True if
+        a restart happened.
+        """
+        if self.failed or self._process is None:
+            return False
+        if self._process.is_alive():
+            with self._lock:
+                oldest = min(self._submit_times.values(), default=None)
+            if oldest is None or time.perf_counter() - oldest < INFERENCE_WORKER_TIMEOUT:
+                return False
+            problem = f"hasn't answered for {INFERENCE_WORKER_TIMEOUT:.0f}s"
+        else:
+            problem = f"exited with code {self._process.exitcode}"
+
+        if self.restarts >= INFERENCE_WORKER_MAX_RESTARTS:
+            print(f"Error: The inference worker {problem} too many times; giving up.")
+            self._stop_worker()
+            self.failed = True
+            return False
+        self.restarts += 1
+        print(f"Inference worker {problem}; restarting ({self.restarts}/{INFERENCE_WORKER_MAX_RESTARTS})...")
+        self.restart()
+        return True
+
+    def restart(self):
+        """Replaces the worker with a fresh one (e.g. to pick up a new model profile)."""
+        self._stop_worker()
+        self.start()
+
+    def _stop_worker(self):
+        if self._process is not None:
+            self._stop_event.set()
+            try:
+                self._requests.put(None)
+            except (OSError, ValueError):
+                pass
+            self._process.join(timeout=2)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join(timeout=1)
+            if self._process.is_alive():
+                # A hung worker may not even handle SIGTERM
+                self._process.kill()
+                self._process.join(timeout=1)
+            self._process = None
+        self.ready = False
+
+    def stop(self):
+        """Stops the worker and frees the shared memory."""
+        self._stop_worker()
+        self._views.clear()
+        self._landmark_slots = None
+        self._frame_memory.close()
+        self._frame_memory.unlink()
+        self._result_memory.close()
+        self._result_memory.unlink()
+
+# --- Main Application Logic ---
+def check_standing_still(state, timestamp):
+    """
+    Checks for standing still: the landmark history has barely moved
+    for STANDING_STILL_SECONDS of wall-clock time.
+    """
+    return state.history.idle_seconds(timestamp) >= STANDING_STILL_SECONDS
+
+def analyze_landmarks(landmarks, state, exercise, timestamp=None):
+    """
+    Runs the prioritized form checks for one frame's (33, 4) landmark array,
+    captured at `timestamp` seconds (defaults to now).
+    Returns the status text, its color, and the feedback kind to play
+    (FEEDBACK_INCORRECT_FORM, FEEDBACK_STANDING_STILL or None).
+    """
+    if timestamp is None:
+        timestamp = time.perf_counter()
+    state.history.push(landmarks, timestamp)
+
+    reps_before = state.reps(exercise) if exercise in state.rules.index else 0
+    state.rules.evaluate(landmarks, state)
+
+    display_text = "Click a button to start an exercise"
+    text_color = "black"
+    feedback = None
+
+    # Priority 1: Check for incorrect form
+    if exercise in state.rules.index:
+        e = state.rules.index[exercise]
+        if state.rep_started is None:
+            state.rep_started = timestamp
+        state.rep_depth = min(state.rep_depth, float(state.rules.features[state.rules.depth_columns[e]]))
+        state.rep_peak_accuracy = max(state.rep_peak_accuracy, float(state.accuracies[e]))
+        completed = state.reps(exercise) > reps_before
+        if completed:
+            state.history.record_rep(timestamp)
+        phase = state.phase(exercise)
+        if phase.get("feedback"):
+            text_color = "red"
+            feedback = phase["feedback"]
+            display_text = phase["message"]
+        else:
+            display_text = state.rules.definitions[e]["display"].format(
+                reps=state.reps(exercise), accuracy=state.accuracy(exercise))
+
+    # Priority 2: Check for standing still (only if no incorrect form)
+    if feedback is None:
+        if check_standing_still(state, timestamp):
+            feedback = FEEDBACK_STANDING_STILL
+            text_color = "red"
+            display_text = STANDING_STILL_MESSAGE
+
+    if exercise in state.rules.index:
+        state.rep_feedback = state.rep_feedback or feedback
+        if completed:
+            if state.rep_listener is not None:
+                state.rep_listener(exercise, state.rep_depth, state.rep_peak_accuracy,
+                                   float(timestamp - state.rep_started), state.rep_feedback)
+            state.start_rep(timestamp)
+
+    return display_text, text_color, feedback
+
+def capture_loop():
+    """
+    Capture stage: reads frames from the webcam as fast as it delivers them
+    and hands the newest one, with its capture time, to the processing stage.
+    Runs on its own thread so a slow camera never blocks the GUI.
+    """
+    global app_running, cap, frame_queue, capture_buffers
+
+    while app_running:
+        # Read straight into a recycled buffer (cv2 allocates one if none is free yet)
+        start = time.perf_counter()
+        ret, frame = cap.read(capture_buffers.acquire())
+        if not ret:
+            capture_buffers.release(frame)
+            metrics.increment("failed_grabs")
+            print("Error: Failed to grab frame from webcam.")
+            time.sleep(1)
+            continue
+        captured_at = time.perf_counter()
+        metrics.time("capture", captured_at - start)
+        metrics.increment("frames_captured")
+
+        dropped = frame_queue.put((frame, captured_at))
+        if dropped is not None:
+            capture_buffers.release(dropped[0])
+            metrics.increment("capture_frames_dropped")
+
+def fit_size(frame_size, box_size):
+    """Returns the largest (width, height) with frame_size's aspect ratio that fits in box_size."""
+    scale = min(box_size[0] / frame_size[0], box_size[1] / frame_size[1])
+    return max(1, int(frame_size[0] * scale)), max(1, int(frame_size[1] * scale))
+
+def run_model(frame_rgb, timestamp):
+    """Runs Mediapipe on one frame and feeds the result to the landmark predictor."""
+    if ADAPTIVE_INFERENCE:
+        results = inference_scaler.process(pose, frame_rgb)
+    else:
+        results = pose.process(frame_rgb)
+
+    if results.pose_landmarks:
+        landmark_predictor.observe(results.pose_landmarks.landmark, timestamp)
+    else:
+        landmark_predictor.lose_track(timestamp)
+
+def switch_pose_model():
+    """Rebuilds the shared Pose with the current profile (on the model thread, between frames)."""
+    global pose, inference_scaler
+    old_pose = pose
+    pose = create_pose()
+    inference_scaler = InferenceScaler(max_scale=get_model_profile()["input_scale"])
+    landmark_predictor.lose_track()
+    old_pose.close()
+
+def model_loop():
+    """
+    Model stage: runs Mediapipe on the frames the scheduler picks, on its own
+    thread, so a slow model never holds up the frames being displayed.
+    """
+    global app_running, model_queue, model_buffers, frame_scheduler
+
+    while app_running:
+        try:
+            frame_rgb, timestamp = model_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+        try:
+            start = time.perf_counter()
+            run_model(frame_rgb, timestamp)
+            elapsed = time.perf_counter() - start
+            frame_scheduler.record("model", elapsed)
+            metrics.time("inference", elapsed)
+            if overload_monitor.observe(elapsed) and step_down_model_profile(overload_monitor.average_latency):
+                switch_pose_model()
+        except Exception as e:
+            print(f"Error running pose model: {e}")
+        finally:
+            model_buffers.release(frame_rgb)
+            model_busy.clear()
+
+def remote_model_loop():
+    """
+    Model stage when the pose model runs in a worker process: collects its
+    results, feeds them to the landmark predictor and restarts the worker if
+    it crashes.
+    """
+    global app_running, frame_scheduler
+
+    while app_running:
+        if inference_process.check_alive():
+            # Whatever was in flight died with the old worker
+            landmark_predictor.lose_track()
+            model_busy.clear()
+
+        result = inference_process.poll(timeout=0.1)
+        if result is None:
+            continue
+        timestamp, detected, round_trip, inference_seconds = result
+        if detected:
+            landmark_predictor.observe(inference_process.landmarks, timestamp)
+        else:
+            landmark_predictor.lose_track(timestamp)
+        frame_scheduler.record("model", round_trip)
+        metrics.time("inference", inference_seconds)
+        if overload_monitor.observe(inference_seconds) and step_down_model_profile(overload_monitor.average_latency):
+            # The new worker reads the updated profile when it starts
+            inference_process.restart()
+            landmark_predictor.lose_track()
+        model_busy.clear()
+
+def process_frame(frame, timestamp):
+    """
+    Runs the form checks on the newest detection, if one has arrived, draws
+    the landmarks predicted for this BGR frame's capture time, and hands the
+    frame to the model if the scheduler says so.
+    Returns the annotated RGB frame (a buffer from display_buffers), the
+    status text and its color.
+
+    The frame is mirrored in place and converted to RGB straight into the
+    display buffer and, when the model is due, straight into the model's
+    input buffer (a shared-memory slot with the worker process), so no
+    stage copies another's output.
+    """
+    global last_audio_played_time, active_exercise, capture_buffers, display_buffers, display_size, rule_status
+
+    # Flip the frame for a mirror effect (in place; the capture buffer is ours until released)
+    cv2.flip(frame, 1, dst=frame)
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=display_buffers.acquire(frame.shape))
+
+    # Send the frame for pose estimation when the model is due and free
+    if frame_scheduler.should_run_inference(model_busy.is_set()):
+        if inference_process is not None:
+            reserved = inference_process.acquire_slot(frame.shape)
+            if reserved is not None:
+                slot, view = reserved
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=view)
+                model_busy.set()
+                inference_process.submit(slot, timestamp, frame.shape)
+        else:
+            model_input = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=model_buffers.acquire(frame.shape))
+            model_busy.set()
+            model_queue.put((model_input, timestamp))
+    capture_buffers.release(frame)
+
+    # --- NEW: Prioritized feedback logic ---
+    # The rules and the recorder only ever see real model results, at the time they were captured
+    result = landmark_predictor.take_result(rep_state.landmark_array)
+    if result is not None and session_recorder is not None:
+        session_recorder.record(result[0], rep_state.landmark_array if result[1] else None, frame_rgb)
+    if result is not None and result[1]:
+        detection_time = result[0]
+        start = time.perf_counter()
+        rule_status = analyze_landmarks(rep_state.landmark_array, rep_state, active_exercise, detection_time)
+        metrics.time("rules", time.perf_counter() - start)
+
+        feedback = rule_status[2]
+        if feedback and (time.time() - last_audio_played_time > COOLDOWN_PERIOD):
+            # A dropped trigger doesn't start the cooldown, so the next frame can try again
+            if audio_engine.play_random(FEEDBACK_AUDIO_PATHS[feedback], FEEDBACK_AUDIO_PRIORITIES[feedback]):
+                metrics.increment("audio_triggers")
+                last_audio_played_time = time.time()
+            else:
+                metrics.increment("audio_rejected")
+
+    # The overlay follows the prediction, so it moves on every frame
+    landmarks = overlay_landmarks
+    detected = landmark_predictor.predict(timestamp, landmarks)
+
+    if detected and rule_status is not None:
+        # Between detections, keep showing the last result
+        display_text, text_color, feedback = rule_status
+    else: # No human detected
+        text_color = "black"
+        display_text = "Detecting human..."
+        feedback = None
+    # --- END NEW ---
+
+    # Optionally scale down to the label's size before the frame goes to Tk
+    target_size = display_size
+    if SCALE_TO_LABEL and target_size:
+        height, width = frame_rgb.shape[:2]
+        new_width, new_height = fit_size((width, height), target_size)
+        if (new_width, new_height) != (width, height):
+            scaled = cv2.resize(frame_rgb, (new_width, new_height),
+                                dst=display_buffers.acquire((new_height, new_width, 3)),
+                                interpolation=cv2.INTER_AREA)
+            display_buffers.release(frame_rgb)
+            frame_rgb = scaled
+
+    # Draw the pose landmarks at display resolution, after any scaling
+    if detected:
+        start = time.perf_counter()
+        skeleton_renderer.draw(frame_rgb, landmarks, active_exercise, feedback == FEEDBACK_INCORRECT_FORM)
+        metrics.time("overlay", time.perf_counter() - start)
+
+    if metrics.hud:
+        draw_metrics_hud(frame_rgb, metrics.hud_lines())
+
+    if session_exporter is not None and active_exercise in rep_state.rules.index:
+        session_exporter.submit(frame_rgb, timestamp, display_text, text_color, active_exercise,
+                                rep_state.reps(active_exercise), rep_state.accuracy(active_exercise))
+
+    return frame_rgb, display_text, text_color
+
+def processing_loop():
+    """
+    Processing stage: takes the newest captured frame, runs the form checks
+    and the overlay on it, and publishes the result for the GUI.
+    Stale frames are dropped by the queue, so lag never builds up.
+    """
+    global app_running, frame_queue, result_queue, display_buffers, frame_scheduler
+
+    while app_running:
+        try:
+            frame, timestamp = frame_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+        try:
+            start = time.perf_counter()
+            dropped = result_queue.put(process_frame(frame, timestamp))
+            if dropped is not None:
+                display_buffers.release(dropped[0])
+                metrics.increment("display_frames_dropped")
+            frame_scheduler.record("frame", time.perf_counter() - start)
+        except Exception as e:
+            print(f"Error processing frame: {e}")
+
+def show_frame(frame_rgb):
+    """
+    Paints an RGB frame into the video label. The same PhotoImage is
+    reused for every frame and only recreated when the frame size changes.
+    """
+    global frame_label, img_tk
+
+    height, width = frame_rgb.shape[:2]
+    # Wraps the array's memory without copying it
+    img = Image.frombuffer("RGB", (width, height), frame_rgb, "raw", "RGB", 0, 1)
+
+    if img_tk is None or (img_tk.width(), img_tk.height()) != (width, height):
+        img_tk = ImageTk.PhotoImage(image=img)
+        frame_label.configure(image=img_tk)
+        frame_label.image = img_tk
+    else:
+        img_tk.paste(img)
+
+def update_webcam_feed():
+    """
+    Render stage: paints the latest processed frame and status text
+    onto the Tkinter widgets. Runs on the Tk main thread and never waits
+    on the camera or the model.
+    """
+    global app_running, root, frame_label, status_label, webcam_update_id, result_queue, display_buffers, display_size, last_status, frame_scheduler
+
+    if not app_running:
+        return
+
+    if SCALE_TO_LABEL:
+        display_size = (frame_label.winfo_width(), frame_label.winfo_height())
+        if min(display_size) < 16:
+            # Not laid out yet
+            display_size = None
+
+    try:
+        frame_rgb, display_text, text_color = result_queue.get_nowait()
+    except queue.Empty:
+        pass
+    else:
+        if (display_text, text_color) != last_status:
+            status_label.configure(text=display_text, text_color=text_color)
+            last_status = (display_text, text_color)
+
+        start = time.perf_counter()
+        show_frame(frame_rgb)
+        display_buffers.release(frame_rgb)
+        elapsed = time.perf_counter() - start
+        frame_scheduler.record("render", elapsed)
+        metrics.time("render", elapsed)
+        metrics.increment("frames_rendered")
+
+    # Loop the function, sooner or later depending on how long painting takes
+    webcam_update_id = root.after(frame_scheduler.next_poll_delay_ms(), update_webcam_feed)
+
+def start_pipeline():
+    """Starts the capture, processing and model threads and the GUI render loop."""
+    global capture_thread, processing_thread, model_thread, frame_queue, model_queue, result_queue
+    global capture_buffers, display_buffers, model_buffers, inference_scaler, frame_scheduler, landmark_predictor, last_status
+    global overload_monitor, rule_status
+
+    frame_queue = LatestFrameQueue()
+    model_queue = LatestFrameQueue()
+    result_queue = LatestFrameQueue()
+    capture_buffers = FrameBufferPool()
+    display_buffers = FrameBufferPool()
+    model_buffers = FrameBufferPool(max_free=2)
+    inference_scaler = InferenceScaler(max_scale=get_model_profile()["input_scale"])
+    overload_monitor = OverloadMonitor()
+    frame_scheduler = FrameScheduler()
+    landmark_predictor = LandmarkPredictor()
+    model_busy.clear()
+    last_status = None
+    rule_status = None
+
+    capture_thread = threading.Thread(target=capture_loop, name="capture", daemon=True)
+    processing_thread = threading.Thread(target=processing_loop, name="processing", daemon=True)
+    model_thread = threading.Thread(target=remote_model_loop if inference_process else model_loop,
+                                    name="model", daemon=True)
+    capture_thread.start()
+    processing_thread.start()
+    model_thread.start()
+
+    update_webcam_feed()
+
+def stop_pipeline():
+    """
+    Waits for the pipeline threads to finish. app_running must already be False.
+    Call before releasing the camera so the capture thread isn't mid-read.
+    """
+    global capture_thread, processing_thread, model_thread
+
+    for thread in (capture_thread, processing_thread, model_thread):
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=2)
+    capture_thread = None
+    processing_thread = None
+    model_thread = None
+
+def start_inference_process(capture):
+    """Starts the pose model's worker process, with frame slots sized for the camera's frames."""
+    global inference_process
+    if inference_process is not None:
+        return
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)) or CAMERA_WIDTH
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) or CAMERA_HEIGHT
+    inference_process = InferenceProcess((height, width, 3))
+    inference_process.start()
+
+def stop_inference_process():
+    """Stops the pose model's worker process, if one is running. The pipeline must be stopped first."""
+    global inference_process
+    if inference_process is not None:
+        inference_process.stop()
+        inference_process = None
+
+def start_squat_logic():
+    """Starts the squat detection loop."""
+    global active_exercise
+    active_exercise = 'squat'
+    rep_state.reset()
+    start_app_logic()
+
+def start_hand_raise_logic():
+    """Starts the hand raise detection loop."""
+    global active_exercise
+    active_exercise = 'hand_raise'
+    rep_state.reset()
+    start_app_logic()
+
+def stop_webcam_feed():
+    """Stops the webcam and cancels the update loop."""
+    global app_running, cap, root, webcam_update_id
+    if webcam_update_id:
+        root.after_cancel(webcam_update_id)
+        webcam_update_id = None
+    app_running = False
+    stop_pipeline()
+    stop_inference_process()
+    camera_manager.release()
+
+def start_app_logic():
+    """Starts the webcam and processing loop."""
+    global app_running, cap, squat_start_button, hand_raise_start_button, stop_button, back_button
+    if app_running:
+        return
+
+    # Only blocks if the background warm-up started by the front page is still running
+    # (the inference worker process loads its own model)
+    if not INFERENCE_WORKER_PROCESS and wait_for_pose() is None:
+        print("Error: The pose model could not be loaded.")
+        return
+
+    app_running = True
+    start_workout_session()
+    print(f"App started. Current exercise: {active_exercise}")
+
+    # Disable the start buttons and enable the stop button
+    squat_start_button.configure(state="disabled")
+    hand_raise_start_button.configure(state="disabled")
+    stop_button.configure(state="normal")
+    back_button.configure(state="normal")
+
+
+    # Found and opened in the background at startup; normally just returns it
+    cap = camera_manager.open()
+    if cap is None:
+        print("Error: Could not open any webcam. Please ensure a camera is connected and not in use by another application.")
+        app_running = False
+        squat_start_button.configure(state="normal")
+        hand_raise_start_button.configure(state="normal")
+        return
+
+    if INFERENCE_WORKER_PROCESS:
+        start_inference_process(cap)
+
+    # Start the capture / inference / render pipeline
+    start_pipeline()
+
+def stop_app_logic():
+    """Stops the webcam and processing loop."""
+    global app_running, cap, squat_start_button, hand_raise_start_button, stop_button, back_button
+    if not app_running:
+        return
+
+    app_running = False
+    rep_state.history.clear()
+    print("App stopped.")
+
+    # Enable the start buttons and disable the stop button
+    squat_start_button.configure(state="normal")
+    hand_raise_start_button.configure(state="normal")
+    stop_button.configure(state="disabled")
+    back_button.configure(state="normal")
+
+    # The camera stays open (see CameraManager) so the next Start is instant
+    stop_pipeline()
+    stop_inference_process()
+
+def create_front_page():
+    """Creates the front page of the application."""
+    global root, status_label, gif_loader, gif_photo, gif_frame_index, gif_label, gif_animation_id
+
+    # Set the appearance mode and color theme
+    ctk.set_appearance_mode("Dark")
+    ctk.set_default_color_theme("green")
+
+    root = ctk.CTk()
+    root.title("pluck pluck")
+    root.geometry("600x600")
+    root.configure(fg_color="#FFFF00") # Lighter yellow theme
+
+    main_frame = ctk.CTkFrame(root, corner_radius=20, fg_color="#FFFF00")
+    main_frame.pack(pady=20, padx=20, fill="both", expand=True)
+
+    title_label = ctk.CTkLabel(main_frame, text="pluck pluck",
+                               font=ctk.CTkFont(family="Courier", size=40, weight="bold"), text_color="black")
+    title_label.pack(pady=(20, 10))
+
+
+    start_button = ctk.CTkButton(main_frame, text="Start App", command=lambda: [stop_gif_animation(), root.destroy(), create_gui()],
+                                 fg_color="#9370DB", hover_color="#A585E2", text_color="white",
+                                 font=ctk.CTkFont(size=16, weight="bold"), corner_radius=10)
+    start_button.pack(pady=10)
+
+    # --- NEW: Add GIF animation to the front page ---
+    gif_label = ctk.CTkLabel(main_frame, text="")
+    gif_label.pack(side="bottom", anchor="sw", padx=10, pady=10)
+
+    # Check if the GIF file exists using the standardized GIF_PATH
+    if os.path.exists(GIF_PATH):
+        try:
+            # Show the first frame now; the rest are decoded in the background
+            gif_loader = GifFrameLoader(GIF_PATH)
+            first_frame = gif_loader.load_first_frame()
+            gif_photo = ImageTk.PhotoImage(first_frame.convert("RGBA"))
+            gif_label.configure(image=gif_photo)
+            gif_frame_index = 0
+            gif_loader.start()
+
+            # Start the animation
+            gif_animation_id = root.after(gif_loader.durations[0], animate_gif)
+        except Exception as e:
+            print(f"Error loading GIF: {e}")
+    else:
+        print(f"Warning: GIF file '{GIF_PATH}' not found.")
+
+    # Load Mediapipe, warm up the pose model and find the webcam while the user looks at the duck
+    if not INFERENCE_WORKER_PROCESS:
+        start_pose_warmup()
+    camera_manager.start_discovery()
+    root.after_idle(mark_startup, "front page visible")
+
+    root.mainloop()
+
+def create_gui():
+    """Creates the main CustomTkinter GUI window and its widgets."""
+    global root, frame_label, squat_start_button, hand_raise_start_button, stop_button, status_label, back_button, img_tk
+
+    root = ctk.CTk()
+    # A PhotoImage belongs to the window it was made for, so start fresh
+    img_tk = None
+    root.title("Useless Exercise Form Detector")
+    root.geometry("600x600")
+    root.configure(fg_color="#FFFF00") # Lighter yellow theme
+
+    main_frame = ctk.CTkFrame(root, corner_radius=20, fg_color="#FFFF00")
+    main_frame.pack(pady=20, padx=20, fill="both", expand=True)
+
+    task_label = ctk.CTkLabel(main_frame, text="Choose the task:", font=ctk.CTkFont(size=16, weight="bold"), text_color="black")
+    task_label.pack(pady=(10, 5))
+
+    frame_label = ctk.CTkLabel(main_frame, text="", bg_color="black")
+    if SCALE_TO_LABEL:
+        frame_label.pack(pady=10, fill="both", expand=True)
+    else:
+        frame_label.pack(pady=10)
+
+    button_frame = ctk.CTkFrame(main_frame, fg_color="#FFFF00")
+    button_frame.pack(pady=10)
+
+    squat_start_button = ctk.CTkButton(button_frame, text="Start Squats", command=start_squat_logic,
+                                       fg_color="#9370DB", hover_color="#A585E2", text_color="white",
+                                       font=ctk.CTkFont(size=14, weight="bold"), corner_radius=10,
+                                       width=200, height=50)
+    squat_start_button.pack(pady=5, expand=True, fill="both")
+
+    hand_raise_start_button = ctk.CTkButton(button_frame, text="Start Hand Raise", command=start_hand_raise_logic,
+                                           fg_color="#9370DB", hover_color="#A585E2", text_color="white",
+                                           font=ctk.CTkFont(size=14, weight="bold"), corner_radius=10,
+                                           width=200, height=50)
+    hand_raise_start_button.pack(pady=5, expand=True, fill="both")
+
+    stop_button = ctk.CTkButton(button_frame, text="Stop", command=stop_app_logic, state="disabled",
+                                fg_color="#D32F2F", hover_color="#E53935", text_color="white",
+                                font=ctk.CTkFont(size=14, weight="bold"), corner_radius=10,
+                                width=200, height=50)
+    stop_button.pack(pady=5, expand=True, fill="both")
+
+    back_button = ctk.CTkButton(button_frame, text="Back", command=lambda: [stop_app_logic(), root.destroy(), create_front_page()],
+                                fg_color="gray", hover_color="darkgray", text_color="white",
+                                font=ctk.CTkFont(size=14, weight="bold"), corner_radius=10,
+                                width=200, height=50)
+    back_button.pack(pady=5, expand=True, fill="both")
+
+    status_label = ctk.CTkLabel(main_frame, text="", font=ctk.CTkFont(family="Arial", size=16, weight="bold"), text_color="black")
+    status_label.pack(pady=10)
+
+    def on_closing():
+        global app_running, cap
+        app_running = False
+        stop_pipeline()
+        stop_inference_process()
+        camera_manager.release()
+        if session_recorder is not None:
+            session_recorder.close()
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", on_closing)
+
+    # Start the Tkinter main loop
+    root.mainloop()
+
+# --- Headless Batch Mode ---
+# Pose instance owned by a batch worker process (one per worker)
+batch_pose = None
+
+def init_batch_worker():
+    """Pool initializer: builds this worker's own Mediapipe Pose instance."""
+    global batch_pose
+    # Not the calibrated profile: the same video must score the same on every machine
+    batch_pose = create_pose(default_model_profile())
+
+def analyze_video_file(video_path, exercise, output_dir, output_format):
+    """
+    Runs one recorded video through pose estimation and the form checks,
+    writes the per-frame results to output_dir and returns a summary dict.
+    Must be called in a process where init_batch_worker() has run.
+    """
+    video_cap = cv2.VideoCapture(video_path)
+    if not video_cap.isOpened():
+        print(f"Error: Could not open video {video_path}")
+        return {"file": video_path, "error": "could not open video", "frames": 0, "seconds": 0.0}
+
+    fps = video_cap.get(cv2.CAP_PROP_FPS) or 30.0
+    state = RepState()
+    # Each file is its own session, so don't let tracking carry over
+    batch_pose.reset()
+
+    frame_rows = []
+    standing_still_events = []
+    was_standing_still = False
+    frame_index = 0
+    start_time = time.perf_counter()
+
+    while True:
+        ret, frame = video_cap.read()
+        if not ret:
+            break
+
+        # Mirror the frame exactly like the live webcam feed does
+        frame = cv2.flip(frame, 1)
+        results = batch_pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        timestamp = frame_index / fps
+
+        detected = results.pose_landmarks is not None
+        status = "Detecting human..."
+        feedback = None
+        if detected:
+            landmarks = landmarks_to_array(results.pose_landmarks.landmark, state.landmark_array)
+            status, _, feedback = analyze_landmarks(landmarks, state, exercise, timestamp)
+
+        is_standing_still = feedback == FEEDBACK_STANDING_STILL
+        if is_standing_still and not was_standing_still:
+            standing_still_events.append({"frame": frame_index, "time": round(timestamp, 3)})
+        was_standing_still = is_standing_still
+
+        accuracy = state.accuracy(exercise)
+        frame_rows.append({
+            "frame": frame_index,
+            "time": round(timestamp, 3),
+            "detected": detected,
+            "accuracy": round(accuracy, 1) if detected else None,
+            "feedback": feedback,
+            "status": status,
+        })
+        frame_index += 1
+
+    video_cap.release()
+    elapsed = time.perf_counter() - start_time
+
+    summary = {
+        "file": video_path,
+        "exercise": exercise,
+        "frames": frame_index,
+        "video_fps": fps,
+        "seconds": round(elapsed, 3),
+        "reps": state.reps(exercise),
+        "seconds_per_rep": state.history.seconds_per_rep(),
+        "standing_still_events": standing_still_events,
+    }
+
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    if output_format in ("json", "both"):
+        with open(os.path.join(output_dir, base_name + ".json"), "w") as f:
+            json.dump(dict(summary, per_frame=frame_rows), f, indent=2)
+    if output_format in ("csv", "both"):
+        with open(os.path.join(output_dir, base_name + ".csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["frame", "time", "detected", "accuracy", "feedback", "status"])
+            writer.writeheader()
+            writer.writerows(frame_rows)
+
+    return summary
+
+def _analyze_video_task(task):
+    """Unpacks a task tuple for Pool.imap_unordered."""
+    return analyze_video_file(*task)
+
+def run_batch(video_dir, output_dir, exercise='squat', workers=None, output_format="both"):
+    """
+    Re-scores every video in video_dir without the GUI, spreading the
+    files across a pool of worker processes. Prints overall throughput.
+    """
+    video_files = sorted(
+        os.path.join(video_dir, f) for f in os.listdir(video_dir)
+        if f.lower().endswith(VIDEO_EXTENSIONS)
+    )
+    if not video_files:
+        print(f"No video files found in {video_dir}.")
+        return []
+
+    os.makedirs(output_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(video_files))
+    tasks = [(path, exercise, output_dir, output_format) for path in video_files]
+
+    print(f"Scoring {len(video_files)} video(s) with {workers} worker(s)...")
+    start_time = time.perf_counter()
+    summaries = []
+    # Spawn fresh workers so no Mediapipe graph or thread state is forked
+    with multiprocessing.get_context("spawn").Pool(processes=workers, initializer=init_batch_worker) as pool:
+        for summary in pool.imap_unordered(_analyze_video_task, tasks):
+            summaries.append(summary)
+            if "error" in summary:
+                continue
+            print(f"  {os.path.basename(summary['file'])}: {summary['reps']} reps, "
+                  f"{len(summary['standing_still_events'])} standing-still event(s), "
+                  f"{summary['frames']} frames in {summary['seconds']:.1f}s")
+
+    elapsed = time.perf_counter() - start_time
+    total_frames = sum(summary["frames"] for summary in summaries)
+    print(f"Done: {total_frames} frames in {elapsed:.1f}s ({total_frames / max(elapsed, 1e-9):.1f} frames/s across all workers)")
+    return summaries
+
+# --- Multi-Station Sessions ---
+class ExerciseSession:
+    """
+    One workout station: owns its capture device (a webcam index or a video
+    file standing in for one), its own Pose model and rep counters, so
+    several stations can run side by side. The audio cooldown is kept by
+    the dashboard, which owns the audio engine.
+    """
+
+    def __init__(self, station_id, source, exercise='squat', pace=True):
+        self.station_id = station_id
+        self.source = source
+        self.exercise = exercise
+        # Video files are played back at their own frame rate unless pace is False
+        self.pace = pace
+        self.is_file = not isinstance(source, int)
+        self.state = RepState()
+        self.renderer = SkeletonRenderer()
+        self.cap = None
+        self.pose = None
+        self._frame = None
+        self._frames_read = 0
+        self._fps = None
+        self._frame_interval = 0.0
+        self._next_frame_time = None
+
+    def open(self):
+        """Opens the capture device and builds the Pose model. Returns False if the device won't open."""
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            return False
+        if self.is_file:
+            self._fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+            if self.pace:
+                self._frame_interval = 1.0 / self._fps
+        self.pose = create_pose()
+        return True
+
+    def close(self):
+        """Releases the capture device and the Pose model."""
+        if self.cap is not None:
+            self.cap.release()
+        if self.pose is not None:
+            self.pose.close()
+
+    def step(self):
+        """
+        Reads and analyzes one frame. Returns (frame_rgb, status text, text color,
+        feedback or None), or None if no frame could be read.
+        """
+        if self._frame_interval:
+            now = time.perf_counter()
+            if self._next_frame_time is not None and now < self._next_frame_time:
+                time.sleep(self._next_frame_time - now)
+            self._next_frame_time = max(now, self._next_frame_time or now) + self._frame_interval
+
+        ret, frame = self.cap.read(self._frame)
+        if not ret:
+            return None
+        self._frame = frame
+        # Video files are timed by their own frame rate, so --no-pace doesn't speed up their clock
+        timestamp = self._frames_read / self._fps if self.is_file else time.perf_counter()
+        self._frames_read += 1
+
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        cv2.flip(frame_rgb, 1, dst=frame_rgb)
+        results = self.pose.process(frame_rgb)
+
+        feedback = None
+        if results.pose_landmarks:
+            landmarks = landmarks_to_array(results.pose_landmarks.landmark, self.state.landmark_array)
+            display_text, text_color, feedback = analyze_landmarks(landmarks, self.state, self.exercise, timestamp)
+            self.renderer.draw(frame_rgb, landmarks, self.exercise, feedback == FEEDBACK_INCORRECT_FORM)
+        else:
+            display_text, text_color = "Detecting human...", "black"
+
+        return frame_rgb, display_text, text_color, feedback
+
+    def reps(self):
+        """Reps counted so far for this station's exercise."""
+        return self.state.reps(self.exercise)
+
+def put_latest(mp_queue, item):
+    """Puts item on a bounded multiprocessing queue, dropping the oldest item if it is full."""
+    try:
+        mp_queue.put_nowait(item)
+    except queue.Full:
+        try:
+            mp_queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            mp_queue.put_nowait(item)
+        except queue.Full:
+            pass
+
+def run_station_worker(station_id, source, exercise, frames, events, stop_event, pace, tile_width):
+    """
+    Worker process for one station. Streams downscaled annotated frames and
+    status to `frames` (latest wins) and feedback/lifecycle events to `events`.
+    """
+    session = ExerciseSession(station_id, source, exercise, pace)
+    if not session.open():
+        events.put({"station": station_id, "type": "error", "message": f"Could not open {source}"})
+        return
+
+    frame_count = 0
+    start = time.perf_counter()
+    try:
+        while not stop_event.is_set():
+            update = session.step()
+            if update is None:
+                if session.is_file:
+                    break
+                print(f"Error: Station {station_id} failed to grab a frame.")
+                time.sleep(1)
+                continue
+
+            frame_rgb, display_text, text_color, feedback = update
+            frame_count += 1
+            if feedback:
+                events.put({"station": station_id, "type": "feedback", "feedback": feedback})
+
+            height, width = frame_rgb.shape[:2]
+            tile = cv2.resize(frame_rgb, fit_size((width, height), (tile_width, tile_width)),
+                              interpolation=cv2.INTER_AREA)
+            put_latest(frames, {
+                "station": station_id,
+                "frame": tile,
+                "status": display_text,
+                "color": text_color,
+                "reps": session.reps(),
+                "fps": frame_count / max(time.perf_counter() - start, 1e-9),
+            })
+    finally:
+        session.close()
+        elapsed = time.perf_counter() - start
+        events.put({"station": station_id, "type": "done", "frames": frame_count,
+                    "seconds": elapsed, "reps": session.reps()})
+
+def parse_station_source(source):
+    """Webcam indices are given as numbers; anything else is a video file path."""
+    return int(source) if source.isdigit() else source
+
+class SessionManager:
+    """
+    Runs one ExerciseSession per source, each in its own worker process so
+    Mediapipe inference isn't serialized by the GIL.
+    """
+
+    def __init__(self, sources, exercise='squat', pace=True, tile_width=DASHBOARD_TILE_WIDTH):
+        self.sources = [parse_station_source(str(source)) for source in sources]
+        self.exercise = exercise
+        self.pace = pace
+        self.tile_width = tile_width
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        self._events = self._context.Queue()
+        self._frame_queues = []
+        self._processes = []
+        self.finished = set()
+
+    def start(self):
+        """Starts one worker process per station."""
+        for station_id, source in enumerate(self.sources):
+            frames = self._context.Queue(maxsize=2)
+            process = self._context.Process(
+                target=run_station_worker,
+                args=(station_id, source, self.exercise, frames, self._events,
+                      self._stop_event, self.pace, self.tile_width),
+                name=f"station-{station_id}",
+                daemon=True,
+            )
+            process.start()
+            self._frame_queues.append(frames)
+            self._processes.append(process)
+
+    def latest_frames(self):
+        """Returns {station_id: newest frame update} for stations that sent one since the last call."""
+        updates = {}
+        for station_id, frames in enumerate(self._frame_queues):
+            while True:
+                try:
+                    updates[station_id] = frames.get_nowait()
+                except queue.Empty:
+                    break
+        return updates
+
+    def events(self):
+        """Returns the feedback, error and 'done' events received since the last call."""
+        received = []
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event["type"] in ("done", "error"):
+                self.finished.add(event["station"])
+            received.append(event)
+        return received
+
+    def all_finished(self):
+        """True once every station has stopped (e.g. all video files ended)."""
+        return len(self.finished) == len(self._processes)
+
+    def stop(self):
+        """Asks every station to stop and waits for the worker processes."""
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+def run_stations_headless(sources, exercise='squat', seconds=None, pace=True):
+    """
+    Runs the stations without a window (e.g. with video files standing in for
+    cameras) and prints per-station and total frame rates.
+    """
+    manager = SessionManager(sources, exercise, pace)
+    print(f"Running {len(manager.sources)} station(s)...")
+    start = time.perf_counter()
+    manager.start()
+    done_events = []
+    try:
+        while not manager.all_finished():
+            if seconds is not None and time.perf_counter() - start > seconds:
+                break
+            manager.latest_frames()
+            done_events += [event for event in manager.events() if event["type"] != "feedback"]
+            time.sleep(0.05)
+    finally:
+        manager.stop()
+        done_events += [event for event in manager.events() if event["type"] != "feedback"]
+
+    total_frames = 0
+    for event in sorted(done_events, key=lambda event: event["station"]):
+        if event["type"] == "error":
+            print(f"  station {event['station']}: {event['message']}")
+            continue
+        total_frames += event["frames"]
+        print(f"  station {event['station']}: {event['reps']} reps, {event['frames']} frames, "
+              f"{event['frames'] / max(event['seconds'], 1e-9):.1f} FPS")
+    elapsed = time.perf_counter() - start
+    print(f"Total: {total_frames / max(elapsed, 1e-9):.1f} FPS across all stations")
+    return done_events
+
+def create_dashboard(sources, exercise='squat'):
+    """Creates a window showing every station's annotated video and status."""
+    global root
+
+    manager = SessionManager(sources, exercise)
+    audio_engine.start()
+    manager.start()
+
+    root = ctk.CTk()
+    root.title("pluck pluck - stations")
+    root.configure(fg_color="#FFFF00")
+
+    columns = max(1, math.ceil(math.sqrt(len(manager.sources))))
+    tiles = []
+    for station_id, source in enumerate(manager.sources):
+        tile_frame = ctk.CTkFrame(root, corner_radius=10, fg_color="#FFFF00")
+        tile_frame.grid(row=station_id // columns, column=station_id % columns, padx=10, pady=10)
+        video_label = ctk.CTkLabel(tile_frame, text=f"Station {station_id + 1}: starting...", bg_color="black")
+        video_label.pack()
+        status = ctk.CTkLabel(tile_frame, text=str(source), font=ctk.CTkFont(family="Arial", size=14, weight="bold"),
+                              text_color="black")
+        status.pack(pady=5)
+        tiles.append({"video": video_label, "status": status, "photo": None})
+
+    frame_interval_ms = max(1, int(1000 / TARGET_DISPLAY_FPS))
+    # station id -> time its last dialogue was queued
+    last_audio_played_times = {}
+
+    def refresh():
+        for station_id, update in manager.latest_frames().items():
+            tile = tiles[station_id]
+            frame = update["frame"]
+            img = Image.frombuffer("RGB", (frame.shape[1], frame.shape[0]), frame, "raw", "RGB", 0, 1)
+            photo = tile["photo"]
+            if photo is None or (photo.width(), photo.height()) != img.size:
+                photo = tile["photo"] = ImageTk.PhotoImage(image=img)
+                tile["video"].configure(image=photo, text="")
+            else:
+                photo.paste(img)
+            tile["status"].configure(
+                text=f"Station {station_id + 1} | Reps: {update['reps']} | {update['fps']:.0f} FPS\n{update['status']}",
+                text_color=update["color"])
+
+        for event in manager.events():
+            if event["type"] == "feedback":
+                feedback = event["feedback"]
+                station_id = event["station"]
+                if (time.time() - last_audio_played_times.get(station_id, 0) > COOLDOWN_PERIOD
+                        and audio_engine.play_random(FEEDBACK_AUDIO_PATHS[feedback], FEEDBACK_AUDIO_PRIORITIES[feedback])):
+                    last_audio_played_times[station_id] = time.time()
+            elif event["type"] == "error":
+                tiles[event["station"]]["status"].configure(text=event["message"], text_color="red")
+
+        root.after(frame_interval_ms, refresh)
+
+    def on_closing():
+        manager.stop()
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", on_closing)
+    refresh()
+    root.mainloop()
+
+# --- Multi-Person Tracking ---
+def box_iou(a, b):
+    """Intersection over union of two (x0, y0, x1, y1) boxes."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+class PersonTrack:
+    """One person followed across frames, with their own Pose and rep counters."""
+
+    def __init__(self, track_id, box, pose_model):
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.float32)  # x0, y0, x1, y1 in pixels
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.misses = 0
+        self.pose = pose_model
+        self.state = RepState()
+        self.landmarks = self.state.landmark_array
+        self.detected = False
+        self.display_text = "Detecting human..."
+        self.text_color = "black"
+        self.feedback = None
+
+class MultiPersonTracker:
+    """
+    Follows up to MULTI_PERSON_MAX_PEOPLE people, each with their own
+    RepState, so the form checks never jump between people.
+
+    People are detected only every MULTI_PERSON_DETECT_INTERVAL frames (on a
+    small copy of the frame); in between, each track's box follows the
+    person's own landmarks, predicted forward by its recent motion. Every
+    track's crop is scaled to at most MULTI_PERSON_CROP_SIZE and the crops
+    run through a pool of Pose instances in parallel, so the cost grows with
+    the number of people rather than with the frame size. Detections are
+    matched to tracks by overlap with their predicted boxes, and tracks that
+    overlap each other coast on their motion, so IDs survive people crossing.
+    """
+
+    def __init__(self, exercise='squat', max_people=MULTI_PERSON_MAX_PEOPLE,
+                 detect_interval=MULTI_PERSON_DETECT_INTERVAL):
+        self.exercise = exercise
+        self.max_people = max_people
+        self.detect_interval = detect_interval
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        self.tracks = []
+        self.renderer = SkeletonRenderer()
+        self._idle_poses = []
+        self._executor = ThreadPoolExecutor(max_workers=max_people, thread_name_prefix="person-pose")
+        self._next_id = 1
+        self._frame_count = 0
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for pose_model in self._idle_poses + [track.pose for track in self.tracks]:
+            pose_model.close()
+        self._idle_poses.clear()
+        self.tracks.clear()
+
+    def detect_people(self, frame_rgb):
+        """Person boxes (x0, y0, x1, y1) in frame pixels, found on a small copy of the frame."""
+        height, width = frame_rgb.shape[:2]
+        scale = min(1.0, MULTI_PERSON_DETECT_WIDTH / width)
+        small = frame_rgb if scale == 1.0 else cv2.resize(frame_rgb, (int(width * scale), int(height * scale)),
+                                                           interpolation=cv2.INTER_AREA)
+        rects, weights = self.hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return []
+        keep = cv2.dnn.NMSBoxes([list(map(int, rect)) for rect in rects],
+                                [float(weight) for weight in np.ravel(weights)], 0.0, 0.4)
+        return [np.array([x, y, x + w, y + h], dtype=np.float32) / scale
+                for x, y, w, h in (rects[i] for i in np.ravel(keep))]
+
+    def update(self, frame_rgb, timestamp):
+        """Tracks, runs the pose model for and checks the form of everyone in one frame."""
+        height, width = frame_rgb.shape[:2]
+        for track in self.tracks:
+            track.box += track.velocity
+
+        if self._frame_count % self.detect_interval == 0:
+            self._match_detections(self.detect_people(frame_rgb))
+        self._frame_count += 1
+
+        # One crop per person, through the Pose pool at once
+        found = list(self._executor.map(lambda track: self._infer(track, frame_rgb), self.tracks))
+
+        occluded = set()
+        for i, a in enumerate(self.tracks):
+            for b in self.tracks[i + 1:]:
+                if box_iou(a.box, b.box) > MULTI_PERSON_OCCLUSION_IOU:
+                    occluded.update((a.track_id, b.track_id))
+
+        for track, detected in zip(self.tracks, found):
+            track.detected = detected
+            if not detected:
+                track.misses += 1
+                track.display_text, track.text_color, track.feedback = "Detecting human...", "black", None
+                continue
+            track.misses = 0
+            if track.track_id not in occluded:
+                self._follow_landmarks(track, width, height)
+            track.display_text, track.text_color, track.feedback = analyze_landmarks(
+                track.landmarks, track.state, self.exercise, timestamp)
+
+        for track in [track for track in self.tracks if track.misses > MULTI_PERSON_MAX_MISSES]:
+            self._drop(track)
+        return self.tracks
+
+    def _match_detections(self, detections):
+        """Continues each track with the detection overlapping its predicted box most; new people get new tracks."""
+        pairs = sorted(((box_iou(track.box, box), t, d) for t, track in enumerate(self.tracks)
+                        for d, box in enumerate(detections)), reverse=True)
+        matched_tracks, matched_detections = set(), set()
+        for iou, t, d in pairs:
+            if iou < MULTI_PERSON_MATCH_IOU:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            track = self.tracks[t]
+            if track.misses:
+                # Lost the landmarks: start again from the detection (a live landmark box is tighter)
+                track.box = detections[d].copy()
+                track.velocity[:] = 0.0
+            track.misses = 0
+
+        for d, box in enumerate(detections):
+            if d in matched_detections or len(self.tracks) >= self.max_people:
+                continue
+            if any(box_iou(track.box, box) >= MULTI_PERSON_MATCH_IOU for track in self.tracks):
+                continue  # a second detection of someone already tracked
+            pose_model = self._idle_poses.pop() if self._idle_poses else create_pose()
+            self.tracks.append(PersonTrack(self._next_id, box, pose_model))
+            self._next_id += 1
+
+    def _drop(self, track):
+        self.tracks.remove(track)
+        track.pose.reset()
+        self._idle_poses.append(track.pose)
+
+    def _infer(self, track, frame_rgb):
+        """Runs the track's Pose on its crop; fills track.landmarks in full-frame coordinates."""
+        height, width = frame_rgb.shape[:2]
+        x0, y0, x1, y1 = track.box
+        margin_x, margin_y = (x1 - x0) * MULTI_PERSON_CROP_MARGIN, (y1 - y0) * MULTI_PERSON_CROP_MARGIN
+        x0, y0 = max(0, int(x0 - margin_x)), max(0, int(y0 - margin_y))
+        x1, y1 = min(width, int(x1 + margin_x)), min(height, int(y1 + margin_y))
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return False
 
+        crop = frame_rgb[y0:y1, x0:x1]
+        scale = min(1.0, MULTI_PERSON_CROP_SIZE / max(x1 - x0, y1 - y0))
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(1, int((x1 - x0) * scale)), max(1, int((y1 - y0) * scale))),
+                              interpolation=cv2.INTER_AREA)
+        else:
+            crop = np.ascontiguousarray(crop)
+        results = track.pose.process(crop)
+        if not results.pose_landmarks:
+            return False
 
-squat_counter = 0
-squat_state = "UP"  # Can be "UP" or "DOWN"
-squat_accuracy = 0.0
+        landmarks = landmarks_to_array(results.pose_landmarks.landmark, track.landmarks)
+        landmarks[:, LANDMARK_X] = (x0 + landmarks[:, LANDMARK_X] * (x1 - x0)) / width
+        landmarks[:, LANDMARK_Y] = (y0 + landmarks[:, LANDMARK_Y] * (y1 - y0)) / height
+        return True
 
-hand_raise_counter = 0
-hand_raise_state = "DOWN"
-hand_raise_accuracy = 0.0
+    @staticmethod
+    def _follow_landmarks(track, width, height):
+        """Moves the track's box onto its visible landmarks and updates its motion."""
+        visible = track.landmarks[:, LANDMARK_VISIBILITY] >= SKELETON_VISIBILITY_THRESHOLD
+        if visible.sum() < 4:
+            return
+        xs = track.landmarks[visible, LANDMARK_X] * width
+        ys = track.landmarks[visible, LANDMARK_Y] * height
+        pad_x, pad_y = (xs.max() - xs.min()) * 0.1, (ys.max() - ys.min()) * 0.1
+        box = np.array([xs.min() - pad_x, ys.min() - pad_y, xs.max() + pad_x, ys.max() + pad_y], dtype=np.float32)
+        # The predicted box already includes last frame's velocity
+        track.velocity = 0.5 * track.velocity + 0.5 * (box - (track.box - track.velocity))
+        track.box = box
 
-active_exercise = None # 'squat' or 'hand_raise'
-prev_landmarks = None
-standing_still_counter = 0
-max_still_frames = 50
+    def draw(self, frame_rgb):
+        """Draws every tracked person's skeleton, box, ID and rep count."""
+        for track in self.tracks:
+            color = SKELETON_WARNING_COLOR if track.feedback else SKELETON_RULE_COLOR
+            x0, y0, x1, y1 = (int(v) for v in track.box)
+            cv2.rectangle(frame_rgb, (x0, y0), (x1, y1), color, 2)
+            label = f"#{track.track_id}: {track.state.reps(self.exercise)}"
+            cv2.putText(frame_rgb, label, (x0 + 4, max(18, y0 + 18)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            if track.detected:
+                self.renderer.draw(frame_rgb, track.landmarks, self.exercise,
+                                   track.feedback == FEEDBACK_INCORRECT_FORM)
 
-# Initialize Mediapipe Pose
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
-pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+    def status_lines(self):
+        return [f"#{track.track_id}: {track.display_text}" for track in self.tracks]
 
-# --- Helper Functions ---
-def calculate_angle(a, b, c):
-    """
-    Calculates the angle between three points (a, b, c) in degrees.
-    The arguments a, b, and c are Mediapipe landmark objects.
-    """
-    a = np.array([a.x, a.y])
-    b = np.array([b.x, b.y])
-    c = np.array([c.x, c.y])
+def run_multi_person(source, exercise='squat', seconds=None):
+    """Tracks everyone in a webcam or video without a window; prints each person's reps and the FPS."""
+    video_cap = cv2.VideoCapture(parse_station_source(source))
+    if not video_cap.isOpened():
+        print(f"Error: Could not open {source}")
+        return None
+    tracker = MultiPersonTracker(exercise)
+    frames = 0
+    people = {}
+    start = time.perf_counter()
+    try:
+        while seconds is None or time.perf_counter() - start < seconds:
+            ret, frame = video_cap.read()
+            if not ret:
+                break
+            frame_rgb = cv2.flip(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), 1)
+            for track in tracker.update(frame_rgb, time.perf_counter()):
+                people[track.track_id] = track.state.reps(exercise)
+            frames += 1
+    finally:
+        video_cap.release()
+        tracker.close()
+    elapsed = time.perf_counter() - start
+    for track_id, reps in sorted(people.items()):
+        print(f"  person #{track_id}: {reps} reps")
+    print(f"{frames} frames, {frames / max(elapsed, 1e-9):.1f} FPS, {len(people)} people seen")
+    return people
 
-    radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
-    angle = np.abs(radians * 180.0 / np.pi)
+def create_multi_person_window(source, exercise='squat'):
+    """Shows a webcam or video with every person's skeleton, ID and reps."""
+    global root
+
+    video_cap = cv2.VideoCapture(parse_station_source(source))
+    if not video_cap.isOpened():
+        print(f"Error: Could not open {source}")
+        return
+    tracker = MultiPersonTracker(exercise)
+
+    root = ctk.CTk()
+    root.title(f"pluck pluck - everyone doing {exercise.replace('_', ' ')}")
+    root.configure(fg_color="#FFFF00")
+    video_label = ctk.CTkLabel(root, text="", bg_color="black")
+    video_label.pack(padx=10, pady=10)
+    status = ctk.CTkLabel(root, text="", font=ctk.CTkFont(family="Arial", size=18, weight="bold"),
+                          text_color="black", justify="left")
+    status.pack(pady=5)
+    view = {"photo": None, "after": None}
+
+    def show_next():
+        ret, frame = video_cap.read()
+        if not ret:
+            status.configure(text="No more frames")
+            return
+        frame_rgb = cv2.flip(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), 1)
+        tracker.update(frame_rgb, time.perf_counter())
+        tracker.draw(frame_rgb)
+
+        img = Image.frombuffer("RGB", (frame_rgb.shape[1], frame_rgb.shape[0]), frame_rgb, "raw", "RGB", 0, 1)
+        photo = view["photo"]
+        if photo is None or (photo.width(), photo.height()) != img.size:
+            photo = view["photo"] = ImageTk.PhotoImage(image=img)
+            video_label.configure(image=photo)
+        else:
+            photo.paste(img)
+        status.configure(text="\n".join(tracker.status_lines()) or "Looking for people...")
+        view["after"] = root.after(1, show_next)
 
-    if angle > 180.0:
-        angle = 360 - angle
+    def on_closing():
+        if view["after"] is not None:
+            root.after_cancel(view["after"])
+        video_cap.release()
+        tracker.close()
+        root.destroy()
 
-    return angle
+    root.protocol("WM_DELETE_WINDOW", on_closing)
+    root.after_idle(show_next)
+    root.mainloop()
 
-def play_random_audio(folder_path):
+# --- Workout History ---
+class WorkoutStore:
     """
-    Selects a random audio file from the specified folder and plays it.
-    This function runs on a separate thread to prevent blocking the main video loop.
+    Per-rep workout history in SQLite. record_rep only appends to an
+    in-memory buffer, so the processing loop never waits on the disk; a
+    writer thread swaps the buffer out and inserts it in one transaction.
+    Queries open their own connection, so they can run from any thread.
     """
-    global audio_is_playing
 
-    if audio_is_playing:
-        return
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS reps (
+            id INTEGER PRIMARY KEY,
+            session TEXT NOT NULL,
+            day TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            exercise TEXT NOT NULL,
+            depth_angle REAL,
+            accuracy REAL,
+            tempo REAL,
+            feedback TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS reps_by_session ON reps (session, exercise)",
+        "CREATE INDEX IF NOT EXISTS reps_by_day ON reps (day, exercise)",
+    )
+    SUMMARY_COLUMNS = ("COUNT(*) AS reps, ROUND(AVG(accuracy), 1) AS mean_accuracy, "
+                       "ROUND(MIN(depth_angle), 1) AS deepest_angle, ROUND(AVG(tempo), 2) AS mean_tempo, "
+                       "SUM(feedback IS NOT NULL) AS reps_with_feedback, "
+                       "MIN(timestamp) AS first_rep, MAX(timestamp) AS last_rep")
 
-    try:
-        if not os.path.isdir(folder_path):
-            print(f"Audio folder not found: {folder_path}")
-            return
+    def __init__(self, path=WORKOUT_DB_PATH, flush_interval=WORKOUT_FLUSH_INTERVAL,
+                 flush_batch=WORKOUT_FLUSH_BATCH, buffer_limit=WORKOUT_BUFFER_LIMIT):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.buffer_limit = buffer_limit
+        self.written = 0
+        self.dropped = 0
+        self._buffer = []
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
 
-        audio_files = [f for f in os.listdir(folder_path) if f.endswith('.mp3')]
-        if not audio_files:
-            print(f"No audio files found in {folder_path}.")
+    def start(self):
+        """Creates the tables and starts the writer thread."""
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+        connection.close()
+        self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, name="workout-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return sqlite3.connect(self.path, timeout=30)
+
+    def new_session(self):
+        """An id for one Start..Stop run; sessions exist only through their reps."""
+        return uuid.uuid4().hex
+
+    def record_rep(self, session_id, exercise, depth_angle, accuracy, tempo, feedback=None, timestamp=None):
+        """Queues one completed rep. Never blocks on the disk; returns False if it was dropped."""
+        row = (session_id, time.time() if timestamp is None else timestamp, exercise,
+               depth_angle if math.isfinite(depth_angle) else None, accuracy, tempo, feedback)
+        with self._lock:
+            if len(self._buffer) >= self.buffer_limit:
+                self.dropped += 1
+                return False
+            self._buffer.append(row)
+            self._queued += 1
+            if len(self._buffer) >= self.flush_batch:
+                self._wake.set()
+        return True
+
+    def flush(self, timeout=10.0):
+        """Waits until every rep queued so far is on disk."""
+        with self._lock:
+            target = self._queued - self.dropped
+            self._wake.set()
+            return self._flushed.wait_for(lambda: self.written >= target, timeout)
+
+    def close(self):
+        """Writes whatever is still buffered and stops the writer thread."""
+        if self._thread is None:
             return
+        self._running = False
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
 
-        random_file = random.choice(audio_files)
-        audio_path = os.path.join(folder_path, random_file)
+    def _writer_loop(self):
+        connection = self._connect()
+        connection.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if rows:
+                # The day is worked out here rather than in record_rep, off the caller's thread
+                rows = [(session_id, time.strftime("%Y-%m-%d", time.localtime(timestamp)), timestamp, *rest)
+                        for session_id, timestamp, *rest in rows]
+                try:
+                    with connection:
+                        connection.executemany(
+                            "INSERT INTO reps (session, day, timestamp, exercise, depth_angle, accuracy, tempo, "
+                            "feedback) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                except sqlite3.Error as e:
+                    print(f"Could not save {len(rows)} reps to {self.path}: {e}")
+                    with self._lock:
+                        self.dropped += len(rows)
+                        self._flushed.notify_all()
+                    continue
+            with self._lock:
+                self.written += len(rows)
+                self._flushed.notify_all()
+            if not self._running and not self._buffer:
+                break
+        connection.close()
 
-        print(f"Playing: {audio_path}")
-        audio_is_playing = True
+    def _query(self, sql, parameters=()):
+        connection = self._connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in connection.execute(sql, parameters)]
+        finally:
+            connection.close()
 
-        # Determine the path to ffplay.exe
-        ffplay_path = utils.get_prober_name()
+    def session_summary(self, session_id):
+        """Per-exercise totals for one session."""
+        return self._query(f"SELECT exercise, {self.SUMMARY_COLUMNS} FROM reps WHERE session = ? "
+                           "GROUP BY exercise", (session_id,))
 
-        # Run ffplay as a subprocess
-        p = subprocess.Popen([ffplay_path, '-nodisp', '-autoexit', audio_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        p.wait()
+    def sessions_on(self, day):
+        """Per-session, per-exercise totals for a day ("YYYY-MM-DD", local time)."""
+        return self._query(f"SELECT session, exercise, {self.SUMMARY_COLUMNS} FROM reps WHERE day = ? "
+                           "GROUP BY session, exercise ORDER BY first_rep", (day,))
 
-        audio_is_playing = False
+    def daily_summary(self, days=7):
+        """Per-day, per-exercise totals for the last `days` days, newest first."""
+        since = time.strftime("%Y-%m-%d", time.localtime(time.time() - (days - 1) * 86400))
+        return self._query(f"SELECT day, exercise, {self.SUMMARY_COLUMNS} FROM reps WHERE day >= ? "
+                           "GROUP BY day, exercise ORDER BY day DESC, exercise", (since,))
 
-    except Exception as e:
-        print(f"Error playing audio: {e}")
-        audio_is_playing = False
+def start_workout_session():
+    """Starts a new history session for the GUI's rep counter."""
+    global workout_session_id
+    if workout_store is None:
+        return
+    workout_session_id = workout_store.new_session()
+    rep_state.rep_listener = lambda *rep: workout_store.record_rep(workout_session_id, *rep)
+
+def print_workout_history(days=7):
+    """Prints the per-day totals from WORKOUT_DB_PATH (--history)."""
+    if not os.path.exists(WORKOUT_DB_PATH):
+        print(f"No workout history yet ({WORKOUT_DB_PATH} doesn't exist).")
+        return
+    rows = WorkoutStore().daily_summary(days)
+    if not rows:
+        print(f"No reps in the last {days} days.")
+    for row in rows:
+        print(f"{row['day']}  {row['exercise']:<15} {row['reps']:>5} reps  accuracy {row['mean_accuracy']}%  "
+              f"deepest {row['deepest_angle']}  {row['mean_tempo']}s/rep  {row['reps_with_feedback']} with feedback")
 
-def run_audio_in_thread(folder_path):
+def run_workout_store_load_test(sessions=50, reps_per_second=5000, seconds=5.0, path=None):
     """
-    Starts the audio playback function in a new thread.
+    Feeds a scratch WorkoutStore reps_per_second reps from one thread per
+    session while a stand-in for the processing loop records a rep on each of
+    its TARGET_DISPLAY_FPS frames, then reports the sustained write rate, how
+    long record_rep kept the frame loop waiting, frames that ran late enough to
+    be lost, and the aggregate query times. False if a rep or a frame was lost.
     """
-    audio_thread = threading.Thread(target=play_random_audio, args=(folder_path,))
-    audio_thread.daemon = True
-    audio_thread.start()
+    import tempfile
 
-def animate_gif():
-    """Animates the GIF on the front page."""
-    global root, gif_frames, gif_frame_index, gif_label, gif_animation_id
+    scratch_dir = None
+    if path is None:
+        scratch_dir = tempfile.mkdtemp(prefix="workouts-")
+        path = os.path.join(scratch_dir, "load_test.db")
+    store = WorkoutStore(path).start()
+    exercises = list(EXERCISES)
+    deadline = time.perf_counter() + seconds
+    submitted = [0] * (sessions + 1)
+    session_ids = [store.new_session() for _ in range(sessions + 1)]
 
-    try:
-        gif_frame_index = (gif_frame_index + 1) % len(gif_frames)
-        gif_label.configure(image=gif_frames[gif_frame_index])
-        gif_animation_id = root.after(100, animate_gif)
-    except Exception as e:
-        print(f"Error animating GIF: {e}")
+    def session_worker(number):
+        rng = random.Random(number)
+        rate = reps_per_second / sessions
+        started = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            # Catch up to the target rate, then sleep a little
+            while submitted[number] < (now - started) * rate:
+                store.record_rep(session_ids[number], exercises[number % len(exercises)], rng.uniform(70, 120),
+                                 rng.uniform(50, 100), rng.uniform(1, 4),
+                                 FEEDBACK_INCORRECT_FORM if rng.random() < 0.2 else None,
+                                 timestamp=time.time() - rng.uniform(0, 7 * 86400))
+                submitted[number] += 1
+            time.sleep(0.01)
 
-def stop_gif_animation():
-    """Stops the GIF animation loop."""
-    global root, gif_animation_id
-    if gif_animation_id:
-        root.after_cancel(gif_animation_id)
+    frame_interval = 1.0 / TARGET_DISPLAY_FPS
+    call_samples = []
+    lost_frames = [0]
 
-# --- Main Application Logic ---
-def check_squat_form(landmarks):
+    def frame_loop():
+        next_frame = time.perf_counter()
+        while next_frame < deadline:
+            late = time.perf_counter() - next_frame
+            if late > frame_interval:
+                lost_frames[0] += 1
+            start = time.perf_counter_ns()
+            store.record_rep(session_ids[sessions], 'squat', 90.0, 100.0, 2.0)
+            call_samples.append(time.perf_counter_ns() - start)
+            submitted[sessions] += 1
+            next_frame += frame_interval
+            time.sleep(max(0.0, next_frame - time.perf_counter()))
+
+    threads = [threading.Thread(target=session_worker, args=(n,)) for n in range(sessions)]
+    threads.append(threading.Thread(target=frame_loop))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.flush(timeout=120)
+    elapsed = time.perf_counter() - start
+    store.close()
+
+    total = sum(submitted)
+    calls = summarize_latencies(call_samples)
+    print(f"Wrote {store.written}/{total} reps from {sessions} sessions in {elapsed:.2f}s "
+          f"({store.written / elapsed:.0f} reps/s, {store.dropped} dropped)")
+    print(f"Frame loop: record_rep p50 {calls['p50_ms'] * 1000:.1f} us, p99 {calls['p99_ms'] * 1000:.1f} us, "
+          f"{lost_frames[0]}/{len(call_samples)} frames late by more than a frame")
+
+    for name, query in (("session summary", lambda: store.session_summary(session_ids[0])),
+                        ("sessions on a day", lambda: store.sessions_on(time.strftime("%Y-%m-%d"))),
+                        ("daily summary", lambda: store.daily_summary(7))):
+        query_start = time.perf_counter()
+        rows = query()
+        print(f"{name}: {len(rows)} rows in {(time.perf_counter() - query_start) * 1000:.1f} ms")
+
+    if scratch_dir is not None:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(scratch_dir)
+    passed = store.written == total and lost_frames[0] == 0
+    print("PASSED" if passed else "FAILED")
+    return passed
+
+# --- Session Recording & Replay ---
+# A recording is a 64-byte header followed by fixed-width records, so the
+# file can be memory-mapped as one NumPy array however long the session was.
+RECORDING_MAGIC = b"PLUCKLM1"
+RECORDING_HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("record_size", "<u4"),
+    ("landmark_count", "<u4"),
+    ("created", "<f8"),
+    ("reserved", "u1", (40,)),
+])
+RECORDING_RECORD_DTYPE = np.dtype([
+    ("frame", "<u4"),
+    ("detected", "u1"),
+    ("flags", "u1"),
+    ("reserved", "u1", (2,)),
+    ("timestamp", "<f8"),
+    ("landmarks", "<f4", (NUM_POSE_LANDMARKS, 4)),
+])
+
+# Set in a record's flags when its video frame was skipped because the encoder was behind
+RECORDING_FLAG_NO_VIDEO = 1
+# Video frames waiting for the recording's encoder thread
+RECORDING_VIDEO_QUEUE_SIZE = 8
+
+def recording_video_path(path):
+    """Where the optional downscaled video of a recording lives."""
+    return os.path.splitext(path)[0] + ".avi"
+
+class SessionRecorder:
     """
-    Performs a rule-based check for squat form using Mediapipe landmarks.
-    This is a simplified check for a "useless" project, not medical advice.
+    Appends one fixed-width record (frame index, capture timestamp, detected
+    flag and the (33, 4) landmarks) per pose model result to a recording
+    file, and optionally the frame itself, scaled down, to a video next to it.
+
+    Only the scaling happens on the caller's thread; a background thread
+    encodes the video. If it falls behind, the frame is left out of the
+    video and its record gets RECORDING_FLAG_NO_VIDEO, so replay stays in step.
     """
-    global squat_counter, squat_state, squat_accuracy
 
-    # Get landmark points for the hips, knees, and ankles
-    left_hip = landmarks[mp_pose.PoseLandmark.LEFT_HIP]
-    left_knee = landmarks[mp_pose.PoseLandmark.LEFT_KNEE]
-    left_ankle = landmarks[mp_pose.PoseLandmark.LEFT_ANKLE]
+    def __init__(self, path, record_video=False, video_width=RECORDING_VIDEO_WIDTH, fps=TARGET_DISPLAY_FPS):
+        self.path = path
+        self.record_video = record_video
+        self.video_width = video_width
+        self.fps = fps
+        self._record = np.zeros(1, dtype=RECORDING_RECORD_DTYPE)
+        self._video_queue = queue.Queue(maxsize=RECORDING_VIDEO_QUEUE_SIZE)
+        self._video_buffers = FrameBufferPool(max_free=RECORDING_VIDEO_QUEUE_SIZE + 1)
+        self._video_thread = None
 
-    # Calculate hip angle
-    hip_angle = calculate_angle(left_hip, left_knee, left_ankle)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            header = np.zeros(1, dtype=RECORDING_HEADER_DTYPE)
+            header["magic"] = RECORDING_MAGIC
+            header["record_size"] = RECORDING_RECORD_DTYPE.itemsize
+            header["landmark_count"] = NUM_POSE_LANDMARKS
+            header["created"] = time.time()
+            self._file.write(header.tobytes())
+            self.frame_count = 0
+        else:
+            # Appending to an earlier recording; a video can't be appended to, so don't start one
+            self.frame_count = len(load_recording(path))
+            # Cut off a partly written last record (e.g. after a crash), or every record appended after it is misaligned
+            self._file.truncate(RECORDING_HEADER_DTYPE.itemsize + self.frame_count * RECORDING_RECORD_DTYPE.itemsize)
+            if record_video:
+                print(f"Not recording video: {path} already has frames")
+                self.record_video = False
 
-    # Check for correct squat depth and form
-    # Standing position: hip angle > 160 degrees
-    # Deep squat position: hip angle < 90 degrees
-    if hip_angle > 160:
-        if squat_state == "DOWN":
-            squat_counter += 1
-            squat_state = "UP"
+    def record(self, timestamp, landmarks, frame_rgb=None):
+        """
+        Appends one model result, captured at `timestamp`. Pass landmarks=None
+        when the model found nobody.
+        """
+        record = self._record[0]
+        record["frame"] = self.frame_count
+        record["timestamp"] = timestamp
+        record["detected"] = landmarks is not None
+        record["flags"] = 0
+        if landmarks is not None:
+            record["landmarks"] = landmarks
+        else:
+            record["landmarks"] = 0.0
 
-        squat_accuracy = 0.0
-        return "Standing Up"
-    elif hip_angle < 90:
-        squat_state = "DOWN"
+        if self.record_video and frame_rgb is not None and not self._queue_video_frame(frame_rgb):
+            record["flags"] = RECORDING_FLAG_NO_VIDEO
+        self._file.write(self._record.tobytes())
+        self.frame_count += 1
 
-        squat_accuracy = 100.0
-        return "Deep Squat"
-    else:
-        # Calculate accuracy for an in-between position
-        squat_accuracy = (160 - hip_angle) / (160 - 90) * 100
+    def _queue_video_frame(self, frame_rgb):
+        height, width = frame_rgb.shape[:2]
+        size = fit_size((width, height), (self.video_width, self.video_width * height // width))
+        if self._video_thread is None:
+            self._video_thread = threading.Thread(target=self._video_loop, args=(size,),
+                                                  name="recording-video", daemon=True)
+            self._video_thread.start()
+        video_frame = self._video_buffers.acquire((size[1], size[0], 3))
+        cv2.resize(frame_rgb, size, dst=video_frame, interpolation=cv2.INTER_AREA)
+        try:
+            self._video_queue.put_nowait(video_frame)
+            return True
+        except queue.Full:
+            self._video_buffers.release(video_frame)
+            return False
 
-        # Teasing rule: if hip angle is too high, it's a "Shallow squat!"
-        if hip_angle > 130:
-            return "Shallow squat!"
-        else:
-            return "Squatting..."
+    def _video_loop(self, size):
+        video = cv2.VideoWriter(recording_video_path(self.path), cv2.VideoWriter_fourcc(*"MJPG"), self.fps, size)
+        while True:
+            video_frame = self._video_queue.get()
+            if video_frame is None:
+                break
+            cv2.cvtColor(video_frame, cv2.COLOR_RGB2BGR, dst=video_frame)
+            video.write(video_frame)
+            self._video_buffers.release(video_frame)
+        video.release()
 
-    return "Detecting..."
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self._video_thread is not None:
+            self._video_queue.put(None)
+            self._video_thread.join()
+            self._video_thread = None
 
-def check_hand_raise_form(landmarks):
+def load_recording(path):
     """
-    Checks for a hand raise motion.
+    Memory-maps a recording and returns its records as a NumPy structured
+    array (fields: frame, detected, timestamp, landmarks). Nothing is read
+    until it is used, so even hour-long sessions open instantly.
     """
-    global hand_raise_counter, hand_raise_state, hand_raise_accuracy
+    header = np.fromfile(path, dtype=RECORDING_HEADER_DTYPE, count=1)
+    if len(header) == 0 or header["magic"][0] != RECORDING_MAGIC:
+        raise ValueError(f"{path} is not a landmark recording")
+    if header["record_size"][0] != RECORDING_RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} was written by an incompatible version")
 
-    # Get landmark points for arm and head
-    left_shoulder = landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER]
-    left_elbow = landmarks[mp_pose.PoseLandmark.LEFT_ELBOW]
-    left_wrist = landmarks[mp_pose.PoseLandmark.LEFT_WRIST]
+    # Ignore a partly written last record (e.g. the app was killed mid-write)
+    count = (os.path.getsize(path) - RECORDING_HEADER_DTYPE.itemsize) // RECORDING_RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORDING_RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORDING_RECORD_DTYPE, mode="r", offset=RECORDING_HEADER_DTYPE.itemsize,
+                     shape=(count,))
 
-    # Calculate the angle of the elbow joint
-    arm_angle = calculate_angle(left_shoulder, left_elbow, left_wrist)
+def replay_frames(path, exercise, state, draw=True):
+    """
+    Feeds a recording's landmarks straight into the form checks (using
+    the RepState `state`), with no camera and no pose model. Yields (frame_rgb, display_text, text_color,
+    feedback, timestamp) per recorded frame; frame_rgb is the recorded video
+    frame (or a blank canvas) with the skeleton drawn on, or None when
+    draw is False. The same frame buffer is reused, so copy it to keep it.
+    """
+    records = load_recording(path)
+    video_cap = None
+    if draw and os.path.exists(recording_video_path(path)):
+        video_cap = cv2.VideoCapture(recording_video_path(path))
+    canvas = np.zeros((REPLAY_CANVAS_SIZE[1], REPLAY_CANVAS_SIZE[0], 3), dtype=np.uint8)
+    renderer = SkeletonRenderer()
 
-    if left_wrist.y < left_shoulder.y and arm_angle > 160:
-        if hand_raise_state == "DOWN":
-            hand_raise_counter += 1
-            hand_raise_state = "UP"
+    try:
+        for record in records:
+            frame_rgb = None
+            if draw:
+                frame_rgb = canvas
+                if video_cap is not None and not record["flags"] & RECORDING_FLAG_NO_VIDEO:
+                    ret, frame = video_cap.read()
+                    if ret:
+                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    else:
+                        canvas[:] = 0
+                else:
+                    canvas[:] = 0
 
-        hand_raise_accuracy = 100.0
-        return "Hand is raised"
-    else:
-        hand_raise_state = "DOWN"
-        hand_raise_accuracy = 0.0
-        return "Hand is down"
+            timestamp = float(record["timestamp"])
+            if record["detected"]:
+                landmarks = record["landmarks"]
+                display_text, text_color, feedback = analyze_landmarks(landmarks, state, exercise, timestamp)
+                if draw:
+                    renderer.draw(frame_rgb, landmarks, exercise, feedback == FEEDBACK_INCORRECT_FORM)
+            else:
+                display_text, text_color, feedback = "Detecting human...", "black", None
+            yield frame_rgb, display_text, text_color, feedback, timestamp
+    finally:
+        if video_cap is not None:
+            video_cap.release()
 
-def check_standing_still(landmarks):
+def run_replay(path, exercise='squat', speed=0.0, draw=False):
     """
-    Checks for standing still.
+    Replays a recording without a window and prints what the form checks
+    made of it. speed=1 replays in real time; 0 replays as fast as possible.
     """
-    global standing_still_counter, prev_landmarks
+    records = load_recording(path)
+    state = RepState()
+    print(f"Replaying {len(records)} frames from {path}")
+    feedback_counts = {FEEDBACK_INCORRECT_FORM: 0, FEEDBACK_STANDING_STILL: 0}
+    previous_feedback = None
+    first_timestamp = None
+    start = time.perf_counter()
+    for _, _, _, feedback, timestamp in replay_frames(path, exercise, state, draw):
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        if speed > 0:
+            delay = (timestamp - first_timestamp) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        # Count each stretch of feedback once
+        if feedback and feedback != previous_feedback:
+            feedback_counts[feedback] += 1
+        previous_feedback = feedback
+    elapsed = time.perf_counter() - start
+
+    recorded_seconds = float(records["timestamp"][-1] - records["timestamp"][0]) if len(records) else 0.0
+    print(f"Reps: {state.reps(exercise)}")
+    print(f"Incorrect form: {feedback_counts[FEEDBACK_INCORRECT_FORM]} times, "
+          f"standing still: {feedback_counts[FEEDBACK_STANDING_STILL]} times")
+    if elapsed > 0:
+        print(f"Replayed {recorded_seconds:.1f}s of recording in {elapsed:.2f}s "
+              f"({len(records) / elapsed:.0f} frames/s, {recorded_seconds / elapsed:.0f}x real time)")
 
-    if prev_landmarks is None:
-        prev_landmarks = landmarks
-        return False
+def create_replay_window(path, exercise='squat', speed=1.0):
+    """Shows a recording with its skeleton and status text, like the live app (for demos)."""
+    global root
 
-    shoulder_dist = abs(landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].x - prev_landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].x) + \
-                    abs(landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].y - prev_landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER].y)
+    root = ctk.CTk()
+    root.title(f"pluck pluck - replay of {os.path.basename(path)}")
+    root.configure(fg_color="#FFFF00")
+    video_label = ctk.CTkLabel(root, text="", bg_color="black")
+    video_label.pack(padx=10, pady=10)
+    status = ctk.CTkLabel(root, text="", font=ctk.CTkFont(family="Arial", size=20, weight="bold"),
+                          text_color="black")
+    status.pack(pady=5)
 
-    hip_dist = abs(landmarks[mp_pose.PoseLandmark.LEFT_HIP].x - prev_landmarks[mp_pose.PoseLandmark.LEFT_HIP].x) + \
-               abs(landmarks[mp_pose.PoseLandmark.LEFT_HIP].y - prev_landmarks[mp_pose.PoseLandmark.LEFT_HIP].y)
+    frames = replay_frames(path, exercise, RepState())
+    replay = {"photo": None, "start": None, "first": None, "last_status": None}
 
-    if shoulder_dist < 0.01 and hip_dist < 0.01:
-        standing_still_counter += 1
-        if standing_still_counter > max_still_frames:
-            return True
+    def show_next():
+        try:
+            frame_rgb, display_text, text_color, _, timestamp = next(frames)
+        except StopIteration:
+            status.configure(text="Replay finished", text_color="black")
+            return
+
+        img = Image.frombuffer("RGB", (frame_rgb.shape[1], frame_rgb.shape[0]), frame_rgb, "raw", "RGB", 0, 1)
+        photo = replay["photo"]
+        if photo is None or (photo.width(), photo.height()) != img.size:
+            photo = replay["photo"] = ImageTk.PhotoImage(image=img)
+            video_label.configure(image=photo)
         else:
-            return False
-    else:
-        standing_still_counter = 0
+            photo.paste(img)
+        if (display_text, text_color) != replay["last_status"]:
+            status.configure(text=display_text, text_color=text_color)
+            replay["last_status"] = (display_text, text_color)
 
-    prev_landmarks = landmarks
-    return False
+        # Schedule the next frame at its recorded time (scaled by speed)
+        if replay["start"] is None:
+            replay["start"], replay["first"] = time.perf_counter(), timestamp
+        due = replay["start"] + (timestamp - replay["first"]) / speed
+        root.after(max(1, int((due - time.perf_counter()) * 1000)), show_next)
 
-def update_webcam_feed():
+    root.after_idle(show_next)
+    root.mainloop()
+
+# --- Annotated Session Export ---
+def export_metadata_path(path):
+    """The per-frame JSON Lines file written next to an exported video."""
+    return os.path.splitext(path)[0] + ".jsonl"
+
+class SessionExporter:
     """
-    Captures a frame from the webcam, processes it for pose estimation,
-    and updates the Tkinter label.
+    Saves the annotated feed (skeleton plus status text) to a video, with a
+    JSON Lines sidecar holding each written frame's status and counters.
+
+    submit() runs on the processing thread and only scales the frame into
+    a pooled buffer and queues it; a dedicated thread burns in the status
+    text and does the encoding. Only the first frame in each 1/fps slot
+    (counted from the first frame) is kept, and frames arriving while the
+    queue is full are dropped, so the live pipeline never waits for the encoder.
     """
-    global app_running, root, cap, frame_label, last_audio_played_time, active_exercise, status_label, img_tk, webcam_update_id
 
-    if not app_running:
-        return
+    def __init__(self, path, width=EXPORT_WIDTH, fps=EXPORT_FPS, queue_size=EXPORT_QUEUE_SIZE):
+        self.path = path
+        self.width = width
+        self.fps = fps
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._buffers = FrameBufferPool(max_free=queue_size + 1)
+        self._first_timestamp = None
+        self._last_slot = -1
+        self._frame_number = 0
+        self._thread = threading.Thread(target=self._encoder_loop, name="session-export", daemon=True)
+        self._thread.start()
 
-    ret, frame = cap.read()
-    if not ret:
-        print("Error: Failed to grab frame from webcam.")
-        webcam_update_id = root.after(1000, update_webcam_feed)
-        return
+    def submit(self, frame_rgb, timestamp, status, text_color, exercise, reps, accuracy):
+        """Queues one annotated frame for encoding, unless it is too soon or the encoder is behind."""
+        frame_number = self._frame_number
+        self._frame_number += 1
+        # Each output frame has a slot on the fps grid; keep the first frame that lands in each one.
+        # Counting whole slots from the start can't drift or skip the way summed float intervals do.
+        if self._first_timestamp is None:
+            self._first_timestamp = timestamp
+        slot = round((timestamp - self._first_timestamp) * self.fps)
+        if slot <= self._last_slot:
+            return False
+        self._last_slot = slot
 
-    # Flip the frame for a mirror effect
-    frame = cv2.flip(frame, 1)
+        height, width = frame_rgb.shape[:2]
+        size = (self.width, round(self.width * height / width / 2) * 2)  # even sizes for the codecs
+        export_frame = self._buffers.acquire((size[1], size[0], 3))
+        cv2.resize(frame_rgb, size, dst=export_frame, interpolation=cv2.INTER_AREA)
+        info = {"frame": frame_number, "timestamp": round(timestamp, 4), "exercise": exercise,
+                "status": status, "reps": reps, "accuracy": round(accuracy, 1), "text_color": text_color}
+        try:
+            self._queue.put_nowait((export_frame, info))
+        except queue.Full:
+            self._buffers.release(export_frame)
+            self.dropped += 1
+            metrics.increment("export_frames_dropped")
+            return False
+        return True
 
-    # Process the frame for pose estimation
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = pose.process(frame_rgb)
+    def _encoder_loop(self):
+        writer = None
+        sidecar = open(export_metadata_path(self.path), "w")
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                export_frame, info = item
+                height, width = export_frame.shape[:2]
+                if writer is None:
+                    writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*EXPORT_FOURCC), self.fps,
+                                             (width, height))
+                    if not writer.isOpened():
+                        print(f"Could not write {self.path}; not exporting the session.")
+                        self._buffers.release(export_frame)
+                        break
 
-    display_text = "Click a button to start an exercise"
-    text_color = "black"
+                # Status bar along the bottom, like the label under the video in the app
+                color = (220, 30, 30) if info["text_color"] == "red" else (0, 0, 0)
+                cv2.rectangle(export_frame, (0, height - 30), (width, height), (255, 255, 0), -1)
+                cv2.putText(export_frame, info["status"], (8, height - 9), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                cv2.cvtColor(export_frame, cv2.COLOR_RGB2BGR, dst=export_frame)
+                writer.write(export_frame)
+                self._buffers.release(export_frame)
 
-    # --- NEW: Prioritized feedback logic ---
-    play_standing_still_audio = False
+                info.pop("text_color")
+                info["dropped_before"] = self.dropped
+                sidecar.write(json.dumps(info) + "\n")
+                self.written += 1
+        finally:
+            if writer is not None:
+                writer.release()
+            sidecar.close()
 
-    if results.pose_landmarks:
-        tease_message = ""
-
-        # Priority 1: Check for incorrect form
-        if active_exercise == 'squat':
-            tease_message = check_squat_form(results.pose_landmarks.landmark)
-            if "Shallow squat!" in tease_message:
-                text_color = "red"
-                if time.time() - last_audio_played_time > COOLDOWN_PERIOD:
-                    run_audio_in_thread(INCORRECT_FORM_AUDIO_PATH)
-                    last_audio_played_time = time.time()
-
-                display_text = "enthan mone, kurchu kanji edukate"
-            else:
-                text_color = "black"
-                display_text = f"Squats: {squat_counter} | Accuracy: {squat_accuracy:.0f}%"
-
-        elif active_exercise == 'hand_raise':
-            tease_message = check_hand_raise_form(results.pose_landmarks.landmark)
-            if "Hand is down" in tease_message:
-                text_color = "red"
-                if time.time() - last_audio_played_time > COOLDOWN_PERIOD:
-                    run_audio_in_thread(INCORRECT_FORM_AUDIO_PATH)
-                    last_audio_played_time = time.time()
-
-                display_text = "enthan mone, kurchu kanji edukate"
-            else:
-                text_color = "black"
-                display_text = f"Hand Raises: {hand_raise_counter} | Accuracy: {hand_raise_accuracy:.0f}%"
-
-        # Priority 2: Check for standing still (only if no incorrect form)
-        if (("Shallow" not in tease_message) and ("down" not in tease_message)):
-            if check_standing_still(results.pose_landmarks.landmark):
-                play_standing_still_audio = True
-                text_color = "red"
-                display_text = "Onnu angangi cheyada"
-
-        if play_standing_still_audio and (time.time() - last_audio_played_time > COOLDOWN_PERIOD):
-            run_audio_in_thread(STANDING_STILL_AUDIO_PATH)
-            last_audio_played_time = time.time()
-
-        # Draw the pose landmarks on the frame
-        mp_drawing.draw_landmarks(
-            frame,
-            results.pose_landmarks,
-            mp_pose.POSE_CONNECTIONS,
-            mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
-            mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2)
-        )
+    def close(self):
+        """Encodes whatever is still queued and finishes the video."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        print(f"Exported {self.written} frames to {self.path} ({self.dropped} dropped while the encoder was busy)")
 
-    else: # No human detected
-        text_color = "black"
-        display_text = "Detecting human..."
+# --- Analysis Server ---
+class AnalysisRequest:
+    """One frame or landmark array waiting for a server worker, and its reply."""
+    __slots__ = ("session_id", "exercise", "timestamp", "landmarks", "image", "status", "result", "done",
+                 "_lock", "_claimed", "_abandoned")
 
-    status_label.configure(text=display_text, text_color=text_color)
-    # --- END NEW ---
+    def __init__(self, session_id, exercise, timestamp, landmarks=None, image=None):
+        self.session_id = session_id
+        self.exercise = exercise
+        self.timestamp = timestamp
+        self.landmarks = landmarks
+        self.image = image
+        self.status = 200
+        self.result = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self._claimed = False
+        self._abandoned = False
 
+    def claim(self):
+        """Called by the worker before touching the session; False if the client already gave up."""
+        with self._lock:
+            self._claimed = not self._abandoned
+            return self._claimed
 
-    # Convert the OpenCV frame to an image for CustomTkinter
-    img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-    img_tk = ImageTk.PhotoImage(image=img)
-    frame_label.configure(image=img_tk)
-    frame_label.image = img_tk
+    def abandon(self):
+        """Called by the handler on timeout; False if a worker is already processing the request."""
+        with self._lock:
+            self._abandoned = not self._claimed
+            return self._abandoned
 
-    # Loop the function
-    webcam_update_id = root.after(10, update_webcam_feed)
+    def finish(self, result, status=200):
+        self.result = result
+        self.status = status
+        self.done.set()
 
-def start_squat_logic():
-    """Starts the squat detection loop."""
-    global active_exercise, squat_counter, hand_raise_counter, prev_landmarks
-    active_exercise = 'squat'
-    squat_counter = 0
-    hand_raise_counter = 0
-    prev_landmarks = None
-    start_app_logic()
+class AnalysisWorker:
+    """
+    A server worker thread. Every request from a session goes to the same
+    worker, so each session's frames are analyzed in order against its own
+    RepState, and a session sending frames keeps its own Pose so tracking
+    works across its frames. A request that fails is answered with a 500 and
+    the worker carries on with the next one.
+    """
 
-def start_hand_raise_logic():
-    """Starts the hand raise detection loop."""
-    global active_exercise, squat_counter, hand_raise_counter, prev_landmarks
-    active_exercise = 'hand_raise'
-    squat_counter = 0
-    hand_raise_counter = 0
-    prev_landmarks = None
-    start_app_logic()
+    def __init__(self, worker_id, queue_size=SERVER_QUEUE_SIZE, batch_size=SERVER_BATCH_SIZE):
+        self.requests = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.sessions = {}
+        self.poses = OrderedDict()
+        self.batches = 0
+        self.processed = 0
+        self._thread = threading.Thread(target=self._run, name=f"analysis-worker-{worker_id}", daemon=True)
+        self._thread.start()
 
-def stop_webcam_feed():
-    """Stops the webcam and cancels the update loop."""
-    global app_running, cap, root, webcam_update_id
-    if webcam_update_id:
-        root.after_cancel(webcam_update_id)
-        webcam_update_id = None
-    if cap and cap.isOpened():
-        cap.release()
+    def submit(self, request):
+        """Queues a request; False if the queue is full."""
+        try:
+            self.requests.put_nowait(request)
+            return True
+        except queue.Full:
+            return False
 
-def start_app_logic():
-    """Starts the webcam and processing loop."""
-    global app_running, cap, squat_start_button, hand_raise_start_button, stop_button, back_button
-    if app_running:
-        return
+    def stop(self):
+        self.requests.put(None)
+        self._thread.join(timeout=2)
 
-    app_running = True
-    print(f"App started. Current exercise: {active_exercise}")
+    def _run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            # Take whatever else is already waiting, up to a batch
+            batch = [request]
+            while len(batch) < self.batch_size:
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+            # Requests whose client timed out are skipped, so they can't change the session afterwards
+            batch = [request for request in batch if request.claim()]
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                print(f"Analysis worker failed on a batch: {e!r}")
+                for request in batch:
+                    if not request.done.is_set():
+                        request.finish({"error": "internal error"}, 500)
+        for pose_model in self.poses.values():
+            pose_model.close()
 
-    # Disable the start buttons and enable the stop button
-    squat_start_button.configure(state="disabled")
-    hand_raise_start_button.configure(state="disabled")
-    stop_button.configure(state="normal")
-    back_button.configure(state="normal")
+    def _fail(self, request, error):
+        print(f"Analysis of a frame from session {request.session_id!r} failed: {error!r}")
+        request.finish({"error": "internal error"}, 500)
 
+    def _process_batch(self, batch):
+        # Decode every frame in the batch first, then run the model over them back to back
+        for request in batch:
+            if request.image is None:
+                continue
+            try:
+                frame = cv2.imdecode(np.frombuffer(request.image, dtype=np.uint8), cv2.IMREAD_COLOR)
+                request.image = None if frame is None else cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB)
+            except Exception as e:
+                self._fail(request, e)
+        for request in batch:
+            if request.image is None or request.done.is_set():
+                continue
+            try:
+                start = time.perf_counter()
+                results = self._pose_for(request.session_id).process(request.image)
+                metrics.time("inference", time.perf_counter() - start)
+                if results.pose_landmarks:
+                    request.landmarks = landmarks_to_array(results.pose_landmarks.landmark)
+            except Exception as e:
+                # Its Pose may be broken; the session's next frame gets a new one
+                self._close_pose(request.session_id)
+                self._fail(request, e)
 
-    # Initialize the webcam
-    # Loop through a few camera indices to find a working webcam
-    camera_index = 0
-    cap = cv2.VideoCapture(camera_index)
-    while not cap.isOpened() and camera_index < 5:
-        camera_index += 1
-        print(f"Could not open camera {camera_index-1}. Trying camera {camera_index}...")
-        cap = cv2.VideoCapture(camera_index)
+        now = time.monotonic()
+        for request in batch:
+            if request.done.is_set():
+                continue
+            try:
+                request.finish(self._analyze(request, now))
+            except Exception as e:
+                self._fail(request, e)
+        self.batches += 1
+        self.processed += len(batch)
 
-    if not cap.isOpened():
-        print("Error: Could not open any webcam. Please ensure a camera is connected and not in use by another application.")
-        app_running = False
-        squat_start_button.configure(state="normal")
-        hand_raise_start_button.configure(state="normal")
-        return
+        # Forget sessions that have gone quiet
+        for session_id, (_, last_seen) in list(self.sessions.items()):
+            if now - last_seen > SERVER_SESSION_TIMEOUT:
+                del self.sessions[session_id]
+                self._close_pose(session_id)
 
-    # Start the update loop
-    update_webcam_feed()
+    def _analyze(self, request, now):
+        """Steps the request's session with its landmarks and returns the reply."""
+        session = self.sessions.get(request.session_id)
+        if session is None:
+            session = self.sessions[request.session_id] = [RepState(), now]
+        state = session[0]
+        session[1] = now
+        result = {"session": request.session_id, "timestamp": request.timestamp,
+                  "detected": request.landmarks is not None}
+        if request.landmarks is not None:
+            start = time.perf_counter()
+            status, _, feedback = analyze_landmarks(request.landmarks, state, request.exercise, request.timestamp)
+            metrics.time("rules", time.perf_counter() - start)
+            result.update(status=status, feedback=feedback, phase=state.phase(request.exercise)["name"])
+        result.update(reps=state.reps(request.exercise), accuracy=round(float(state.accuracy(request.exercise)), 1))
+        return result
 
-def stop_app_logic():
-    """Stops the webcam and processing loop."""
-    global app_running, cap, squat_start_button, hand_raise_start_button, stop_button, back_button, prev_landmarks
-    if not app_running:
-        return
+    def _pose_for(self, session_id):
+        pose_model = self.poses.get(session_id)
+        if pose_model is None:
+            if len(self.poses) >= SERVER_POSES_PER_WORKER:
+                _, oldest = self.poses.popitem(last=False)
+                oldest.close()
+            # A fixed profile, so clients get the same answers whatever machine serves them
+            pose_model = self.poses[session_id] = create_pose(default_model_profile())
+        else:
+            self.poses.move_to_end(session_id)
+        return pose_model
 
-    app_running = False
-    prev_landmarks = None
-    print("App stopped.")
+    def _close_pose(self, session_id):
+        pose_model = self.poses.pop(session_id, None)
+        if pose_model is not None:
+            try:
+                pose_model.close()
+            except Exception:
+                pass
 
-    # Enable the start buttons and disable the stop button
-    squat_start_button.configure(state="normal")
-    hand_raise_start_button.configure(state="normal")
-    stop_button.configure(state="disabled")
-    back_button.configure(state="normal")
+def run_server(port=SERVER_PORT, host="127.0.0.1", workers=SERVER_WORKERS):
+    """
+    Serves the form checks over HTTP until interrupted. POST /analyze with either
+    a JSON body {"session", "exercise", "timestamp", "landmarks": 33 x [x, y, z, visibility]}
+    or a JPEG webcam frame (Content-Type: image/jpeg, the rest as query parameters).
+    Replies with the session's reps, accuracy, status text and feedback kind.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit, parse_qs
 
-    if cap and cap.isOpened():
-        cap.release()
+    pool = [AnalysisWorker(i) for i in range(workers)]
 
-def create_front_page():
-    """Creates the front page of the application."""
-    global root, status_label, gif_frames, gif_label
+    class AnalysisHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so clients don't reconnect per frame
+        disable_nagle_algorithm = True  # headers and body are written separately
 
-    # Set the appearance mode and color theme
-    ctk.set_appearance_mode("Dark")
-    ctk.set_default_color_theme("green")
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path != "/analyze":
+                self._reply(404, {"error": "not found"})
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                if self.headers.get("Content-Type", "").startswith("image/"):
+                    fields = {key: values[0] for key, values in parse_qs(url.query).items()}
+                    landmarks, image = None, body
+                else:
+                    fields = json.loads(body)
+                    if not isinstance(fields, dict):
+                        raise ValueError("the body must be a JSON object")
+                    landmarks = fields.get("landmarks")
+                    if landmarks is not None:
+                        landmarks = np.asarray(landmarks, dtype=np.float32).reshape(NUM_POSE_LANDMARKS, 4)
+                    image = None
+                exercise = fields.get("exercise", "squat")
+                if exercise not in EXERCISES:
+                    raise ValueError(f"unknown exercise {exercise!r}")
+                request = AnalysisRequest(str(fields.get("session", self.client_address[0])), exercise,
+                                          float(fields.get("timestamp", time.perf_counter())), landmarks, image)
+            except (ValueError, TypeError) as e:
+                self._reply(400, {"error": str(e)})
+                return
 
-    root = ctk.CTk()
-    root.title("pluck pluck")
-    root.geometry("600x600")
-    root.configure(fg_color="#FFFF00") # Lighter yellow theme
+            worker = pool[hash(request.session_id) % len(pool)]
+            if not worker.submit(request):
+                metrics.increment("server_rejected")
+                self._reply(503, {"error": "busy"}, retry_after=1)
+                return
+            if not request.done.wait(SERVER_REQUEST_TIMEOUT):
+                if request.abandon():
+                    self._reply(504, {"error": "timed out"})
+                    return
+                # A worker picked it up just now; it will only take a moment longer
+                request.done.wait()
+            self._reply(request.status, request.result)
 
-    main_frame = ctk.CTkFrame(root, corner_radius=20, fg_color="#FFFF00")
-    main_frame.pack(pady=20, padx=20, fill="both", expand=True)
+        def _reply(self, code, payload, retry_after=None):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if retry_after is not None:
+                self.send_header("Retry-After", str(retry_after))
+            self.end_headers()
+            self.wfile.write(body)
 
-    title_label = ctk.CTkLabel(main_frame, text="pluck pluck",
-                               font=ctk.CTkFont(family="Courier", size=40, weight="bold"), text_color="black")
-    title_label.pack(pady=(20, 10))
+        def log_message(self, format, *args):
+            pass
 
+    class AnalysisServer(ThreadingHTTPServer):
+        request_queue_size = 128  # many clients connect at once
 
-    start_button = ctk.CTkButton(main_frame, text="Start App", command=lambda: [root.destroy(), create_gui()],
-                                 fg_color="#9370DB", hover_color="#A585E2", text_color="white",
-                                 font=ctk.CTkFont(size=16, weight="bold"), corner_radius=10)
-    start_button.pack(pady=10)
+    server = AnalysisServer((host, port), AnalysisHandler)
+    print(f"Analysis server on http://{host}:{port}/analyze with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for worker in pool:
+            worker.stop()
+        processed = sum(worker.processed for worker in pool)
+        batches = sum(worker.batches for worker in pool)
+        if batches:
+            print(f"Processed {processed} requests in {batches} batches ({processed / batches:.1f} per batch)")
 
-    # --- NEW: Add GIF animation to the front page ---
-    gif_label = ctk.CTkLabel(main_frame, text="")
-    gif_label.pack(side="bottom", anchor="sw", padx=10, pady=10)
+def run_load_test(url, clients=8, requests_per_client=300, exercise='squat', send_frames=False):
+    """
+    Synthetic load generator: `clients` threads each play one session against
+    the server as fast as it answers (backing off when it is busy), sending
+    synthetic landmark streams, or with send_frames JPEG frames of the synthetic
+    benchmark video. Prints throughput, tail latency and the final rep counts.
+    """
+    import http.client
+    from urllib.parse import urlsplit
 
-    # Check if the GIF file exists using the standardized GIF_PATH
-    if os.path.exists(GIF_PATH):
-        try:
-            # Load the GIF frames
-            gif = Image.open(GIF_PATH)
-            gif_frames = []
-            for frame in range(gif.n_frames):
-                gif.seek(frame)
-                resized_frame = gif.resize((750, 750), Image.Resampling.LANCZOS)
-                gif_frames.append(ImageTk.PhotoImage(resized_frame))
+    target = urlsplit(url if "://" in url else f"http://{url}")
+    path = target.path if target.path not in ("", "/") else "/analyze"
 
-            # Start the animation
-            animate_gif()
-        except Exception as e:
-            print(f"Error loading GIF: {e}")
+    if send_frames:
+        videos, _ = ensure_benchmark_fixtures(BENCHMARK_FIXTURE_DIR)
+        video_cap = cv2.VideoCapture(videos[0])
+        jpegs = []
+        while True:
+            ret, frame = video_cap.read()
+            if not ret:
+                break
+            jpegs.append(cv2.imencode(".jpg", frame)[1].tobytes())
+        video_cap.release()
+
+    latencies = []
+    rejected = [0]
+    errors = [0]
+    final_reps = {}
+    lock = threading.Lock()
+
+    def client(client_id):
+        session_id = f"load-{os.getpid()}-{client_id}"
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        landmarks, _ = make_synthetic_landmarks(exercise, reps=max(1, requests_per_client // 60), seed=client_id)
+        samples = []
+        reply = None
+        for i in range(requests_per_client):
+            timestamp = i / 30.0  # the synthetic streams are 30 FPS
+            if send_frames:
+                body = jpegs[i % len(jpegs)]
+                request_path = f"{path}?session={session_id}&exercise={exercise}&timestamp={timestamp}"
+                headers = {"Content-Type": "image/jpeg"}
+            else:
+                body = json.dumps({"session": session_id, "exercise": exercise, "timestamp": timestamp,
+                                   "landmarks": landmarks[i % len(landmarks)].tolist()}).encode()
+                request_path = path
+                headers = {"Content-Type": "application/json"}
+            # Latency counts from the first attempt, so busy retries show up in the tail
+            backoff = 0.005
+            start = time.perf_counter_ns()
+            while True:
+                try:
+                    connection.request("POST", request_path, body, headers)
+                    response = connection.getresponse()
+                    payload = response.read()
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    with lock:
+                        errors[0] += 1
+                    break
+                if response.status == 503:
+                    with lock:
+                        rejected[0] += 1
+                    time.sleep(backoff * random.uniform(0.5, 1.5))
+                    backoff = min(backoff * 2, 0.2)
+                    continue
+                if response.status == 200:
+                    samples.append(time.perf_counter_ns() - start)
+                    reply = json.loads(payload)
+                else:
+                    with lock:
+                        errors[0] += 1
+                break
+        connection.close()
+        with lock:
+            latencies.extend(samples)
+            if reply is not None:
+                final_reps[session_id] = reply["reps"]
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    summary = summarize_latencies(latencies)
+    summary["throughput_per_s"] = round(len(latencies) / elapsed, 1) if elapsed > 0 else None
+    summary.update(clients=clients, rejected=rejected[0], errors=errors[0], seconds=round(elapsed, 2))
+    print(f"{len(latencies)} requests from {clients} clients in {elapsed:.2f}s: "
+          f"{summary['throughput_per_s']} req/s, p50 {summary.get('p50_ms')} ms, "
+          f"p95 {summary.get('p95_ms')} ms, p99 {summary.get('p99_ms')} ms, "
+          f"{rejected[0]} busy retries, {errors[0]} errors")
+    if final_reps:
+        print(f"Reps per session: {sorted(set(final_reps.values()))}")
+    return summary
+
+# --- Benchmark Suite ---
+def make_synthetic_landmarks(exercise, reps, fps=30, rep_seconds=2.0, idle_seconds=1.0, seed=0):
+    """
+    Builds a (frames, 33, 4) landmark stream of a person doing `reps` reps of
+    `exercise` ('squat', 'hand_raise' or 'idle' for standing still), with a
+    little seeded jitter. Returns (landmarks, timestamps).
+    """
+    rng = np.random.default_rng(seed)
+    rep_frames = int(rep_seconds * fps)
+    idle_frames = int(idle_seconds * fps)
+    frame_count = idle_frames * 2 + reps * rep_frames if exercise != 'idle' else idle_frames
+    landmarks = new_landmark_array(frame_count)
+    # Everything visible, standing in the middle of the frame
+    landmarks[:, :, LANDMARK_X] = 0.5
+    landmarks[:, :, LANDMARK_Y] = 0.5
+    landmarks[:, :, LANDMARK_VISIBILITY] = 0.99
+
+    # Progress through the current rep: 0 at rest, 1 at the bottom/top of the movement
+    phase = np.zeros(frame_count, dtype=np.float32)
+    for rep in range(reps if exercise != 'idle' else 0):
+        start = idle_frames + rep * rep_frames
+        t = np.arange(rep_frames, dtype=np.float32) / rep_frames
+        phase[start:start + rep_frames] = np.sin(np.pi * t)
+
+    knee = np.array([0.5, 0.7], dtype=np.float32)
+    landmarks[:, LEFT_KNEE, :2] = knee
+    landmarks[:, LEFT_ANKLE, :2] = knee + (0.0, 0.2)
+    if exercise == 'squat':
+        # Knee angle goes from 175 degrees standing to 70 degrees at the bottom
+        knee_angle = np.radians(175.0 - 105.0 * phase)
     else:
-        print(f"Warning: GIF file '{GIF_PATH}' not found.")
+        knee_angle = np.full(frame_count, np.radians(175.0), dtype=np.float32)
+    landmarks[:, LEFT_HIP, LANDMARK_X] = knee[0] + 0.2 * np.sin(knee_angle)
+    landmarks[:, LEFT_HIP, LANDMARK_Y] = knee[1] + 0.2 * np.cos(knee_angle)
+    landmarks[:, LEFT_SHOULDER, LANDMARK_X] = landmarks[:, LEFT_HIP, LANDMARK_X]
+    landmarks[:, LEFT_SHOULDER, LANDMARK_Y] = landmarks[:, LEFT_HIP, LANDMARK_Y] - 0.25
 
-    root.mainloop()
+    # The arm swings from hanging down (0) to straight up (pi); only the top counts as raised
+    if exercise == 'hand_raise':
+        arm_angle = np.pi * np.clip(phase * 1.2, 0.0, 1.0)
+    else:
+        arm_angle = np.zeros(frame_count, dtype=np.float32)
+    direction = np.stack([np.sin(arm_angle), np.cos(arm_angle)], axis=-1)
+    landmarks[:, LEFT_ELBOW, :2] = landmarks[:, LEFT_SHOULDER, :2] + 0.15 * direction
+    landmarks[:, LEFT_WRIST, :2] = landmarks[:, LEFT_ELBOW, :2] + 0.15 * direction
 
-def create_gui():
-    """Creates the main CustomTkinter GUI window and its widgets."""
-    global root, frame_label, squat_start_button, hand_raise_start_button, stop_button, status_label, back_button
+    if exercise != 'idle':
+        landmarks[:, :, :2] += rng.normal(0.0, 0.001, size=(frame_count, NUM_POSE_LANDMARKS, 2))
+    timestamps = np.arange(frame_count, dtype=np.float64) / fps
+    return landmarks, timestamps
 
-    root = ctk.CTk()
-    root.title("Useless Exercise Form Detector")
-    root.geometry("600x600")
-    root.configure(fg_color="#FFFF00") # Lighter yellow theme
+def save_landmark_fixture(path, landmarks, timestamps, exercise, expected_reps=None, expect_standing_still=None):
+    """Saves a landmark stream, and what the rules should make of it, as an .npz fixture."""
+    metadata = {"exercise": exercise, "expected_reps": expected_reps, "expect_standing_still": expect_standing_still}
+    np.savez_compressed(path, landmarks=landmarks, timestamps=timestamps, metadata=json.dumps(metadata))
 
-    main_frame = ctk.CTkFrame(root, corner_radius=20, fg_color="#FFFF00")
-    main_frame.pack(pady=20, padx=20, fill="both", expand=True)
+def load_landmark_fixture(path):
+    """Loads an .npz landmark fixture. Returns (landmarks, timestamps, metadata dict)."""
+    with np.load(path) as data:
+        return data["landmarks"], data["timestamps"], json.loads(str(data["metadata"]))
 
-    task_label = ctk.CTkLabel(main_frame, text="Choose the task:", font=ctk.CTkFont(size=16, weight="bold"), text_color="black")
-    task_label.pack(pady=(10, 5))
+def write_synthetic_video(path, frame_count=120, size=(640, 480), fps=30, seed=0):
+    """Writes a deterministic test video (moving gradient plus noise) for the decode and model stages."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    for i in range(frame_count):
+        frame = np.broadcast_to((gradient + i * 4) % 256, (height, width, 3)).astype(np.uint8)
+        frame = cv2.add(frame, rng.integers(0, 16, size=frame.shape, dtype=np.uint8))
+        writer.write(frame)
+    writer.release()
 
-    frame_label = ctk.CTkLabel(main_frame, text="", bg_color="black")
-    frame_label.pack(pady=10)
+def ensure_benchmark_fixtures(fixture_dir):
+    """
+    Returns (video paths, landmark fixture paths) in fixture_dir, generating
+    the synthetic set first if the directory has none. The synthetic set is
+    seeded, so every machine benchmarks the same data.
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    names = sorted(os.listdir(fixture_dir))
+    videos = [os.path.join(fixture_dir, n) for n in names if n.lower().endswith(VIDEO_EXTENSIONS)]
+    streams = [os.path.join(fixture_dir, n) for n in names if n.endswith(".npz")]
+    if videos or streams:
+        return videos, streams
 
-    button_frame = ctk.CTkFrame(main_frame, fg_color="#FFFF00")
-    button_frame.pack(pady=10)
+    print(f"Generating synthetic benchmark fixtures in {fixture_dir}...")
+    video_path = os.path.join(fixture_dir, "synthetic_640x480.avi")
+    write_synthetic_video(video_path)
+    for name, exercise, reps in (("squats_5", 'squat', 5), ("hand_raises_4", 'hand_raise', 4)):
+        landmarks, timestamps = make_synthetic_landmarks(exercise, reps)
+        save_landmark_fixture(os.path.join(fixture_dir, name + ".npz"), landmarks, timestamps, exercise,
+                              expected_reps=reps)
+    landmarks, timestamps = make_synthetic_landmarks('idle', 0, idle_seconds=10.0)
+    save_landmark_fixture(os.path.join(fixture_dir, "idle_10s.npz"), landmarks, timestamps, 'squat',
+                          expected_reps=0, expect_standing_still=True)
+    return ensure_benchmark_fixtures(fixture_dir)
 
-    squat_start_button = ctk.CTkButton(button_frame, text="Start Squats", command=start_squat_logic,
-                                       fg_color="#9370DB", hover_color="#A585E2", text_color="white",
-                                       font=ctk.CTkFont(size=14, weight="bold"), corner_radius=10,
-                                       width=200, height=50)
-    squat_start_button.pack(pady=5, expand=True, fill="both")
+def summarize_latencies(samples_ns):
+    """Turns per-call latencies (nanoseconds) into throughput and p50/p95/p99 in milliseconds."""
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    if samples.size == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    mean = samples.mean()
+    return {
+        "count": int(samples.size),
+        "throughput_per_s": round(1000.0 / mean, 1) if mean > 0 else None,
+        "mean_ms": round(mean, 4),
+        "p50_ms": round(p50, 4),
+        "p95_ms": round(p95, 4),
+        "p99_ms": round(p99, 4),
+    }
 
-    hand_raise_start_button = ctk.CTkButton(button_frame, text="Start Hand Raise", command=start_hand_raise_logic,
-                                           fg_color="#9370DB", hover_color="#A585E2", text_color="white",
-                                           font=ctk.CTkFont(size=14, weight="bold"), corner_radius=10,
-                                           width=200, height=50)
-    hand_raise_start_button.pack(pady=5, expand=True, fill="both")
+def benchmark_landmark_fixture(path, stage_samples):
+    """
+    Replays one landmark fixture through the form checks, timing each check,
+    and returns the correctness result for it.
+    """
+    landmarks, timestamps, metadata = load_landmark_fixture(path)
+    exercise = metadata.get("exercise") or 'squat'
 
-    stop_button = ctk.CTkButton(button_frame, text="Stop", command=stop_app_logic, state="disabled",
-                                fg_color="#D32F2F", hover_color="#E53935", text_color="white",
-                                font=ctk.CTkFont(size=14, weight="bold"), corner_radius=10,
-                                width=200, height=50)
-    stop_button.pack(pady=5, expand=True, fill="both")
+    # Correctness: the same prioritized logic the app runs
+    state = RepState()
+    saw_standing_still = False
+    for frame, timestamp in zip(landmarks, timestamps):
+        _, _, feedback = analyze_landmarks(frame, state, exercise, timestamp)
+        saw_standing_still = saw_standing_still or feedback == FEEDBACK_STANDING_STILL
+    reps = state.reps(exercise)
 
-    back_button = ctk.CTkButton(button_frame, text="Back", command=lambda: [stop_app_logic(), root.destroy(), create_front_page()],
-                                fg_color="gray", hover_color="darkgray", text_color="white",
-                                font=ctk.CTkFont(size=14, weight="bold"), corner_radius=10,
-                                width=200, height=50)
-    back_button.pack(pady=5, expand=True, fill="both")
+    # The offline batch evaluator has to agree with the frame-by-frame one
+    timer = time.perf_counter_ns
+    start = timer()
+    batch = state.rules.evaluate_batch(landmarks)
+    stage_samples["rules.evaluate_batch_per_frame"].append((timer() - start) / max(1, len(landmarks)))
+    batch_reps = int(batch["reps"][-1, state.rules.index[exercise]]) if len(landmarks) else 0
 
-    status_label = ctk.CTkLabel(main_frame, text="", font=ctk.CTkFont(family="Arial", size=16, weight="bold"), text_color="black")
-    status_label.pack(pady=10)
+    # Timing: each stage on its own, on a fresh state
+    state = RepState()
+    for frame, timestamp in zip(landmarks, timestamps):
+        start = timer()
+        state.rules.compute_features(frame)
+        stage_samples["rules.features"].append(timer() - start)
+        start = timer()
+        state.rules.evaluate(frame, state)
+        stage_samples["rules.evaluate_all_exercises"].append(timer() - start)
+        start = timer()
+        state.history.push(frame, timestamp)
+        check_standing_still(state, timestamp)
+        stage_samples["rules.motion_history"].append(timer() - start)
 
-    def on_closing():
-        global app_running, cap
-        app_running = False
-        if cap and cap.isOpened():
-            cap.release()
-        root.destroy()
+    passed = batch_reps == reps
+    if metadata.get("expected_reps") is not None and reps != metadata["expected_reps"]:
+        passed = False
+    if metadata.get("expect_standing_still") is not None and saw_standing_still != metadata["expect_standing_still"]:
+        passed = False
+    return {
+        "fixture": os.path.basename(path),
+        "exercise": exercise,
+        "reps": reps,
+        "batch_reps": batch_reps,
+        "expected_reps": metadata.get("expected_reps"),
+        "standing_still": saw_standing_still,
+        "expect_standing_still": metadata.get("expect_standing_still"),
+        "passed": passed,
+    }
 
-    root.protocol("WM_DELETE_WINDOW", on_closing)
+def benchmark_video_fixture(path, pose_model, landmark_stream, stage_samples, tk_photo_factory, max_frames):
+    """Replays one fixture video through decode, pose.process, drawing and display conversion."""
+    video_cap = cv2.VideoCapture(path)
+    timer = time.perf_counter_ns
+    pose_model.reset()
+    renderer = SkeletonRenderer()
+    photo = None
+    frame_index = 0
+    while frame_index < max_frames:
+        start = timer()
+        ret, frame = video_cap.read()
+        if not ret:
+            break
+        stage_samples["capture.decode"].append(timer() - start)
 
-    # Start the Tkinter main loop
-    root.mainloop()
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        start = timer()
+        results = pose_model.process(frame_rgb)
+        elapsed = timer() - start
+        # Without a person only the detector runs, which says nothing about landmark inference
+        if results.pose_landmarks:
+            stage_samples["pose.process"].append(elapsed)
+        else:
+            stage_samples["pose.process_nobody"].append(elapsed)
+
+        # Draw a recorded skeleton, since the fixture video may not contain a person
+        landmarks = landmark_stream[frame_index % len(landmark_stream)]
+        start = timer()
+        renderer.draw(frame_rgb, landmarks, 'squat')
+        stage_samples["overlay.draw_landmarks"].append(timer() - start)
+
+        start = timer()
+        img = Image.frombuffer("RGB", (frame_rgb.shape[1], frame_rgb.shape[0]), frame_rgb, "raw", "RGB", 0, 1)
+        stage_samples["display.pil_frombuffer"].append(timer() - start)
+        if tk_photo_factory is not None:
+            start = timer()
+            if photo is None or (photo.width(), photo.height()) != img.size:
+                photo = tk_photo_factory(img)
+            else:
+                photo.paste(img)
+            stage_samples["display.photoimage_paste"].append(timer() - start)
+        frame_index += 1
+    video_cap.release()
+
+def compare_benchmarks(results, baseline, tolerance=BENCHMARK_REGRESSION_TOLERANCE):
+    """Returns a list of human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    for stage, stats in results["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old or not stats.get("count"):
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if old.get(key) and stats[key] > old[key] * (1 + tolerance):
+                regressions.append(f"{stage} {key}: {old[key]:.4f} -> {stats[key]:.4f}")
+    return regressions
+
+def run_benchmarks(output_path=None, fixture_dir=BENCHMARK_FIXTURE_DIR, baseline_path=None,
+                   tolerance=BENCHMARK_REGRESSION_TOLERANCE, max_frames=300):
+    """
+    Runs every benchmark stage over the fixtures, prints a table, optionally
+    saves the results as JSON and compares them with a baseline JSON.
+    Returns True if every correctness check passed and nothing regressed.
+    """
+    videos, streams = ensure_benchmark_fixtures(fixture_dir)
+    stage_samples = {name: [] for name in (
+        "capture.decode", "pose.process", "pose.process_nobody",
+        "rules.features", "rules.evaluate_all_exercises", "rules.evaluate_batch_per_frame",
+        "rules.motion_history",
+        "overlay.draw_landmarks", "display.pil_frombuffer", "display.photoimage_paste",
+    )}
+
+    correctness = [benchmark_landmark_fixture(path, stage_samples) for path in streams]
+
+    # PhotoImage needs a Tk interpreter; skip that stage on machines without a display
+    tk_photo_factory = None
+    try:
+        import tkinter
+        tk_root = tkinter.Tk()
+        tk_root.withdraw()
+        tk_photo_factory = ImageTk.PhotoImage
+    except Exception as e:
+        tk_root = None
+        print(f"Skipping the PhotoImage stage (no display: {e})")
+
+    # The same model settings on every machine, so results compare across calibrations
+    profile = default_model_profile()
+    if videos:
+        pose_model = create_pose(profile)
+        landmark_stream = load_landmark_fixture(streams[0])[0] if streams else new_landmark_array(1)
+        for path in videos:
+            benchmark_video_fixture(path, pose_model, landmark_stream, stage_samples, tk_photo_factory, max_frames)
+        pose_model.close()
+    if tk_root is not None:
+        tk_root.destroy()
+
+    results = {
+        "time": time.time(),
+        "python": sys.version.split()[0],
+        "model_profile": profile,
+        "fixtures": [os.path.basename(path) for path in videos + streams],
+        "stages": {name: summarize_latencies(samples) for name, samples in stage_samples.items()},
+        "correctness": correctness,
+    }
+
+    print(f"{'stage':<30} {'count':>6} {'per s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in results["stages"].items():
+        if stats["count"]:
+            print(f"{name:<30} {stats['count']:>6} {stats['throughput_per_s']:>10.1f} "
+                  f"{stats['p50_ms']:>9.4f} {stats['p95_ms']:>9.4f} {stats['p99_ms']:>9.4f}")
+    for check in correctness:
+        print(f"{'PASS' if check['passed'] else 'FAIL'} {check['fixture']}: {check['reps']} reps "
+              f"(batch {check['batch_reps']}) "
+              f"(expected {check['expected_reps']}), standing still: {check['standing_still']}")
+    if videos and not stage_samples["pose.process"]:
+        print(f"Nobody was detected in the fixture videos, so pose.process wasn't timed; "
+              f"add a video of a person exercising to {fixture_dir} to benchmark it.")
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved benchmark results to {output_path}")
+
+    ok = all(check["passed"] for check in correctness)
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare_benchmarks(results, json.load(f), tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        ok = ok and not regressions
+    return ok
 
 def run_app():
     """
     A simple function to run the app from a terminal.
     """
+    global workout_store
+    audio_engine.start()
+    if WORKOUT_HISTORY:
+        try:
+            workout_store = WorkoutStore().start()
+        except sqlite3.Error as e:
+            print(f"Workout history disabled, could not open {WORKOUT_DB_PATH}: {e}")
     create_front_page()
 
 if __name__ == "__main__":
@@ -570,10 +5079,134 @@ if __name__ == "__main__":
         temp_dir = os.path.join(os.getcwd(), 'temp_pydub')
         if not os.path.exists(temp_dir):
             os.makedirs(temp_dir)
-        utils.get_pydub_temp_dir = lambda: temp_dir
+        pydub_utils.get_pydub_temp_dir = lambda: temp_dir
     except Exception as e:
         print(f"Warning: Could not set local temp directory for pydub. {e}")
         # We will proceed, but there may be issues with audio playback.
 
-    run_app()
+    parser = argparse.ArgumentParser(description="Useless Exercise Form Detector")
+    parser.add_argument("--batch", metavar="VIDEO_DIR",
+                        help="score every video in VIDEO_DIR without opening the GUI")
+    parser.add_argument("--output", metavar="OUTPUT_DIR", default="batch_results",
+                        help="where batch results are written (default: batch_results)")
+    parser.add_argument("--exercise", choices=list(EXERCISES), default="squat",
+                        help="exercise to score in batch, station and replay modes (default: squat)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of batch worker processes (default: one per core)")
+    parser.add_argument("--format", choices=["json", "csv", "both"], default="both",
+                        help="batch output format (default: both)")
+    parser.add_argument("--stations", nargs="+", metavar="SOURCE",
+                        help="run one station per webcam index or video file, each in its own process")
+    parser.add_argument("--headless-seconds", type=float, default=None, metavar="SECONDS",
+                        help="with --stations, run without a window for SECONDS (or until the videos end) and report FPS")
+    parser.add_argument("--no-pace", action="store_true",
+                        help="with --stations, read video files as fast as possible instead of at their own frame rate")
+    parser.add_argument("--multi-person", metavar="SOURCE",
+                        help="track and count everyone in a webcam index or video file (with --headless-seconds, no window)")
+    parser.add_argument("--benchmark", nargs="?", const="", metavar="RESULTS_JSON",
+                        help="benchmark every pipeline stage on the fixtures, optionally saving the results as JSON")
+    parser.add_argument("--baseline", metavar="BASELINE_JSON",
+                        help="with --benchmark, fail if any stage is slower than in this earlier results file")
+    parser.add_argument("--fixtures", metavar="FIXTURE_DIR", default=BENCHMARK_FIXTURE_DIR,
+                        help=f"benchmark fixture directory, generated if empty (default: {BENCHMARK_FIXTURE_DIR})")
+    parser.add_argument("--record", metavar="RECORDING",
+                        help="record every frame's landmarks to this file (appends if it exists)")
+    parser.add_argument("--record-video", action="store_true",
+                        help=f"with --record, also store the video, scaled to {RECORDING_VIDEO_WIDTH}px wide")
+    parser.add_argument("--export", metavar="VIDEO",
+                        help="save the annotated video (skeleton and status) to VIDEO, with per-frame status in a .jsonl next to it")
+    parser.add_argument("--export-width", type=int, default=EXPORT_WIDTH, metavar="PIXELS",
+                        help=f"with --export, width of the saved video (default: {EXPORT_WIDTH})")
+    parser.add_argument("--export-fps", type=float, default=EXPORT_FPS, metavar="FPS",
+                        help=f"with --export, frame rate of the saved video (default: {EXPORT_FPS})")
+    parser.add_argument("--replay", metavar="RECORDING",
+                        help="replay a recording through the form checks instead of using the webcam")
+    parser.add_argument("--replay-speed", type=float, default=None, metavar="FACTOR",
+                        help="replay speed (default: 1 in the window, as fast as possible with --replay-headless)")
+    parser.add_argument("--replay-headless", action="store_true",
+                        help="replay without a window and print the reps and feedback")
+    parser.add_argument("--inference-process", action="store_true",
+                        help="run the pose model in its own process so it never competes with the GUI")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="benchmark the pose model settings on this machine and save the best one")
+    parser.add_argument("--serve", nargs="?", type=int, const=SERVER_PORT, metavar="PORT",
+                        help=f"serve the form checks to other machines' frames or landmarks over HTTP (default port {SERVER_PORT})")
+    parser.add_argument("--load-test", metavar="URL",
+                        help="hammer a --serve server at URL with synthetic sessions and report throughput and latency")
+    parser.add_argument("--clients", type=int, default=8,
+                        help="with --load-test, number of concurrent sessions (default: 8)")
+    parser.add_argument("--requests", type=int, default=300,
+                        help="with --load-test, requests per session (default: 300)")
+    parser.add_argument("--load-frames", action="store_true",
+                        help="with --load-test, send JPEG frames instead of landmarks")
+    parser.add_argument("--history", nargs="?", type=int, const=7, metavar="DAYS",
+                        help=f"print the per-day rep totals saved in {WORKOUT_DB_PATH} (default: last 7 days)")
+    parser.add_argument("--no-history", action="store_true",
+                        help=f"don't save reps to {WORKOUT_DB_PATH}")
+    parser.add_argument("--history-load-test", action="store_true",
+                        help="check the rep history writer keeps up with thousands of reps a second from many sessions")
+    parser.add_argument("--metrics", action="store_true",
+                        help="time each pipeline stage and count dropped frames, failed grabs and audio triggers")
+    parser.add_argument("--hud", action="store_true",
+                        help="draw the pipeline metrics over the video (implies --metrics)")
+    parser.add_argument("--metrics-log", metavar="JSONL_PATH",
+                        help=f"append a metrics snapshot to this file every {METRICS_LOG_INTERVAL}s (implies --metrics)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve the metrics in Prometheus text format on localhost:PORT/metrics (implies --metrics)")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long startup took and append it to startup_timings.jsonl")
+    args = parser.parse_args()
+    startup_report_enabled = args.startup_report
+    metrics.enabled = bool(args.metrics or args.hud or args.metrics_log or args.metrics_port)
+    metrics.hud = args.hud
+    INFERENCE_WORKER_PROCESS = args.inference_process
+    WORKOUT_HISTORY = not args.no_history
+    if args.metrics_log:
+        start_metrics_log(args.metrics_log)
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    if args.benchmark is not None:
+        sys.exit(0 if run_benchmarks(args.benchmark or None, args.fixtures, args.baseline) else 1)
+    elif args.history:
+        print_workout_history(args.history)
+    elif args.history_load_test:
+        sys.exit(0 if run_workout_store_load_test() else 1)
+    elif args.calibrate:
+        run_calibration()
+    elif args.serve:
+        run_server(args.serve)
+    elif args.load_test:
+        run_load_test(args.load_test, args.clients, args.requests, args.exercise, args.load_frames)
+    elif args.replay and args.replay_headless:
+        run_replay(args.replay, args.exercise, args.replay_speed or 0.0)
+    elif args.replay:
+        create_replay_window(args.replay, args.exercise, args.replay_speed or 1.0)
+    elif args.batch:
+        run_batch(args.batch, args.output, args.exercise, args.workers, args.format)
+    elif args.multi_person and args.headless_seconds is not None:
+        run_multi_person(args.multi_person, args.exercise, args.headless_seconds or None)
+    elif args.multi_person:
+        create_multi_person_window(args.multi_person, args.exercise)
+    elif args.stations and args.headless_seconds is not None:
+        run_stations_headless(args.stations, args.exercise, args.headless_seconds or None, not args.no_pace)
+    elif args.stations:
+        create_dashboard(args.stations, args.exercise)
+    else:
+        if args.record:
+            session_recorder = SessionRecorder(args.record, args.record_video)
+        if args.export:
+            session_exporter = SessionExporter(args.export, args.export_width, args.export_fps)
+        # However the app is left (main window, Back then the front page, Ctrl+C),
+        # the files must be finished or the exported video is unreadable
+        try:
+            run_app()
+        finally:
+            camera_manager.release()
+            if workout_store is not None:
+                workout_store.close()
+            if session_recorder is not None:
+                session_recorder.close()
+            if session_exporter is not None:
+                session_exporter.close()
 